@@ -0,0 +1,9 @@
+"""
+Headless batch runner, see ohsomeTools.common.batch.
+"""
+
+import sys
+
+from ohsomeTools.common.batch import main
+
+sys.exit(main())
@@ -31,6 +31,12 @@ API_ENDPOINTS = [
 ]
 
 SUPPORTED_API_VERSIONS = ["1.4.1"]
+# Maximum number of concurrent sub-requests per provider, if the provider
+# doesn't set "max_in_flight" in the config.yml.
+DEFAULT_MAX_IN_FLIGHT = 2
+# Request rate per provider, if the provider doesn't set
+# "requests_per_second" in the config.yml. 0 disables the rate limit.
+DEFAULT_REQUESTS_PER_SECOND = 0
 EXTRACTION_SPECS = {
     "contributions": [
         "",
@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Runs ohsome API queries from a job file without the QGIS interface, e.g.
+for nightly extractions on servers without display:
+
+    python -m ohsomeTools jobs.yml --workers 4
+
+The job file is YAML or JSON:
+
+    provider: ohsome Public API  # name or index in config.yml
+    workers: 2
+    defaults:                    # merged into every job
+      start: "2020-01-01"
+      end: "2023-01-01"
+    jobs:
+      - name: buildings
+        endpoint: elements/geometry
+        filter: building=* and geometry:polygon
+        layer: input/districts.gpkg  # polygons become bpolys
+        parameters:                  # sent as they are
+          properties: tags
+        output: output/buildings.gpkg
+      - name: shops
+        endpoint: elements/count/groupBy/boundary
+        filter: shop=*
+        period: P1M
+        layer: input/stations.gpkg   # points become bcircles
+        radius: 500
+        output: output/shops.csv
+        incremental: true            # only request periods after the last
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import yaml
+from PyQt5.QtCore import QDateTime, QEventLoop, Qt
+from qgis.core import (
+    QgsApplication,
+    QgsProcessingFeedback,
+    QgsProject,
+    QgsTask,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+
+from ohsomeTools.common import (
+    client,
+    request_core,
+    telemetry,
+    temporal,
+    tiling,
+    writer,
+)
+from ohsomeTools.gui.ohsome_spec import ProcessingOhsomeSpec
+from ohsomeTools.proc.procDialog import resolve_missing_dates
+from ohsomeTools.utils import configmanager, exceptions
+
+DEFAULT_WORKERS = 2
+
+# Job keys and the processing parameters they set
+_JOB_DEFAULTS = {
+    "filter": "",
+    "filter_2": "",
+    "period": "",
+    "radius": 1000,
+    "format": "json",
+    "group_by_key": "",
+    "group_by_values": "",
+    "timeout": 0,
+    "show_metadata": False,
+    "keep_geometry_less": False,
+    "combine_single_with_multi_geometries": False,
+    "incremental": False,
+    "parameters": {},
+}
+
+
+class JobFeedback(QgsProcessingFeedback):
+    """Prints the messages of a job to stderr."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+    def pushInfo(self, info):
+        print(f"[{self.name}] {info}", file=sys.stderr)
+
+    def reportError(self, error, fatalError=False):
+        if error:
+            print(f"[{self.name}] ERROR: {error}", file=sys.stderr)
+
+
+def load_job_file(path: str) -> dict:
+    """
+    Reads a YAML or JSON job file.
+
+    :param path: The job file.
+    :type path: str
+
+    :raises ohsomeTools.utils.exceptions.PluginError: If the file contains
+        no jobs.
+
+    :rtype: dict
+    """
+    with open(path) as f:
+        # JSON is a subset of YAML
+        job_file = yaml.safe_load(f) or {}
+    if not isinstance(job_file, dict) or not len(job_file.get("jobs") or []):
+        raise exceptions.PluginError(
+            "Invalid job file", f"{path} contains no jobs."
+        )
+    return job_file
+
+
+def select_provider(providers: [dict], selection=None) -> dict:
+    """
+    :param providers: The providers of config.yml.
+    :type providers: list
+
+    :param selection: Name or index of the provider, the first by default.
+    :type selection: str or int
+
+    :raises ohsomeTools.utils.exceptions.PluginError: If there is no such
+        provider.
+
+    :rtype: dict
+    """
+    if selection is None:
+        selection = 0
+    for index, provider in enumerate(providers):
+        if selection in [index, provider.get("name")]:
+            return provider
+    raise exceptions.PluginError(
+        "Invalid job file", f"There is no provider {selection}."
+    )
+
+
+def _date(value) -> QDateTime:
+    if value is None or value == "":
+        return None
+    return QDateTime.fromString(str(value), Qt.ISODate)
+
+
+def processing_parameters(job: dict, layer: QgsVectorLayer) -> dict:
+    """
+    Translates a job into the parameters of the processing algorithms, so
+    it can be prepared by ProcessingOhsomeSpec.
+
+    :param job: The job with defaults applied.
+    :type job: dict
+
+    :param layer: The input geometries, registered in the project.
+    :type layer: QgsVectorLayer
+
+    :rtype: dict
+    """
+    endpoint = job["endpoint"].strip("/")
+    preference, _, specification = endpoint.partition("/")
+    period = str(job["period"] or "")
+    if len(period) and not period.startswith("/"):
+        period = f"/{period}"
+    return {
+        "geom": 1 if layer.geometryType() == QgsWkbTypes.PointGeometry else 2,
+        "selection": "data-Extraction"
+        if tiling.is_extraction(endpoint)
+        else "data-aggregation",
+        "preference": preference,
+        "preference_specification": specification,
+        "filter": job["filter"],
+        "filter_2": job["filter_2"],
+        "LAYER": layer,
+        "RADIUS": int(job["radius"]),
+        "check_activate_temporal": False,
+        "check_show_metadata": bool(job["show_metadata"]),
+        "timeout_input": int(job["timeout"] or 0),
+        "check_clip_geometry": True,
+        "property_groups_check_tags": False,
+        "property_groups_check_metadata": False,
+        "data_aggregation_format": job["format"],
+        "group_by_key_line_edit": job["group_by_key"],
+        "group_by_values_line_edit": job["group_by_values"],
+        "date_start": _date(job.get("start")),
+        "date_end": _date(job.get("end")),
+        "period": period,
+        "check_keep_geometryless": bool(job["keep_geometry_less"]),
+        "check_merge_geometries": bool(
+            job["combine_single_with_multi_geometries"]
+        ),
+        "output": job["output"],
+    }
+
+
+def csv_output(output_path: str) -> str:
+    """The CSV file aggregation results are written to."""
+    return f"{os.path.splitext(output_path)[0]}.csv"
+
+
+def job_feature_writer(output_path: str, job: dict) -> writer.FeatureWriter:
+    """
+    Creates the writer of the features of an extraction job, which receives
+    them while they are downloaded.
+
+    :param output_path: The output file.
+    :type output_path: str
+
+    :param job: The job with defaults applied.
+    :type job: dict
+
+    :rtype: writer.FeatureWriter
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    return writer.FeatureWriter(
+        output_path,
+        keep_geometry_less=bool(job["keep_geometry_less"]),
+        combine_single_with_multi_geometries=bool(
+            job["combine_single_with_multi_geometries"]
+        ),
+    )
+
+
+def write_result(
+    result: dict,
+    output_path: str,
+    job: dict,
+    last: str = None,
+    feature_writer: writer.FeatureWriter = None,
+) -> [str]:
+    """
+    Writes a merged response to disk, features to a GeoPackage or
+    FlatGeobuf file and result rows to a CSV file.
+
+    :param result: The response.
+    :type result: dict
+
+    :param output_path: The output file.
+    :type output_path: str
+
+    :param job: The job with defaults applied.
+    :type job: dict
+
+    :param last: The last timestamp of an existing CSV output, only the
+        result rows after it are appended.
+    :type last: str
+
+    :param feature_writer: The writer that received the features of the
+        response while they were downloaded, see job_feature_writer.
+    :type feature_writer: writer.FeatureWriter
+
+    :returns: The written files.
+    :rtype: list
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    if result.get("type", "").lower() == "featurecollection":
+        if feature_writer is None:
+            feature_writer = job_feature_writer(output_path, job)
+        for feature in result.pop("features", []):
+            feature_writer.write(feature)
+        outputs = feature_writer.close()
+        for warning in feature_writer.warnings:
+            print(f"[{job['name']}] {warning}", file=sys.stderr)
+        return sorted({uri.split("|")[0] for uri, _ in outputs})
+
+    csv_path = csv_output(output_path)
+    header = None
+    if len(result.get("result") or []):
+        rows = result["result"]
+    elif len(result.get("ratioResult") or []):
+        rows = result["ratioResult"]
+    elif len(result.get("groupByResult") or []):
+        rows, header = request_core.group_by_rows(result["groupByResult"])
+    else:
+        json_path = f"{os.path.splitext(output_path)[0]}.json"
+        with open(json_path, "w") as f:
+            json.dump(result, f)
+        return [json_path]
+    if header is None:
+        header = list(rows[0].keys())
+    if last:
+        rows = temporal.newer_rows(rows, last)
+    writer.write_table(rows, header, csv_path, bool(last))
+    return [csv_path]
+
+
+class BatchJobTask(QgsTask):
+    """Requests and writes the output of one job in a worker thread."""
+
+    def __init__(
+        self, name: str, provider: dict, job: dict, preferences, outcomes=None
+    ):
+        """
+        :param preferences: The request parameters of the job, a list for
+            the bcircles batches of a point layer.
+        :type preferences: dict or list
+
+        :param outcomes: Gets whether the job succeeded once it finished.
+            The task manager deletes finished tasks, so their status can't
+            be queried afterwards.
+        :type outcomes: list
+        """
+        super().__init__(f"ohsome job {name}", QgsTask.CanCancel)
+        self.name = name
+        self.provider = provider
+        self.job = job
+        self.preferences = preferences
+        self.feedback = JobFeedback(name)
+        self.timings = telemetry.Timings()
+        self.outputs = []
+        self.exception = None
+        self.outcomes = outcomes
+
+    def run(self):
+        feature_writer = None
+        try:
+            preferences = self.preferences
+            last = None
+            if self.job["incremental"]:
+                last = temporal.last_timestamp(csv_output(self.job["output"]))
+            if last:
+                preferences = temporal.incremental_preferences(
+                    preferences, last
+                )
+                if preferences is None:
+                    self.feedback.pushInfo("The output is up to date.")
+                    self.outputs = [csv_output(self.job["output"])]
+                    return True
+            clnt = client.ProcessingClient(
+                self.provider, feedback=self.feedback
+            )
+            clnt.timings = self.timings
+            if tiling.is_extraction(self.job["endpoint"]):
+                feature_writer = job_feature_writer(
+                    self.job["output"], self.job
+                )
+            result = request_core.fetch_result(
+                clnt,
+                self.job["endpoint"].strip("/"),
+                preferences,
+                canceled=self.isCanceled,
+                progress=self.setProgress,
+                feature_output=feature_writer,
+            )
+            if not result:
+                raise exceptions.GenericServerError(
+                    "Empty response", "The API returned no result."
+                )
+            with self.timings.span("write"):
+                self.outputs = write_result(
+                    result,
+                    self.job["output"],
+                    self.job,
+                    last,
+                    feature_writer=feature_writer,
+                )
+        except Exception as err:
+            if feature_writer is not None:
+                feature_writer.discard()
+            self.exception = err
+            return False
+        return True
+
+    def finished(self, result):
+        if self.outcomes is not None:
+            self.outcomes.append(bool(result))
+        self.feedback.pushInfo(
+            telemetry.report(
+                self.timings,
+                job=self.name,
+                endpoint=self.job["endpoint"],
+                provider=self.provider["base_url"],
+                ok=bool(result),
+            )
+        )
+        if result:
+            self.feedback.pushInfo(f"Wrote {', '.join(self.outputs)}")
+        else:
+            self.feedback.reportError(
+                f"{self.exception.__class__.__name__}: {self.exception}"
+                if self.exception
+                else "Canceled"
+            )
+
+
+def prepare_job(job: dict, index: int, defaults: dict, metadata: dict):
+    """
+    Builds the request parameters of a job from its input layer.
+
+    :param job: The job of the job file.
+    :type job: dict
+
+    :param index: Position of the job in the job file.
+    :type index: int
+
+    :param defaults: The defaults of the job file.
+    :type defaults: dict
+
+    :param metadata: The /metadata response of the provider, used for
+        missing start and end dates.
+    :type metadata: dict
+
+    :raises ohsomeTools.utils.exceptions.PluginError: If the job is
+        incomplete or invalid.
+
+    :returns: The job with defaults applied and its request parameters.
+    :rtype: (dict, list)
+    """
+    job = {**_JOB_DEFAULTS, **(defaults or {}), **job}
+    job.setdefault("name", f"job{index + 1}")
+    for key in ["endpoint", "layer", "output"]:
+        if not job.get(key):
+            raise exceptions.PluginError(
+                "Invalid job", f"{job['name']} has no {key}."
+            )
+    layer = QgsVectorLayer(job["layer"], f"ohsome_job_{index}", "ogr")
+    if not layer.isValid() or layer.geometryType() not in [
+        QgsWkbTypes.PointGeometry,
+        QgsWkbTypes.PolygonGeometry,
+    ]:
+        raise exceptions.PluginError(
+            "Invalid job",
+            f"{job['name']}: {job['layer']} is no point or polygon layer.",
+        )
+    QgsProject.instance().addMapLayer(layer, False)
+    try:
+        parameters = processing_parameters(job, layer)
+        resolve_missing_dates(parameters, metadata)
+        spec = ProcessingOhsomeSpec(
+            params=parameters, feedback=JobFeedback(job["name"])
+        )
+        if not spec.is_valid():
+            raise exceptions.PluginError(
+                "Invalid job", f"{job['name']} is incomplete."
+            )
+        if parameters["geom"] == 1:
+            preferences = spec.get_point_layer_request_preferences()
+        else:
+            preferences = spec.get_polygon_layer_request_preferences()
+    finally:
+        QgsProject.instance().removeMapLayer(layer.id())
+    # Raw API parameters, e.g. properties or clipGeometry
+    preferences = [
+        {**preference, **(job["parameters"] or {})}
+        for preference in preferences
+    ]
+    return job, preferences
+
+
+def run_jobs(job_file: dict, workers: int = None) -> int:
+    """
+    Runs the jobs of a job file on a pool of worker threads.
+
+    :param job_file: The parsed job file.
+    :type job_file: dict
+
+    :param workers: Number of jobs run at the same time, defaults to the
+        workers of the job file.
+    :type workers: int
+
+    :returns: The number of failed jobs.
+    :rtype: int
+    """
+    provider = select_provider(
+        configmanager.read_config()["providers"], job_file.get("provider")
+    )
+    try:
+        metadata = client.Client(provider).metadata()
+    except Exception as err:
+        print(f"The metadata could not be requested: {err}", file=sys.stderr)
+        metadata = {}
+
+    tasks = []
+    # Whether the finished tasks succeeded, one entry per task
+    outcomes = []
+    failed = 0
+    for index, job in enumerate(job_file["jobs"]):
+        try:
+            job, preferences = prepare_job(
+                job, index, job_file.get("defaults"), metadata
+            )
+        except Exception as err:
+            print(f"Skipping job {index + 1}: {err}", file=sys.stderr)
+            failed += 1
+            continue
+        tasks.append(
+            BatchJobTask(job["name"], provider, job, preferences, outcomes)
+        )
+
+    task_manager = QgsApplication.taskManager()
+    task_manager.setMaxActiveThreadCount(
+        max(1, int(workers or job_file.get("workers") or DEFAULT_WORKERS))
+    )
+    loop = QEventLoop()
+    task_manager.allTasksFinished.connect(loop.quit)
+    for task in tasks:
+        task_manager.addTask(task)
+    if len(tasks) and task_manager.countActiveTasks():
+        loop.exec_()
+    # Deliver the finished calls of the last tasks
+    QgsApplication.processEvents()
+    # The task manager deleted the finished tasks, tasks that never
+    # finished count as failed
+    return failed + len(tasks) - sum(outcomes)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m ohsomeTools",
+        description="Runs ohsome API jobs from a YAML or JSON job file "
+        "without the QGIS interface.",
+    )
+    parser.add_argument("job_file", help="YAML or JSON job file")
+    parser.add_argument(
+        "--workers", type=int, help="number of jobs run at the same time"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="print the QGIS message log",
+    )
+    args = parser.parse_args(argv)
+
+    # No display is needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    application = QgsApplication([], False)
+    application.initQgis()
+    if args.verbose:
+        QgsApplication.messageLog().messageReceived.connect(
+            lambda message, tag, level: print(
+                f"{tag}: {message}", file=sys.stderr
+            )
+        )
+    try:
+        failed = run_jobs(load_job_file(args.job_file), args.workers)
+    except exceptions.OhsomeBaseException as err:
+        print(err, file=sys.stderr)
+        failed = 1
+    finally:
+        application.exitQgis()
+    return 1 if failed else 0
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Persistent caches for ohsome API responses and provider metadata.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from qgis.core import QgsApplication
+
+from ohsomeTools import PLUGIN_NAME
+from ohsomeTools.utils import configmanager, logger
+
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "max_size_mb": 512,
+    "metadata_refresh_minutes": 60,
+    "ttl_hours": 24,
+}
+
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2})?)?")
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def _parse_timestamp(timestamp: str):
+    try:
+        return datetime.fromisoformat(timestamp.rstrip("Z"))
+    except ValueError:
+        return None
+
+
+def _cache_settings() -> dict:
+    settings = DEFAULT_CACHE_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("cache", {}) or {}
+    )
+    return settings
+
+
+def is_historic(base_url: str, params: dict) -> bool:
+    """
+    Checks whether the requested time range ends before the latest data
+    timestamp of the provider. Responses for such ranges never change.
+
+    :param base_url: The provider base url.
+    :type base_url: str
+
+    :param params: The request parameters.
+    :type params: dict
+
+    :rtype: bool
+    """
+    data_until = metadata_cache().data_until(base_url)
+    time_parameter = params.get("time") if params else None
+    if not data_until or not time_parameter:
+        # Without a time parameter the API uses the latest data timestamp
+        return False
+    dates = [
+        _parse_timestamp(date)
+        for date in _DATE_PATTERN.findall(str(time_parameter))
+    ]
+    if not len(dates) or None in dates:
+        return False
+    return max(dates) < data_until
+
+
+class MetadataCache:
+    """
+    In-memory and on-disk cache of the /metadata response per provider.
+
+    All entries are kept in memory and mirrored to a single JSON file, so
+    they survive QGIS restarts.
+    """
+
+    def __init__(self, path: str, refresh_interval: float):
+        """
+        :param path: The JSON file the entries are mirrored to.
+        :type path: str
+
+        :param refresh_interval: Age in seconds after which an entry is
+            considered stale and should be refreshed.
+        :type refresh_interval: float
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, base_url: str):
+        """
+        Returns the cached metadata of a provider and whether it is stale.
+
+        :param base_url: The provider base url.
+        :type base_url: str
+
+        :returns: The metadata or None and the stale flag.
+        :rtype: (dict, bool)
+        """
+        with self._lock:
+            entry = self._entries.get(base_url.rstrip("/"))
+        if not entry:
+            return None, True
+        stale = time.time() - entry["fetched"] > self.refresh_interval
+        return entry["metadata"], stale
+
+    def put(self, base_url: str, metadata: dict):
+        """
+        Stores the metadata of a provider.
+
+        :param base_url: The provider base url.
+        :type base_url: str
+
+        :param metadata: The /metadata response.
+        :type metadata: dict
+        """
+        with self._lock:
+            self._entries[base_url.rstrip("/")] = {
+                "fetched": time.time(),
+                "metadata": metadata,
+            }
+            temp_path = None
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = _temp_file(self.path)
+                with open(temp_path, "w") as f:
+                    json.dump(self._entries, f)
+                os.replace(temp_path, self.path)
+            except OSError as err:
+                logger.log(f"Metadata could not be cached: {err}", 1)
+                if temp_path is not None:
+                    ResponseCache._remove(temp_path)
+
+    def data_until(self, base_url: str):
+        """
+        Returns the latest data timestamp of a provider.
+
+        :rtype: datetime or None
+        """
+        metadata, _ = self.get(base_url)
+        try:
+            to_timestamp = metadata["extractRegion"]["temporalExtent"][
+                "toTimestamp"
+            ]
+        except (KeyError, TypeError):
+            return None
+        return _parse_timestamp(to_timestamp)
+
+
+def _temp_file(path: str) -> str:
+    """
+    Creates a temporary file next to path to write an entry to before it
+    replaces path. Its name is unique, so concurrent writers of the same
+    entry don't mix their content, even in the same thread.
+
+    :rtype: str
+    """
+    handle, temp_path = tempfile.mkstemp(
+        suffix=".tmp",
+        prefix=f"{os.path.basename(path)}.",
+        dir=os.path.dirname(path),
+    )
+    os.close(handle)
+    return temp_path
+
+
+class ResponseCache:
+    """
+    Content-addressed, size-bounded LRU cache for ohsome API responses.
+
+    Each entry is stored as one file named after the hash of the normalized
+    request. The first line holds the expiry time as a unix timestamp, 0 for
+    entries that never expire, followed by the raw response body.
+    """
+
+    def __init__(self, directory: str, max_size: int, ttl: float):
+        """
+        :param directory: The cache directory.
+        :type directory: str
+
+        :param max_size: Maximum size of all entries in bytes.
+        :type max_size: int
+
+        :param ttl: Lifetime of entries that may change in seconds.
+        :type ttl: float
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(base_url: str, url: str, params, post_json=None) -> str:
+        """
+        Builds the cache key of a request from the endpoint and the sorted
+        request parameters.
+
+        :rtype: str
+        """
+        path = url.split("?")[0]
+        if type(params) is dict:
+            params = sorted(params.items())
+        body = sorted(post_json.items()) if post_json else []
+        normalized = json.dumps(
+            [base_url.rstrip("/"), path, list(params or []), body]
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _open(self, key: str):
+        """Opens a valid entry positioned at the start of the body."""
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        try:
+            expires = float(f.readline())
+        except ValueError:
+            f.close()
+            return None
+        if expires and expires < time.time():
+            f.close()
+            self._remove(path)
+            return None
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def get(self, key: str):
+        """
+        Returns the cached response or None if there is no valid entry.
+
+        :rtype: dict or None
+        """
+        f = self._open(key)
+        if f is None:
+            return None
+        with f:
+            try:
+                return json.loads(f.read().decode("utf-8"))
+            except ValueError:
+                return None
+
+    def stream(self, key: str, chunk_sink, chunk_size: int = 65536) -> bool:
+        """
+        Passes the cached raw response body in chunks to chunk_sink.
+
+        :returns: False if there is no valid entry.
+        :rtype: bool
+        """
+        f = self._open(key)
+        if f is None:
+            return False
+        with f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                chunk_sink(chunk)
+        return True
+
+    def put(self, key: str, content: bytes, permanent: bool = False):
+        """
+        Stores the raw response body of a request.
+
+        :param content: The raw response body.
+        :type content: bytes
+
+        :param permanent: Store the entry without expiry.
+        :type permanent: bool
+        """
+        entry = self.entry_writer(key, permanent)
+        entry.write(content)
+        entry.commit()
+
+    def entry_writer(self, key: str, permanent: bool = False):
+        """
+        Returns a writer to store a response body chunk by chunk.
+
+        :param permanent: Store the entry without expiry.
+        :type permanent: bool
+
+        :rtype: CacheEntryWriter
+        """
+        return CacheEntryWriter(self, key, permanent)
+
+    def _added(self, path: str):
+        with self._lock:
+            if self._size is None:
+                self._size = self._directory_size()
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                self._remove(entry.path)
+            self._size = 0
+
+    def _directory_size(self) -> int:
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".json")
+        )
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits."""
+        entries = sorted(
+            (
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".json")
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        self._size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            size = entry.stat().st_size
+            if self._remove(entry.path):
+                self._size -= size
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+
+class CacheEntryWriter:
+    """
+    Writes a response body to the cache while it is received. The entry only
+    becomes visible once it is committed.
+    """
+
+    def __init__(
+        self, response_cache: ResponseCache, key: str, permanent: bool
+    ):
+        self.cache = response_cache
+        self.path = response_cache._path(key)
+        self.temp_path = None
+        expires = 0 if permanent else time.time() + response_cache.ttl
+        try:
+            self.temp_path = _temp_file(self.path)
+            self._file = open(self.temp_path, "wb")
+            self._file.write(f"{expires}\n".encode("utf-8"))
+        except OSError as err:
+            logger.log(f"Response could not be cached: {err}", 1)
+            self._file = None
+
+    def write(self, data: bytes):
+        if self._file is None:
+            return
+        try:
+            self._file.write(data)
+        except OSError as err:
+            logger.log(f"Response could not be cached: {err}", 1)
+            self.discard()
+
+    def commit(self):
+        """Adds the written body to the cache."""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            os.replace(self.temp_path, self.path)
+        except OSError as err:
+            logger.log(f"Response could not be cached: {err}", 1)
+            self.cache._remove(self.temp_path)
+            return
+        finally:
+            self._file = None
+        self.cache._added(self.path)
+
+    def discard(self):
+        """Drops the written body."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self.cache._remove(self.temp_path)
+
+
+def cache_directory(name: str) -> str:
+    """
+    Returns a cache directory inside the QGIS profile.
+
+    :param name: Name of the cache.
+    :type name: str
+
+    :rtype: str
+    """
+    return os.path.join(
+        QgsApplication.qgisSettingsDirPath(), "cache", PLUGIN_NAME, name
+    )
+
+
+def response_cache():
+    """
+    Returns the shared response cache configured in the config.yml or None
+    if the cache is disabled.
+
+    :rtype: ResponseCache or None
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = False
+            settings = _cache_settings()
+            if settings["enabled"]:
+                _response_cache = ResponseCache(
+                    cache_directory("responses"),
+                    max_size=int(settings["max_size_mb"] * 1024 * 1024),
+                    ttl=float(settings["ttl_hours"]) * 3600,
+                )
+        return _response_cache or None
+
+
+def metadata_cache() -> MetadataCache:
+    """
+    Returns the shared metadata cache.
+
+    :rtype: MetadataCache
+    """
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            settings = _cache_settings()
+            _metadata_cache = MetadataCache(
+                os.path.join(cache_directory("metadata"), "metadata.json"),
+                refresh_interval=float(settings["metadata_refresh_minutes"])
+                * 60,
+            )
+        return _metadata_cache
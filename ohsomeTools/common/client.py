@@ -26,26 +26,108 @@
 
 import json
 import random
+import threading
 import time
 from datetime import datetime, timedelta
 from urllib.parse import urlencode
 
 import requests
-from PyQt5.QtCore import QObject, pyqtSignal
-from qgis._core import Qgis
+from PyQt5.QtCore import QEventLoop, QObject, QTimer, pyqtSignal
+from qgis._core import Qgis, QgsApplication, QgsTask
 
 from ohsomeTools import __version__
-from ohsomeTools.common import networkaccessmanager
+from ohsomeTools.common import (
+    cache,
+    coalescing,
+    networkaccessmanager,
+    ratelimit,
+    streaming,
+    telemetry,
+)
 from ohsomeTools.utils import exceptions, logger
 from ohsomeTools.utils.exceptions import ServiceUnavailable
 
 _USER_AGENT = f"ohsome-qgis-plugin/{__version__}"
 
+# Running background metadata refreshes per provider base_url
+_metadata_refresh_tasks = {}
+_metadata_refresh_tasks_lock = threading.Lock()
+
+# Cheap requests that don't take a concurrency slot of the provider, so
+# they never wait for long requests in flight, e.g. on the main thread
+_SLOTLESS_ENDPOINTS = ("/metadata",)
+
+# Interval in milliseconds in which wait_all checks for cancellation
+_CANCEL_CHECK_INTERVAL = 200
+
+
+def _shared_exception(error: Exception, canceled: bool) -> Exception:
+    """
+    The exception a sender finishes its shared request with. If the sender
+    was canceled, the waiters send the request themselves instead of
+    failing with it.
+    """
+    if canceled or isinstance(
+        error, networkaccessmanager.RequestsExceptionUserAbort
+    ):
+        return exceptions.Canceled("Canceled", "The request was canceled.")
+    return error
+
+
+def _retry_delay(retry_counter: int) -> float:
+    """Returns the pause in seconds before a retry."""
+    # 0.5 * (1.5 ^ i) is an increased sleep time of 1.5x per iteration,
+    # starting at 0.5s when retry_counter=1. The first retry will occur
+    # at 1, so subtract that first.
+    delay_seconds = 1.5 ** (retry_counter - 1)
+    # Jitter this value by 50%.
+    return delay_seconds * (random.random() + 0.5)
+
+
+class MetadataRefreshTask(QgsTask):
+    """Refreshes the cached metadata of a provider in the background."""
+
+    def __init__(self, provider):
+        super().__init__(
+            f"Refresh ohsome API metadata of {provider['base_url']}",
+            QgsTask.CanCancel,
+        )
+        self.provider = provider
+
+    def run(self):
+        try:
+            # The response is stored in the metadata cache by the client
+            Client(self.provider).request(f"/metadata", {})
+        except Exception as err:
+            logger.log(f"Metadata refresh failed: {err}", 1)
+        return True
+
+    def finished(self, result):
+        with _metadata_refresh_tasks_lock:
+            if _metadata_refresh_tasks.get(self.provider["base_url"]) is self:
+                del _metadata_refresh_tasks[self.provider["base_url"]]
+
+
+def refresh_metadata_in_background(provider):
+    """
+    Starts a background task that refreshes the cached metadata of the
+    provider, unless one is already running.
+
+    :param provider: An ohsome API provider from config.yml
+    :type provider: dict
+    """
+    with _metadata_refresh_tasks_lock:
+        if provider["base_url"] in _metadata_refresh_tasks:
+            return
+        task = MetadataRefreshTask(provider)
+        _metadata_refresh_tasks[provider["base_url"]] = task
+    QgsApplication.taskManager().addTask(task)
+
 
 class Client(QObject):
     """Performs requests to the ohsome API services."""
 
-    def __init__(self, provider=None, retry_timeout=60):
+    def __init__(self, provider=None, retry_timeout=60, timings=None):
         """
         :param provider: An ohsome API provider from config.yml
         :type provider: dict
@@ -53,9 +135,15 @@ class Client(QObject):
         :param retry_timeout: Timeout across multiple retryable requests, in
             seconds.
         :type retry_timeout: int
+
+        :param timings: Collects the phases and byte counts of the requests,
+            e.g. shared with the other clients of a run.
+        :type timings: telemetry.Timings
         """
         QObject.__init__(self)
+        self.timings = timings if timings is not None else telemetry.Timings()
 
+        self.provider = provider
         self.base_url = provider["base_url"]
 
         # self.session = requests.Session()
@@ -66,12 +154,22 @@ class Client(QObject):
             "User-Agent": _USER_AGENT,
             "Content-Type": "application/x-www-form-urlencoded",
             "accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
         }
+        # Only providers that inflate request bodies may opt in
+        if provider.get("gzip_requests"):
+            self.headers["Content-Encoding"] = "gzip"
 
         # Save some references to retrieve in client instances
         self.url = None
         self.warnings = None
         self.canceled = False
+        self.cache = cache.response_cache()
+        self.limiter = ratelimit.limiter(provider)
+        # Share the replies of identical requests in flight
+        self.coalesce = coalescing.enabled()
+        # Asynchronous requests in flight or waiting for a retry
+        self._pending = set()
 
     overQueryLimit = pyqtSignal()
 
@@ -82,9 +180,11 @@ class Client(QObject):
         first_request_time=None,
         retry_counter=0,
         post_json=None,
+        feature_sink=None,
     ):
         """Performs HTTP GET/POST with credentials, returning the body as
-        JSON.
+        JSON. If another caller sends the same request meanwhile, its reply
+        is shared instead of sending the request again.
 
         :param url: URL extension for request. Should begin with a slash.
         :type url: string
@@ -99,11 +199,64 @@ class Client(QObject):
         :param post_json: Parameters for POST endpoints
         :type post_json: dict
 
+        :param feature_sink: If set, the features of a GeoJSON response are
+            parsed while they are downloaded and passed to the sink one by
+            one instead of being part of the returned body.
+        :type feature_sink: callable
+
         :raises ohsomeTools.utils.exceptions.ApiError: when the API returns an error.
 
         :returns: ohsome API response body
         :rtype: dict
         """
+        shared = None
+        while self.coalesce and shared is None:
+            waiter = coalescing.Waiter()
+            shared, sends = coalescing.join(
+                coalescing.request_key(self.base_url, url, params, post_json),
+                waiter,
+                blocking=True,
+            )
+            if sends:
+                break
+            body = self._wait_shared(shared, waiter)
+            if body is not None:
+                return self._parse_shared(body, feature_sink)
+            # The sender was canceled, send it ourselves
+            shared = None
+        try:
+            response = self._request(
+                url,
+                params,
+                first_request_time,
+                retry_counter,
+                post_json,
+                feature_sink,
+                shared,
+            )
+        except Exception as err:
+            if shared is not None:
+                shared.finish(_shared_exception(err, self._is_canceled()))
+            raise
+        if shared is not None:
+            shared.finish()
+        return response
+
+    def _request(
+        self,
+        url,
+        params,
+        first_request_time=None,
+        retry_counter=0,
+        post_json=None,
+        feature_sink=None,
+        shared=None,
+    ):
+        """Sends the request of request, retrying on its own.
+
+        :param shared: Keeps the reply for the callers waiting for it.
+        :type shared: coalescing.SharedRequest
+        """
         if not first_request_time:
             first_request_time = datetime.now()
 
@@ -111,65 +264,78 @@ class Client(QObject):
         if elapsed > self.retry_timeout:
             raise exceptions.Timeout()
         if retry_counter > 0:
-            # 0.5 * (1.5 ^ i) is an increased sleep time of 1.5x per iteration,
-            # starting at 0.5s when retry_counter=1. The first retry will occur
-            # at 1, so subtract that first.
-            delay_seconds = 1.5 ** (retry_counter - 1)
-            # Jitter this value by 50% and pause.
-            time.sleep(delay_seconds * (random.random() + 0.5))
+            # Pause, unless canceled meanwhile.
+            self.limiter.wait(_retry_delay(retry_counter), self._is_canceled)
 
-        authed_url = self._generate_auth_url(
-            url,
-            params,
+        request_kwargs = self._request_kwargs(url, params, post_json)
+        parser = None
+        if feature_sink is not None:
+            parser = streaming.FeatureCollectionParser(feature_sink)
+        cache_key, cached_response = self._cached_response(
+            url, params, post_json, parser
         )
-        self.url = self.base_url + authed_url
-        # Default to the client-level self.requests_kwargs, with method-level
-        # requests_kwargs arg overriding.
-        # final_requests_kwargs = self.requests_kwargs
-
-        # Determine GET/POST
-        # requests_method = self.session.get
-        requests_method = "GET"
-        body = None
-        if post_json is not None:
-            # requests_method = self.session.post
-            # final_requests_kwargs["json"] = post_json
-            body = post_json
-            requests_method = "POST"
+        if cached_response is not None:
+            return cached_response
+        cache_entry, stream_sink, stream_errors = self._prepare_stream(
+            self.nam, parser, cache_key, params, post_json
+        )
+        if shared is not None:
+            stream_sink = shared.tee(stream_sink)
+        slot = self._takes_slot(url)
 
         try:
             # response = requests_method(
             #     self.base_url + authed_url,
             #     **final_requests_kwargs
             # )
-            response, content = self.nam.request(
-                self.url,
-                method=requests_method,
-                body=body,
-                headers=self.headers,
-                blocking=True,
-            )
+            with self.timings.span("queue"):
+                self.limiter.acquire(self._is_canceled, slot)
+            try:
+                response, content = self.nam.request(
+                    **request_kwargs,
+                    blocking=True,
+                    stream_sink=stream_sink,
+                )
+            finally:
+                self._release_limiter(slot=slot)
+                self.timings.add_reply(self.nam.http_call_result)
+        except exceptions.Canceled:
+            if cache_entry:
+                cache_entry.discard()
+            raise
         # except requests.exceptions.Timeout:
         #     raise exceptions.Timeout()
         except networkaccessmanager.RequestsExceptionTimeout:
+            if cache_entry:
+                cache_entry.discard()
             raise exceptions.Timeout
 
         except networkaccessmanager.RequestsException:
+            if cache_entry:
+                cache_entry.discard()
+            if len(stream_errors):
+                raise stream_errors[0]
             try:
                 # result = self._get_body(response)
                 self._check_status()
 
-            except exceptions.Unauthorized as e:
-                # Let the instances know smth happened
-                self.overQueryLimit.emit()
-                logger.log("{}: {}".format(e.__class__.__name__, str(e)), 1)
-
-                return self.request(
+            except (
+                exceptions.Unauthorized,
+                exceptions.TooManyRequests,
+                exceptions.ServiceUnavailable,
+            ) as e:
+                if not self._is_retryable(e):
+                    raise
+                if shared is not None:
+                    shared.restart()
+                return self._request(
                     url,
                     params,
                     first_request_time,
                     retry_counter + 1,
                     post_json,
+                    feature_sink,
+                    shared,
                 )
 
             except exceptions.GenericClientError as e:
@@ -180,16 +346,244 @@ class Client(QObject):
                 )
                 raise e
             raise
-        return json.loads(content.decode("utf-8"))
+        if shared is not None:
+            shared.received(content)
+        return self._complete_response(
+            url,
+            params,
+            post_json,
+            content,
+            cache_key,
+            parser,
+            cache_entry,
+            stream_errors,
+        )
+
+    def request_async(
+        self, url, params, post_json=None, feature_sink=None
+    ) -> "RequestFuture":
+        """Starts an HTTP GET/POST without blocking. The reply is handled by
+        the event loop of the calling thread, so many requests can be in
+        flight at once without threads or nested event loops. Retries,
+        rate limits, the response cache and the sharing of identical
+        requests work as for request.
+
+        :param url: URL extension for request. Should begin with a slash.
+        :type url: string
+
+        :param params: HTTP GET parameters.
+        :type params: dict or list of key/value tuples
+
+        :param post_json: Parameters for POST endpoints
+        :type post_json: dict
+
+        :param feature_sink: Receives the features of a GeoJSON response
+            while they are downloaded.
+        :type feature_sink: callable
+
+        :returns: The future of the ohsome API response body.
+        :rtype: RequestFuture
+        """
+        return _AsyncRequest(self, url, params, post_json, feature_sink).start()
+
+    def _request_kwargs(self, url, params, post_json) -> dict:
+        """Builds the arguments of NetworkAccessManager.request."""
+        authed_url = self._generate_auth_url(
+            url,
+            params,
+        )
+        self.url = self.base_url + authed_url
+        # Determine GET/POST
+        if post_json is not None:
+            return dict(
+                url=self.url,
+                method="POST",
+                body=post_json,
+                headers=dict(self.headers),
+            )
+        return dict(
+            url=self.url, method="GET", body=None, headers=dict(self.headers)
+        )
+
+    def _cached_response(self, url, params, post_json, parser):
+        """
+        Looks the request up in the response cache.
+
+        :returns: The cache key, None if the request is not cached, and the
+            cached response or None.
+        :rtype: (str, dict)
+        """
+        # The metadata changes with every data update and is never cached
+        if not self.cache or url.startswith("/metadata"):
+            return None, None
+        cache_key = self.cache.key(self.base_url, url, params, post_json)
+        if parser is not None:
+            with self.timings.span("parse"):
+                if self.cache.stream(cache_key, parser.feed):
+                    logger.log(f"Using the cached response for {self.url}", 0)
+                    self.timings.count("cache_hits")
+                    return cache_key, parser.close()
+        cached_response = self.cache.get(cache_key) if parser is None else None
+        if cached_response is not None:
+            logger.log(f"Using the cached response for {self.url}", 0)
+            self.timings.count("cache_hits")
+        return cache_key, cached_response
+
+    def _prepare_stream(self, nam, parser, cache_key, params, post_json):
+        """
+        Creates the sink that passes a streamed response to the parser and
+        the cache.
+
+        :returns: The cache entry, the sink and the list the errors of the
+            sink are collected in.
+        :rtype: (cache.CacheEntryWriter, callable, list)
+        """
+        if parser is None:
+            return None, None, []
+        cache_entry = None
+        stream_errors = []
+        if cache_key:
+            cache_entry = self.cache.entry_writer(
+                cache_key,
+                cache.is_historic(
+                    self.base_url, post_json if post_json else dict(params)
+                ),
+            )
+
+        def stream_sink(data):
+            # Exceptions must not escape into the Qt event loop
+            if len(stream_errors):
+                return
+            try:
+                if cache_entry:
+                    cache_entry.write(data)
+                with self.timings.span("parse"):
+                    parser.feed(data)
+            except Exception as err:
+                stream_errors.append(err)
+                nam.abort()
+
+        return cache_entry, stream_sink, stream_errors
+
+    def _complete_response(
+        self,
+        url,
+        params,
+        post_json,
+        content,
+        cache_key,
+        parser,
+        cache_entry,
+        stream_errors,
+    ) -> dict:
+        """Parses and caches the body of a successful response."""
+        if parser is not None:
+            try:
+                if len(stream_errors):
+                    raise stream_errors[0]
+                with self.timings.span("parse"):
+                    response = parser.close()
+            except Exception:
+                if cache_entry:
+                    cache_entry.discard()
+                raise
+            if cache_entry:
+                cache_entry.commit()
+            return response
+        with self.timings.span("parse"):
+            response = json.loads(content.decode("utf-8"))
+        if url.startswith("/metadata"):
+            cache.metadata_cache().put(self.base_url, response)
+        elif cache_key:
+            self.cache.put(
+                cache_key,
+                content,
+                permanent=cache.is_historic(
+                    self.base_url, post_json if post_json else dict(params)
+                ),
+            )
+        return response
+
+    def _wait_shared(self, shared, waiter) -> bytes:
+        """
+        Blocks until the request another caller sends finished.
+
+        :raises ohsomeTools.utils.exceptions.Canceled: If this client was
+            canceled meanwhile.
+
+        :returns: See coalescing.SharedRequest.body.
+        :rtype: bytes
+        """
+        with self.timings.span("queue"):
+            while not waiter.wait(_CANCEL_CHECK_INTERVAL / 1000):
+                if self._is_canceled():
+                    # The others keep waiting
+                    shared.leave(waiter)
+                    raise exceptions.Canceled(
+                        "Canceled", "The request was canceled."
+                    )
+        return shared.body()
+
+    def _parse_shared(self, body: bytes, feature_sink) -> dict:
+        """Parses the body of a reply shared by another caller."""
+        self.timings.count("coalesced")
+        with self.timings.span("parse"):
+            if feature_sink is None:
+                return json.loads(body.decode("utf-8"))
+            parser = streaming.FeatureCollectionParser(feature_sink)
+            parser.feed(body)
+            return parser.close()
+
+    def _is_retryable(self, error, nam=None) -> bool:
+        """
+        Checks whether a request that failed with an Unauthorized,
+        TooManyRequests or ServiceUnavailable error is worth retrying.
+        """
+        nam = nam or self.nam
+        if (
+            isinstance(error, exceptions.ServiceUnavailable)
+            and nam.http_call_result.status_code != 503
+        ):
+            # The connection was refused, retrying won't help
+            return False
+        # Let the instances know smth happened
+        self.overQueryLimit.emit()
+        logger.log("{}: {}".format(error.__class__.__name__, str(error)), 1)
+        return True
 
-    def _check_status(self):
+    def _is_canceled(self) -> bool:
+        return self.canceled
+
+    @staticmethod
+    def _takes_slot(url: str) -> bool:
+        """Whether a request takes a concurrency slot of the limiter."""
+        return not url.startswith(_SLOTLESS_ENDPOINTS)
+
+    def _release_limiter(self, nam=None, slot: bool = True):
+        """Frees the limiter slot of the last request of nam."""
+        result = (nam or self.nam).http_call_result
+        throttled = result.status_code in [429, 503]
+        retry_after = None
+        if throttled:
+            retry_after = ratelimit.parse_retry_after(
+                result.headers.get("retry-after")
+            )
+            logger.log(
+                f"{self.base_url} throttled the request with "
+                f"{result.status_code}, reducing the concurrent requests.",
+                1,
+            )
+        self.limiter.release(throttled, retry_after, slot)
+
+    def _check_status(self, nam=None):
         """
-        Casts JSON response to dict
+        Casts JSON response to dict of the last request of nam
         :raises ohsomeTools.utils.exceptions.BadRequest
         :raises ohsomeTools.utils.exceptions.Unauthorized
         :raises ohsomeTools.utils.exceptions.NotFound
         :raises ohsomeTools.utils.exceptions.MethodNotAllowed
         :raises ohsomeTools.utils.exceptions.PayloadTooLarge
+        :raises ohsomeTools.utils.exceptions.TooManyRequests
         :raises ohsomeTools.utils.exceptions.GenericClientError
         :raises ohsomeTools.utils.exceptions.InternalServerError
         :raises ohsomeTools.utils.exceptions.NotImplemented
@@ -201,12 +595,9 @@ class Client(QObject):
         :rtype: dict
         """
 
-        status_code = self.nam.http_call_result.status_code
-        message = (
-            self.nam.http_call_result.text
-            if self.nam.http_call_result.text != ""
-            else self.nam.http_call_result.reason
-        )
+        result = (nam or self.nam).http_call_result
+        status_code = result.status_code
+        message = result.text if result.text != "" else result.reason
         if message == "Network error: Connection refused":
             raise exceptions.ServiceUnavailable(
                 str(status_code),
@@ -214,6 +605,9 @@ class Client(QObject):
                 message
                 + f". Check your internet connection or if your local ohsome API instance is running.",
             )
+        if status_code is None:
+            # No HTTP reply, e.g. the request was aborted
+            return
         if status_code == 400:
             raise exceptions.BadRequest(
                 str(status_code),
@@ -238,6 +632,12 @@ class Client(QObject):
                 # error,
                 message,
             )
+        if status_code == 429:
+            raise exceptions.TooManyRequests(
+                str(status_code),
+                # error,
+                message,
+            )
         if status_code == 413:
             raise exceptions.PayloadTooLarge(
                 str(status_code),
@@ -284,9 +684,24 @@ class Client(QObject):
                 message,
             )
 
+    def metadata(self) -> {}:
+        """
+        Returns the provider metadata. A cached response is used if present,
+        a stale one is refreshed in the background.
+
+        :returns: ohsome API /metadata response body
+        :rtype: dict
+        """
+        metadata, stale = cache.metadata_cache().get(self.base_url)
+        if metadata is None:
+            return self.request(f"/metadata", {})
+        if stale:
+            refresh_metadata_in_background(self.provider)
+        return metadata
+
     def check_api_metadata(self, iface) -> {}:
         try:
-            return self.request(f"/metadata", {})
+            return self.metadata()
         except ServiceUnavailable as err:
             iface.messageBar().pushMessage(
                 "Warning",
@@ -331,6 +746,8 @@ class Client(QObject):
     def cancel(self):
         self.nam.abort()
         self.canceled = True
+        for pending in list(self._pending):
+            pending.cancel()
 
 
 class ProcessingClient(Client):
@@ -343,29 +760,12 @@ class ProcessingClient(Client):
             seconds.
         :type retry_timeout: int
         """
-        QObject.__init__(self)
-
-        self.base_url = provider["base_url"]
-
-        # self.session = requests.Session()
-        self.nam = networkaccessmanager.NetworkAccessManager(debug=False)
-
-        self.retry_timeout = timedelta(seconds=retry_timeout)
-        self.headers = {
-            "User-Agent": _USER_AGENT,
-            "Content-Type": "application/x-www-form-urlencoded",
-            "accept": "application/json",
-        }
-
-        # Save some references to retrieve in client instances
-        self.url = None
-        self.warnings = None
-        self.canceled = False
+        super().__init__(provider, retry_timeout)
         self.feedback = feedback
 
     def check_api_metadata(self, iface) -> {}:
         try:
-            return self.request(f"/metadata", {})
+            return self.metadata()
         except ServiceUnavailable as err:
             self.feedback.reportError(
                 f"Endpoint {self.url} not available. Check your internet connection or provider settings."
@@ -376,3 +776,353 @@ class ProcessingClient(Client):
                 f"Endpoint not healthy. Unknown error: {err}."
             )
             return False
+
+
+class RequestFuture(QObject):
+    """
+    The eventual response of Client.request_async. It is resolved in the
+    thread that started the request, whose event loop has to run.
+
+    Usage
+    -----
+    ::
+        future = clnt.request_async("/elements/count", {}, post_json=params)
+        future.add_done_callback(lambda f: print(f.result()))
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._cancel = None
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> dict:
+        """
+        :raises: The exception the request failed with.
+
+        :returns: ohsome API response body
+        :rtype: dict
+        """
+        if not self._done:
+            raise RuntimeError("The request has not finished yet.")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """
+        :returns: The exception the request failed with or None.
+        :rtype: Exception
+        """
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback with the future once it is resolved, immediately if
+        it already is.
+
+        :type callback: callable
+        """
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def cancel(self):
+        """Aborts the request, the future fails with Canceled."""
+        if not self._done and self._cancel is not None:
+            self._cancel()
+
+    def set_result(self, result: dict):
+        self._resolve(result, None)
+
+    def set_exception(self, exception: Exception):
+        self._resolve(None, exception)
+
+    def _resolve(self, result, exception):
+        if self._done:
+            return
+        self._result = result
+        self._exception = exception
+        self._done = True
+        for callback in self._callbacks:
+            # Exceptions must not escape into the Qt event loop
+            try:
+                callback(self)
+            except Exception as err:
+                logger.log(f"Request callback failed: {err}", 2)
+        self._callbacks = []
+        self.finished.emit()
+
+
+class _AsyncRequest:
+    """
+    Performs a request of Client.request_async with its own
+    NetworkAccessManager, retrying and waiting for the rate limit with
+    timers instead of blocking.
+    """
+
+    def __init__(self, clnt: Client, url, params, post_json, feature_sink):
+        self.client = clnt
+        self.url = url
+        self.params = params
+        self.post_json = post_json
+        self.feature_sink = feature_sink
+        self.future = RequestFuture()
+        self.future._cancel = self.cancel
+        self.first_request_time = datetime.now()
+        self.retry_counter = 0
+        self.canceled = False
+        self.nam = None
+        self.timer = None
+        self.request_kwargs = None
+        self.cache_key = None
+        self.parser = None
+        self.cache_entry = None
+        self.stream_errors = []
+        # Since when the request waits for the rate limit
+        self.queued = None
+        self.slot = clnt._takes_slot(url)
+        # The request shared with other callers and whether this one sends it
+        self.shared = None
+        self.waiter = None
+        self.sends = True
+
+    def start(self) -> RequestFuture:
+        self.client._pending.add(self)
+        if self.client.coalesce:
+            self.waiter = coalescing.Waiter(self._shared_finished)
+            self.shared, self.sends = coalescing.join(
+                coalescing.request_key(
+                    self.client.base_url, self.url, self.params, self.post_json
+                ),
+                self.waiter,
+            )
+            if not self.sends:
+                self.queued = time.perf_counter()
+                return self.future
+        try:
+            self.request_kwargs = self.client._request_kwargs(
+                self.url, self.params, self.post_json
+            )
+            if self.feature_sink is not None:
+                self.parser = streaming.FeatureCollectionParser(
+                    self.feature_sink
+                )
+            self.cache_key, cached_response = self.client._cached_response(
+                self.url, self.params, self.post_json, self.parser
+            )
+        except Exception as err:
+            self._fail(err)
+            return self.future
+        if cached_response is not None:
+            self._succeed(cached_response)
+        else:
+            self._attempt()
+        return self.future
+
+    def _shared_finished(self, waiter):
+        """Takes the reply of the request another caller sent."""
+        if self.canceled:
+            return
+        self.client.timings.add("queue", time.perf_counter() - self.queued)
+        self.queued = None
+        try:
+            body = self.shared.body()
+            if body is None:
+                # The sender was canceled, send it ourselves
+                self.start()
+                return
+            response = self.client._parse_shared(body, self.feature_sink)
+        except Exception as err:
+            self._fail(err)
+            return
+        self._succeed(response)
+
+    def _later(self, seconds: float, callback):
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(callback)
+        self.timer.start(max(0, int(seconds * 1000)))
+
+    def _attempt(self):
+        self.timer = None
+        if self.canceled:
+            return
+        if datetime.now() - self.first_request_time > self.client.retry_timeout:
+            self._fail(exceptions.Timeout())
+            return
+        if self.queued is None:
+            self.queued = time.perf_counter()
+        delay = self.client.limiter.try_acquire(self.slot)
+        if delay > 0:
+            self._later(delay, self._attempt)
+            return
+        self.client.timings.add("queue", time.perf_counter() - self.queued)
+        self.queued = None
+        self.nam = networkaccessmanager.NetworkAccessManager(debug=False)
+        try:
+            if self.parser is not None:
+                self.parser = streaming.FeatureCollectionParser(
+                    self.feature_sink
+                )
+            (
+                self.cache_entry,
+                stream_sink,
+                self.stream_errors,
+            ) = self.client._prepare_stream(
+                self.nam,
+                self.parser,
+                self.cache_key,
+                self.params,
+                self.post_json,
+            )
+            if self.shared is not None:
+                self.shared.restart()
+                stream_sink = self.shared.tee(stream_sink)
+            self.nam.request(
+                **self.request_kwargs,
+                blocking=False,
+                stream_sink=stream_sink,
+                finished_callback=self._finished,
+            )
+        except Exception as err:
+            self.client._release_limiter(self.nam, self.slot)
+            self._fail(err)
+
+    def _finished(self, result):
+        self.client._release_limiter(self.nam, self.slot)
+        self.client.timings.add_reply(result)
+        try:
+            if self.canceled:
+                raise exceptions.Canceled(
+                    "Canceled", "The request was canceled."
+                )
+            if result.ok:
+                if self.shared is not None:
+                    self.shared.received(result.content)
+                self._succeed(
+                    self.client._complete_response(
+                        self.url,
+                        self.params,
+                        self.post_json,
+                        result.content,
+                        self.cache_key,
+                        self.parser,
+                        self.cache_entry,
+                        self.stream_errors,
+                    )
+                )
+                return
+            if self.cache_entry:
+                self.cache_entry.discard()
+            if len(self.stream_errors):
+                raise self.stream_errors[0]
+            if isinstance(
+                result.exception, networkaccessmanager.RequestsExceptionTimeout
+            ) or (
+                self.nam.exception_class
+                is networkaccessmanager.RequestsExceptionTimeout
+            ):
+                raise exceptions.Timeout()
+            try:
+                self.client._check_status(self.nam)
+            except (
+                exceptions.Unauthorized,
+                exceptions.TooManyRequests,
+                exceptions.ServiceUnavailable,
+            ) as e:
+                if not self.client._is_retryable(e, self.nam):
+                    raise
+                self.retry_counter += 1
+                self._later(_retry_delay(self.retry_counter), self._attempt)
+                return
+            raise result.exception or networkaccessmanager.RequestsException(
+                result.reason
+            )
+        except Exception as err:
+            if self.cache_entry:
+                self.cache_entry.discard()
+            self._fail(err)
+
+    def _succeed(self, response: dict):
+        self.client._pending.discard(self)
+        if self.shared is not None and self.sends:
+            self.shared.finish()
+        self.future.set_result(response)
+
+    def _fail(self, exception: Exception):
+        self.client._pending.discard(self)
+        if self.shared is not None and self.sends:
+            self.shared.finish(_shared_exception(exception, self.canceled))
+        self.future.set_exception(exception)
+
+    def cancel(self):
+        if self.canceled:
+            return
+        self.canceled = True
+        if not self.sends:
+            # Only this caller stops waiting, the request goes on
+            self.shared.leave(self.waiter)
+            self._fail(
+                exceptions.Canceled("Canceled", "The request was canceled.")
+            )
+            return
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+        if self.nam is not None and self.nam.reply is not None:
+            # _finished fails the future
+            self.nam.abort()
+        else:
+            self._fail(
+                exceptions.Canceled("Canceled", "The request was canceled.")
+            )
+
+
+def wait_all(futures: [RequestFuture], canceled=None):
+    """
+    Runs one event loop until all futures are resolved.
+
+    :param futures: The futures of asynchronous requests started in the
+        calling thread.
+    :type futures: list
+
+    :param canceled: Returns True if the requests should be canceled.
+    :type canceled: callable
+    """
+    pending = [future for future in futures if not future.done()]
+    if not len(pending):
+        return
+    loop = QEventLoop()
+
+    def quit_if_done(*args):
+        if all(future.done() for future in pending):
+            loop.quit()
+
+    def check_canceled():
+        if canceled():
+            for future in pending:
+                future.cancel()
+
+    for future in pending:
+        future.finished.connect(quit_if_done)
+    timer = None
+    if canceled is not None:
+        timer = QTimer()
+        timer.timeout.connect(check_canceled)
+        timer.start(_CANCEL_CHECK_INTERVAL)
+    # Futures may have been resolved while connecting
+    if not all(future.done() for future in pending):
+        loop.exec_(QEventLoop.ExcludeUserInputEvents)
+    if timer is not None:
+        timer.stop()
+    for future in pending:
+        future.finished.disconnect(quit_if_done)
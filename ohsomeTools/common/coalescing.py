@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Shares the reply of a request in flight with the callers that send the
+same request meanwhile, e.g. the algorithms of a processing model or the
+jobs of a batch run checking the metadata at once.
+"""
+
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ohsomeTools.common import cache
+from ohsomeTools.utils import configmanager, exceptions
+
+DEFAULT_COALESCING_SETTINGS = {
+    "enabled": True,
+}
+
+# The requests in flight by key
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _coalescing_settings() -> dict:
+    settings = DEFAULT_COALESCING_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("coalescing", {})
+        or {}
+    )
+    return settings
+
+
+def enabled() -> bool:
+    """
+    :returns: Whether runtime.coalescing is enabled.
+    :rtype: bool
+    """
+    return bool(_coalescing_settings()["enabled"])
+
+
+class Waiter(QObject):
+    """
+    A caller waiting for the reply of a request another caller sends.
+
+    A callback is called in the thread that created the waiter, through
+    its event loop if the reply arrives in another thread. Blocking callers
+    wait instead.
+    """
+
+    _notify = pyqtSignal()
+
+    def __init__(self, callback=None):
+        """
+        :param callback: Called with the waiter once the request finished.
+        :type callback: callable
+        """
+        QObject.__init__(self)
+        self.callback = callback
+        self._event = threading.Event()
+        if callback is not None:
+            # Queued if emitted from another thread
+            self._notify.connect(self._notified)
+
+    def _notified(self):
+        self.callback(self)
+
+    def notify(self):
+        self._event.set()
+        if self.callback is not None:
+            self._notify.emit()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Blocks until the request finished.
+
+        :returns: False if the timeout elapsed first.
+        :rtype: bool
+        """
+        return self._event.wait(timeout)
+
+
+class SharedRequest:
+    """
+    A request in flight that callers of the same request wait for instead
+    of sending it again. They get the raw body of the reply and parse it
+    themselves, so no parsed objects are shared between threads.
+
+    Callers may join until the first chunk of a streamed body arrives.
+    Only if someone waits by then the chunks are kept, otherwise the
+    request is not shared any more. If the sender is canceled, the waiters
+    send the request again; waiters that cancel just stop waiting.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.thread = threading.get_ident()
+        self.waiters = []
+        self.joinable = True
+        self.finished = False
+        self._chunks = None
+        self._body = None
+        self._exception = None
+        self._lock = threading.Lock()
+
+    def add(self, waiter: Waiter) -> bool:
+        """
+        :returns: False if the request can't be joined any more.
+        :rtype: bool
+        """
+        with self._lock:
+            if not self.joinable:
+                return False
+            self.waiters.append(waiter)
+            return True
+
+    def leave(self, waiter: Waiter):
+        """Stops waiting, e.g. because the waiter was canceled."""
+        with self._lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            if not len(self.waiters) and self._chunks is not None:
+                # Nobody needs the chunks any more
+                self._chunks = None
+                self.joinable = False
+
+    def tee(self, stream_sink):
+        """
+        Wraps the sink of a streamed body to keep the chunks for the
+        waiters.
+
+        :param stream_sink: The sink of the sender or None.
+        :type stream_sink: callable
+
+        :rtype: callable
+        """
+        if stream_sink is None:
+            return None
+
+        def shared_sink(data):
+            with self._lock:
+                if self._chunks is None and self.joinable:
+                    if len(self.waiters):
+                        self._chunks = []
+                    else:
+                        # Callers joining later would miss this chunk
+                        self.joinable = False
+                if self._chunks is not None:
+                    self._chunks.append(bytes(data))
+            stream_sink(data)
+
+        return shared_sink
+
+    def restart(self):
+        """Drops the chunks of a failed attempt before a retry."""
+        with self._lock:
+            if self._chunks is not None:
+                self._chunks = []
+
+    def received(self, content: bytes):
+        """Keeps the body of a reply that was not streamed."""
+        with self._lock:
+            if self._chunks is not None:
+                return
+            if len(self.waiters) and content:
+                self._body = bytes(content)
+            else:
+                # Nobody waits, callers joining now would get no body
+                self.joinable = False
+
+    def finish(self, exception: Exception = None):
+        """
+        Called by the sender once its request succeeded or failed and
+        notifies the waiters.
+
+        :param exception: The exception the request failed with.
+        :type exception: Exception
+        """
+        with _shared_lock:
+            if _shared.get(self.key) is self:
+                del _shared[self.key]
+        with self._lock:
+            self.joinable = False
+            self.finished = True
+            if self._chunks is not None:
+                self._body = b"".join(self._chunks)
+                self._chunks = None
+            self._exception = exception
+            waiters = list(self.waiters)
+        for waiter in waiters:
+            waiter.notify()
+
+    def body(self) -> bytes:
+        """
+        :raises: The exception the request failed with, unless the sender
+            was canceled.
+
+        :returns: The body of the reply or None if the waiter has to send
+            the request itself, e.g. because the sender was canceled or
+            answered from the response cache.
+        :rtype: bytes
+        """
+        if isinstance(self._exception, exceptions.Canceled):
+            return None
+        if self._exception is not None:
+            raise self._exception
+        return self._body
+
+
+def request_key(base_url: str, url: str, params, post_json=None) -> str:
+    """
+    Normalizes a request, the same as the key of the response cache.
+
+    :rtype: str
+    """
+    return cache.ResponseCache.key(base_url, url, params, post_json)
+
+
+def join(key: str, waiter: Waiter, blocking: bool = False):
+    """
+    Joins the request with the key in flight or registers a new one that
+    the caller has to send and finish.
+
+    :param key: See request_key.
+    :type key: str
+
+    :param waiter: Is notified when the joined request finished.
+    :type waiter: Waiter
+
+    :param blocking: The caller blocks its thread while it waits. It can't
+        wait for a request of its own thread, whose reply would never be
+        handled.
+    :type blocking: bool
+
+    :returns: The request and True if the caller has to send it.
+    :rtype: (SharedRequest, bool)
+    """
+    with _shared_lock:
+        shared = _shared.get(key)
+        if (
+            shared is not None
+            and not (blocking and shared.thread == threading.get_ident())
+            and shared.add(waiter)
+        ):
+            return shared, False
+        shared = SharedRequest(key)
+        if key not in _shared or not _shared[key].joinable:
+            _shared[key] = shared
+        return shared, True
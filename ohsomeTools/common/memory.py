@@ -0,0 +1,766 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+
+"""
+Builds memory provider layers directly from parsed features and result
+rows, so small results are neither written to a file nor read back by OGR.
+"""
+
+import json
+import os
+import threading
+
+from osgeo import ogr
+from PyQt5.QtCore import QDateTime, Qt, QThread, QVariant
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsField,
+    QgsGeometry,
+    QgsProcessingUtils,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+
+from ohsomeTools.common import writer
+from ohsomeTools.utils import configmanager, exceptions
+
+DEFAULT_MEMORY_OUTPUT_SETTINGS = {
+    "enabled": True,
+    "max_features": 20000,
+}
+
+# Features that are added to a layer at once. The field types are inferred
+# from the first batch.
+BATCH_SIZE = 1000
+
+TIMESTAMP_COLUMNS = writer.TIMESTAMP_FIELDS + writer.RESULT_TIMESTAMP_FIELDS
+
+
+def _memory_output_settings() -> dict:
+    settings = DEFAULT_MEMORY_OUTPUT_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("memory_output", {})
+        or {}
+    )
+    return settings
+
+
+def result_size(result: dict) -> int:
+    """
+    :param result: An ohsome API response.
+    :type result: dict
+
+    :returns: The number of features or result rows of the response.
+    :rtype: int
+    """
+    if "features" in result:
+        return len(result["features"])
+    if "groupByResult" in result:
+        return sum(
+            len(group.get("result") or []) for group in result["groupByResult"]
+        )
+    return len(result.get("result") or result.get("ratioResult") or [])
+
+
+def use_memory_output(output_path: str, result: dict = None) -> bool:
+    """
+    Checks whether a result should be loaded into memory layers instead of
+    being written to output_path. Only results up to
+    runtime.memory_output.max_features going to a temporary file are kept in
+    memory, explicitly chosen outputs are always written.
+
+    :param output_path: The output file of the result.
+    :type output_path: str
+
+    :param result: The ohsome API response, None for features that are
+        still to be received, see FeatureOutput.
+    :type result: dict
+
+    :rtype: bool
+    """
+    settings = _memory_output_settings()
+    if not settings["enabled"]:
+        return False
+    if output_path and not output_path.startswith(
+        QgsProcessingUtils.tempFolder()
+    ):
+        return False
+    return result is None or result_size(result) <= int(
+        settings["max_features"]
+    )
+
+
+def _field_type(name: str, values: list) -> QVariant.Type:
+    """Infers the type of a field from the values of a batch."""
+    if name in TIMESTAMP_COLUMNS:
+        return QVariant.DateTime
+    values = [value for value in values if value is not None]
+    if not len(values):
+        return QVariant.String
+    if all(isinstance(value, bool) for value in values):
+        return QVariant.Bool
+    if all(
+        isinstance(value, int) and not isinstance(value, bool)
+        for value in values
+    ):
+        return QVariant.LongLong
+    if all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in values
+    ):
+        return QVariant.Double
+    return QVariant.String
+
+
+def _value(field_type: QVariant.Type, value):
+    if value is None:
+        return None
+    if field_type == QVariant.DateTime:
+        return QDateTime.fromString(str(value), Qt.ISODate)
+    if field_type == QVariant.String and not isinstance(value, str):
+        return (
+            json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        )
+    return value
+
+
+def _property(value):
+    """Converts an attribute value back to a GeoJSON property value."""
+    if isinstance(value, QVariant) and value.isNull():
+        return None
+    if isinstance(value, QDateTime):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    return value
+
+
+def _add_fields(layer: QgsVectorLayer, types: dict, rows: [dict]):
+    """Adds the fields of rows that the layer doesn't have yet."""
+    values = {}
+    for row in rows:
+        for name, value in row.items():
+            if name not in types:
+                values.setdefault(name, []).append(value)
+    if not len(values):
+        return
+    fields = []
+    for name, field_values in values.items():
+        types[name] = _field_type(name, field_values)
+        fields.append(QgsField(name, types[name]))
+    layer.dataProvider().addAttributes(fields)
+    layer.updateFields()
+
+
+def _add_features(
+    layer: QgsVectorLayer, types: dict, rows: [dict], geometries=None
+):
+    _add_fields(layer, types, rows)
+    fields = layer.fields()
+    features = []
+    for index, row in enumerate(rows):
+        feature = QgsFeature(fields)
+        for name, value in row.items():
+            if value is not None:
+                feature.setAttribute(name, _value(types[name], value))
+        if geometries is not None and geometries[index] is not None:
+            feature.setGeometry(geometries[index])
+        features.append(feature)
+    if not layer.dataProvider().addFeatures(features):
+        raise exceptions.PluginError(
+            "Output error",
+            f"Features could not be added to the memory layer {layer.name()}.",
+        )
+
+
+def _memory_layer(geometry_type: str, name: str) -> QgsVectorLayer:
+    if geometry_type == writer.NO_GEOMETRY:
+        uri = "None"
+    else:
+        uri = f"{geometry_type}?crs=EPSG:4326&index=yes"
+    layer = QgsVectorLayer(uri, name, "memory")
+    if not layer.isValid():
+        raise exceptions.PluginError(
+            "Output error", f"The memory layer {name} could not be created."
+        )
+    return layer
+
+
+def memory_table(rows: [dict], header, name: str) -> QgsVectorLayer:
+    """
+    Builds a table without geometry from result rows of an aggregation.
+
+    :param rows: The rows.
+    :type rows: list
+
+    :param header: The column names in order.
+    :type header: list
+
+    :param name: The layer name.
+    :type name: str
+
+    :rtype: QgsVectorLayer
+    """
+    layer = _memory_layer(writer.NO_GEOMETRY, name)
+    # Keep the column order of the header
+    types = {}
+    _add_fields(
+        layer,
+        types,
+        [
+            {column: row.get(column) for column in header}
+            for row in rows[:BATCH_SIZE]
+        ],
+    )
+    for start in range(0, len(rows), BATCH_SIZE):
+        _add_features(layer, types, rows[start : start + BATCH_SIZE])
+    return layer
+
+
+class MemoryFeatureWriter:
+    """
+    Builds one memory layer per geometry type from GeoJSON features, as the
+    writer.FeatureWriter does with files. The features are added in batches
+    of BATCH_SIZE and the field types are inferred from the first batch of
+    every layer.
+
+    Usage
+    -----
+    ::
+        memory_writer = MemoryFeatureWriter("extraction")
+        for feature in features:
+            memory_writer.write(feature)
+        for vlayer in memory_writer.close():
+            QgsProject.instance().addMapLayer(vlayer)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        keep_geometry_less: bool = False,
+        combine_single_with_multi_geometries: bool = False,
+        thread: QThread = None,
+    ):
+        """
+        :param name: The name prefix of the layers.
+        :type name: str
+
+        :param keep_geometry_less: Add features without geometry.
+        :type keep_geometry_less: bool
+
+        :param combine_single_with_multi_geometries: Add single geometries
+            as multi geometries of the same type, into one layer.
+        :type combine_single_with_multi_geometries: bool
+
+        :param thread: The thread the layers are moved to once created,
+            e.g. the one adding them to the project while the features are
+            added by others.
+        :type thread: QThread
+        """
+        self.name = name
+        self.thread = thread
+        self.keep_geometry_less = keep_geometry_less
+        self.combine_single_with_multi_geometries = (
+            combine_single_with_multi_geometries
+        )
+        self.feature_count = 0
+        self.layers = {}
+        self._types = {}
+        self._pending = {}
+
+    def layer_name(self, geometry_type: str) -> str:
+        return f"{self.name}_{geometry_type}"
+
+    def write(self, feature: dict):
+        """
+        Adds a GeoJSON feature, see writer.partition_feature.
+
+        :param feature: The GeoJSON feature.
+        :type feature: dict
+        """
+        for geometry_type, geometry, properties in writer.partition_feature(
+            feature,
+            self.keep_geometry_less,
+            self.combine_single_with_multi_geometries,
+        ):
+            if geometry is not None:
+                geometry = self._qgs_geometry(geometry_type, geometry)
+            self._write(geometry_type, geometry, properties)
+
+    @staticmethod
+    def _qgs_geometry(geometry_type: str, geometry: dict) -> QgsGeometry:
+        ogr_geometry = ogr.CreateGeometryFromJson(json.dumps(geometry))
+        if ogr_geometry is None:
+            raise exceptions.GeometryError(
+                "error",
+                "Error constructing geometries from the GeoJSON response: "
+                f"invalid {geometry_type}",
+            )
+        qgs_geometry = QgsGeometry()
+        qgs_geometry.fromWkb(ogr_geometry.ExportToWkb())
+        return qgs_geometry
+
+    def _write(self, geometry_type: str, geometry, properties: dict):
+        pending = self._pending.setdefault(geometry_type, [])
+        pending.append((geometry, properties))
+        self.feature_count += 1
+        if len(pending) >= BATCH_SIZE:
+            self._flush(geometry_type)
+
+    def _flush(self, geometry_type: str):
+        pending = self._pending.pop(geometry_type, [])
+        if not len(pending):
+            return
+        layer = self.layers.get(geometry_type)
+        if layer is None:
+            layer = _memory_layer(geometry_type, self.layer_name(geometry_type))
+            if self.thread is not None and layer.thread() != self.thread:
+                layer.moveToThread(self.thread)
+            self.layers[geometry_type] = layer
+            self._types[geometry_type] = {}
+        _add_features(
+            layer,
+            self._types[geometry_type],
+            [properties for _, properties in pending],
+            [geometry for geometry, _ in pending],
+        )
+
+    def _flush_all(self):
+        for geometry_type in list(self._pending):
+            self._flush(geometry_type)
+
+    def _properties(self, feature: QgsFeature) -> dict:
+        return {
+            name: _property(value)
+            for name, value in zip(
+                feature.fields().names(), feature.attributes()
+            )
+        }
+
+    def repeated_features(self, fields: [str]):
+        """
+        Yields the added features that share their values of fields with
+        another added feature, as the writer.FeatureWriter does.
+
+        :param fields: The property names, the first one is
+            writer.ID_FIELD.
+        :type fields: list
+
+        :returns: A generator of (reference, properties, geometry as WKB or
+            None) tuples. The features must not be changed before it is
+            exhausted.
+        """
+        self._flush_all()
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        counts = {}
+        for layer in self.layers.values():
+            names = layer.fields().names()
+            if writer.ID_FIELD not in names:
+                continue
+            for feature in layer.getFeatures(request):
+                key = tuple(
+                    _property(feature[name]) if name in names else None
+                    for name in fields
+                )
+                if key[0] is not None:
+                    counts[key] = counts.get(key, 0) + 1
+        for geometry_type, layer in self.layers.items():
+            names = layer.fields().names()
+            if writer.ID_FIELD not in names:
+                continue
+            for feature in layer.getFeatures():
+                properties = self._properties(feature)
+                key = tuple(properties.get(name) for name in fields)
+                if counts.get(key, 0) < 2:
+                    continue
+                yield (
+                    (geometry_type, feature.id()),
+                    properties,
+                    bytes(feature.geometry().asWkb())
+                    if feature.hasGeometry()
+                    else None,
+                )
+
+    def update_features(self, changes: dict):
+        """
+        Changes properties of added features.
+
+        :param changes: The new property values by feature reference, see
+            repeated_features.
+        :type changes: dict
+        """
+        layer_changes = {}
+        for (geometry_type, feature_id), properties in changes.items():
+            layer = self.layers[geometry_type]
+            types = self._types[geometry_type]
+            _add_fields(layer, types, [properties])
+            layer_changes.setdefault(geometry_type, {})[feature_id] = {
+                layer.fields().indexOf(name): _value(types[name], value)
+                for name, value in properties.items()
+            }
+        for geometry_type, attribute_changes in layer_changes.items():
+            if (
+                not self.layers[geometry_type]
+                .dataProvider()
+                .changeAttributeValues(attribute_changes)
+            ):
+                raise exceptions.PluginError(
+                    "Output error",
+                    "Features could not be changed in the memory layer "
+                    f"{self.layer_name(geometry_type)}.",
+                )
+
+    def delete_features(self, references: list):
+        """
+        Removes added features.
+
+        :param references: The references of the features, see
+            repeated_features.
+        :type references: list
+        """
+        feature_ids = {}
+        for geometry_type, feature_id in references:
+            feature_ids.setdefault(geometry_type, []).append(feature_id)
+        for geometry_type, ids in feature_ids.items():
+            if (
+                not self.layers[geometry_type]
+                .dataProvider()
+                .deleteFeatures(ids)
+            ):
+                raise exceptions.PluginError(
+                    "Output error",
+                    "Features could not be removed from the memory layer "
+                    f"{self.layer_name(geometry_type)}.",
+                )
+            self.feature_count -= len(ids)
+
+    def unite_features(self, references: list):
+        """
+        Unites the geometries of added features into the first one and
+        removes the others, as the writer.FeatureWriter does.
+
+        :param references: The references of the features, see
+            repeated_features.
+        :type references: list
+        """
+        features = [
+            next(
+                self.layers[geometry_type].getFeatures(
+                    QgsFeatureRequest(feature_id)
+                )
+            )
+            for geometry_type, feature_id in references
+        ]
+        first = features[0]
+        geometries = [
+            feature.geometry() for feature in features if feature.hasGeometry()
+        ]
+        self.delete_features(references[1:])
+        if not len(geometries):
+            return
+        union = QgsGeometry.unaryUnion(geometries)
+        if union.isNull() or (
+            first.hasGeometry() and first.geometry().equals(union)
+        ):
+            return
+        geometry_type = QgsWkbTypes.displayString(
+            QgsWkbTypes.flatType(union.wkbType())
+        )
+        if (
+            self.combine_single_with_multi_geometries
+            and geometry_type in writer.SINGLE_TO_MULTI
+        ):
+            union.convertToMultiType()
+            geometry_type = writer.SINGLE_TO_MULTI[geometry_type]
+        if geometry_type not in writer.GEOMETRY_TYPES:
+            # E.g. a geometry collection, the first part is kept
+            return
+        first_type, first_id = references[0]
+        if geometry_type == first_type:
+            if (
+                not self.layers[first_type]
+                .dataProvider()
+                .changeGeometryValues({first_id: union})
+            ):
+                raise exceptions.PluginError(
+                    "Output error",
+                    "A feature could not be changed in the memory layer "
+                    f"{self.layer_name(first_type)}.",
+                )
+            return
+        properties = self._properties(first)
+        self.delete_features([references[0]])
+        self._write(
+            geometry_type,
+            union,
+            {
+                name: value
+                for name, value in properties.items()
+                if value is not None
+            },
+        )
+        self._flush(geometry_type)
+
+    def features(self):
+        """
+        Yields the added features as GeoJSON features, e.g. to write them
+        to a file instead.
+        """
+        self._flush_all()
+        for layer in self.layers.values():
+            for feature in layer.getFeatures():
+                yield {
+                    "type": "Feature",
+                    "geometry": json.loads(feature.geometry().asJson())
+                    if feature.hasGeometry()
+                    else None,
+                    "properties": self._properties(feature),
+                }
+
+    def _fill_validity_intervals(self, geometry_type: str):
+        """
+        Sets the missing end of every validity interval to the start of the
+        next version of the same OSM element, as the writer.FeatureWriter
+        does. The last version of an element is valid until one day after
+        the youngest start in the layer.
+        """
+        layer = self.layers[geometry_type]
+        fields = writer.validity_fields(layer.fields().names())
+        if fields is None:
+            return
+        date_start, date_end = fields
+        if date_end not in self._types[geometry_type]:
+            self._types[geometry_type][date_end] = QVariant.DateTime
+            layer.dataProvider().addAttributes(
+                [QgsField(date_end, QVariant.DateTime)]
+            )
+            layer.updateFields()
+        end_index = layer.fields().indexOf(date_end)
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(
+            [writer.ID_FIELD, date_start, date_end], layer.fields()
+        )
+        versions = []
+        for feature in layer.getFeatures(request):
+            start = feature[date_start]
+            if isinstance(start, QDateTime) and start.isValid():
+                versions.append(
+                    (
+                        str(feature[writer.ID_FIELD]),
+                        start.toMSecsSinceEpoch(),
+                        start,
+                        feature.id(),
+                        feature[date_end],
+                    )
+                )
+        if not len(versions):
+            return
+        youngest = max(version[2] for version in versions).addDays(1)
+        versions.sort(key=lambda version: version[:2])
+        changes = {}
+        for index, (osm_id, _, _, feature_id, end) in enumerate(versions):
+            if isinstance(end, QDateTime) and end.isValid():
+                continue
+            following = (
+                versions[index + 1] if index + 1 < len(versions) else None
+            )
+            valid_to = (
+                following[2]
+                if following is not None and following[0] == osm_id
+                else youngest
+            )
+            changes[feature_id] = {end_index: valid_to}
+        if len(changes):
+            layer.dataProvider().changeAttributeValues(changes)
+
+    def close(self) -> [QgsVectorLayer]:
+        """
+        Adds the remaining features.
+
+        :returns: The layers, one per geometry type.
+        :rtype: list
+        """
+        self._flush_all()
+        for geometry_type, layer in self.layers.items():
+            self._fill_validity_intervals(geometry_type)
+            layer.updateExtents()
+        return list(self.layers.values())
+
+
+class FeatureOutput:
+    """
+    Receives the features of an extraction while they are downloaded and
+    writes them to the output right away.
+
+    Features going to a temporary file are added to memory layers, see
+    MemoryFeatureWriter, until there are more than
+    runtime.memory_output.max_features of them. Then they are moved to a
+    writer.FeatureWriter, which writes the others as well. Features written
+    more than once, e.g. by several tiles, are merged in the output, see
+    tiling.deduplicate_output.
+
+    The features of concurrent requests may be written from several
+    threads.
+
+    Usage
+    -----
+    ::
+        feature_output = FeatureOutput("extraction.gpkg")
+        clnt.request(url, {}, post_json, feature_sink=feature_output.write)
+        feature_output.close()
+        for vlayer in feature_output.layers():
+            QgsProject.instance().addMapLayer(vlayer)
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        keep_geometry_less: bool = False,
+        combine_single_with_multi_geometries: bool = False,
+    ):
+        """
+        :param output_path: The output file, see writer.output_format.
+        :type output_path: str
+
+        :param keep_geometry_less: Write features without geometry.
+        :type keep_geometry_less: bool
+
+        :param combine_single_with_multi_geometries: Write single geometries
+            as multi geometries of the same type, into one table.
+        :type combine_single_with_multi_geometries: bool
+        """
+        self.output_path = output_path
+        self.keep_geometry_less = keep_geometry_less
+        self.combine_single_with_multi_geometries = (
+            combine_single_with_multi_geometries
+        )
+        self.max_memory_features = None
+        if use_memory_output(output_path):
+            self.max_memory_features = int(
+                _memory_output_settings()["max_features"]
+            )
+        self.in_memory = self.max_memory_features is not None
+        # Memory layers are handed to the thread that created the output
+        self.thread = QThread.currentThread()
+        self._writer = None
+        self._outputs = None
+        self._lock = threading.Lock()
+
+    @property
+    def feature_count(self) -> int:
+        return 0 if self._writer is None else self._writer.feature_count
+
+    @property
+    def warnings(self) -> [str]:
+        return getattr(self._writer, "warnings", [])
+
+    def _file_writer(self) -> writer.FeatureWriter:
+        return writer.FeatureWriter(
+            self.output_path,
+            keep_geometry_less=self.keep_geometry_less,
+            combine_single_with_multi_geometries=self.combine_single_with_multi_geometries,
+        )
+
+    def write(self, feature: dict):
+        """
+        Writes a GeoJSON feature.
+
+        :param feature: The GeoJSON feature.
+        :type feature: dict
+        """
+        with self._lock:
+            if self._writer is None:
+                if self.in_memory:
+                    self._writer = MemoryFeatureWriter(
+                        os.path.splitext(os.path.basename(self.output_path))[0],
+                        keep_geometry_less=self.keep_geometry_less,
+                        combine_single_with_multi_geometries=self.combine_single_with_multi_geometries,
+                        thread=self.thread,
+                    )
+                else:
+                    self._writer = self._file_writer()
+            elif (
+                self.in_memory
+                and self._writer.feature_count >= self.max_memory_features
+            ):
+                self._spill()
+            self._writer.write(feature)
+
+    def _spill(self):
+        """Moves the features of the memory layers to the output file."""
+        file_writer = self._file_writer()
+        try:
+            for feature in self._writer.features():
+                file_writer.write(feature)
+        except Exception:
+            file_writer.discard()
+            raise
+        self._writer = file_writer
+        self.in_memory = False
+
+    def repeated_features(self, fields: [str]):
+        """See writer.FeatureWriter.repeated_features."""
+        if self._writer is not None:
+            yield from self._writer.repeated_features(fields)
+
+    def update_features(self, changes: dict):
+        """See writer.FeatureWriter.update_features."""
+        if len(changes):
+            self._writer.update_features(changes)
+
+    def delete_features(self, references: list):
+        """See writer.FeatureWriter.delete_features."""
+        if len(references):
+            self._writer.delete_features(references)
+
+    def unite_features(self, references: list):
+        """See writer.FeatureWriter.unite_features."""
+        self._writer.unite_features(references)
+
+    def close(self):
+        """Finishes the output."""
+        if self._writer is not None:
+            self._outputs = self._writer.close()
+
+    def discard(self):
+        """Drops the written features, an existing output file is kept."""
+        if self._writer is not None and not self.in_memory:
+            self._writer.discard()
+        self._writer = None
+
+    def layers(self) -> [QgsVectorLayer]:
+        """
+        :returns: The layers of the closed output, one per geometry type.
+        :rtype: list
+        """
+        if self.in_memory:
+            return list(self._outputs or [])
+        return [
+            QgsVectorLayer(uri, name, "ogr")
+            for uri, name in self._outputs or []
+        ]
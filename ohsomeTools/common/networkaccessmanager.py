@@ -24,9 +24,11 @@ from builtins import str
 __author__ = "Alessandro Pasotti"
 __date__ = "August 2016"
 
+import gzip
 import re
 import io
 import time
+import zlib
 import urllib.request, urllib.error, urllib.parse
 
 from qgis.PyQt.QtCore import QUrl, QEventLoop
@@ -56,6 +58,49 @@ class RequestsExceptionUserAbort(RequestsException):
     pass
 
 
+class Inflater(object):
+    """
+    Decompresses a gzip or deflate encoded body chunk by chunk.
+
+    Usage
+    -----
+    ::
+        inflater = Inflater("gzip")
+        data = inflater.feed(chunk) + inflater.flush()
+    """
+
+    def __init__(self, content_encoding):
+        """
+        :param content_encoding: The Content-Encoding header of the reply.
+            Other encodings than gzip and deflate are passed through.
+        :type content_encoding: str
+        """
+        self.encoding = (content_encoding or "").strip().lower()
+        self._decompressor = None
+        self._raw = False
+        if self.encoding in ["gzip", "x-gzip", "deflate"]:
+            # Detects the gzip and zlib header
+            self._decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+
+    def feed(self, data):
+        if self._decompressor is None or not len(data):
+            return data
+        try:
+            return self._decompressor.decompress(data)
+        except zlib.error:
+            # Some servers send deflate without the zlib header
+            if self.encoding != "deflate" or self._raw:
+                raise
+            self._raw = True
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data)
+
+    def flush(self):
+        if self._decompressor is None:
+            return b""
+        return self._decompressor.flush()
+
+
 class Map(dict):
     """
     Example:
@@ -160,6 +205,9 @@ class NetworkAccessManager(object):
         )
         self.authid = authid
         self.reply = None
+        self.stream_sink = None
+        self.inflater = None
+        self.inflate_error = None
         self.debug = debug
         self.exception_class = exception_class
         self.on_abort = False
@@ -174,8 +222,15 @@ class NetworkAccessManager(object):
                 "headers": {},
                 "reason": "",
                 "exception": None,
+                "received_bytes": 0,
+                "sent_bytes": 0,
+                "timings": {},
             }
         )
+        self._started = None
+        self._uploaded = None
+        self._first_byte = None
+        self._sink_seconds = 0.0
 
     def msg_log(self, msg):
         if self.debug:
@@ -196,10 +251,31 @@ class NetworkAccessManager(object):
         redirections=DEFAULT_MAX_REDIRECTS,
         connection_type=None,
         blocking=True,
+        stream_sink=None,
+        finished_callback=None,
     ):
         """
         Make a network request by calling QgsNetworkAccessManager.
         redirections argument is ignored and is here only for httplib2 compatibility.
+
+        If stream_sink is set, the body of a successful reply is passed to it
+        in chunks as it arrives and is not kept in the result content.
+
+        If the headers contain Accept-Encoding, gzip and deflate encoded
+        replies are inflated here, also while streaming. If they contain
+        Content-Encoding: gzip, the body of a POST or PUT request is
+        compressed.
+
+        The http_call_result holds the sent and received bytes and in
+        timings the seconds of the upload, the wait for the first byte of
+        the reply and its download, without the time spent in the stream
+        sink.
+
+        In non blocking mode, finished_callback is called with the
+        http_call_result once the reply has finished and was cleaned up.
+        Every request that should be in flight at the same time needs its
+        own NetworkAccessManager; they share the QgsNetworkAccessManager
+        of the thread.
         """
         self.msg_log("http_call request: {0}".format(url))
 
@@ -220,27 +296,30 @@ class NetworkAccessManager(object):
         )
 
         self.blocking_mode = blocking
+        self.stream_sink = stream_sink
+        self.finished_callback = finished_callback
         req = QNetworkRequest()
         # Avoid double quoting form QUrl
         url = urllib.parse.unquote(url)
         req.setUrl(QUrl(url))
+        content_type = ""
+        content_encoding = ""
         if headers is not None:
-            # This fixes a wierd error with compressed content not being correctly
-            # inflated.
-            # If you set the header on the QNetworkRequest you are basically telling
-            # QNetworkAccessManager "I know what I'm doing, please don't do any content
-            # encoding processing".
+            # If you set Accept-Encoding on the QNetworkRequest you are
+            # basically telling QNetworkAccessManager "I know what I'm doing,
+            # please don't do any content encoding processing". The reply is
+            # inflated in replyReadyRead and replyFinished then.
             # See: https://bugs.webkit.org/show_bug.cgi?id=63696#c1
-            try:
-                del headers["Accept-Encoding"]
-            except KeyError:
-                pass
-            content_type = ""
             try:
                 content_type = headers["Content-Type"]
             except KeyError:
                 pass
+            if method.lower() in ["post", "put"]:
+                content_encoding = headers.get("Content-Encoding") or ""
             for k, v in list(headers.items()):
+                if k == "Content-Encoding" and not content_encoding:
+                    # A GET request has no body to encode
+                    continue
                 self.msg_log("Setting header %s to %s" % (k, v))
                 if k and v:
                     req.setRawHeader(k.encode(), v.encode())
@@ -259,6 +338,11 @@ class NetworkAccessManager(object):
             "Sending %s request to %s" % (method.upper(), req.url().toString())
         )
         self.on_abort = False
+        self.inflater = None
+        self.inflate_error = None
+        self.http_call_result.received_bytes = 0
+        self.http_call_result.sent_bytes = 0
+        self.http_call_result.timings = {}
         headers = {str(h): str(req.rawHeader(h)) for h in req.rawHeaderList()}
         for k, v in list(headers.items()):
             self.msg_log("%s: %s" % (k, v))
@@ -274,8 +358,13 @@ class NetworkAccessManager(object):
                     body = urllib.parse.urlencode(body).encode()
                 else:
                     body = str(json.dumps(body)).encode(encoding="utf-8")
+            if content_encoding.lower() == "gzip" and body:
+                body = gzip.compress(body)
+            self.http_call_result.sent_bytes = len(body or b"")
+            self._start_timings()
             self.reply = func(req, body)
         else:
+            self._start_timings()
             self.reply = func(req)
         if self.authid:
             self.msg_log("Update reply w/ authid: {0}".format(self.authid))
@@ -290,6 +379,8 @@ class NetworkAccessManager(object):
         self.reply.sslErrors.connect(self.sslErrors)
         self.reply.finished.connect(self.replyFinished)
         self.reply.downloadProgress.connect(self.downloadProgress)
+        self.reply.uploadProgress.connect(self.uploadProgress)
+        self.reply.readyRead.connect(self.replyReadyRead)
 
         # block if blocking mode otherwise return immediatly
         # it's up to the caller to manage listeners in case of no blocking mode
@@ -318,10 +409,86 @@ class NetworkAccessManager(object):
 
         return (self.http_call_result, self.http_call_result.content)
 
+    def _start_timings(self):
+        self._started = time.perf_counter()
+        self._uploaded = None
+        self._first_byte = None
+        self._sink_seconds = 0.0
+
+    def _finish_timings(self):
+        """
+        Splits the duration of the request into the upload of the body,
+        the wait for the first byte of the reply and its download. The time
+        spent in the stream sink, e.g. parsing, is not part of the download,
+        so the phases don't overlap.
+        """
+        finished = time.perf_counter()
+        started = self._started or finished
+        uploaded = min(self._uploaded or started, finished)
+        first_byte = min(max(self._first_byte or finished, uploaded), finished)
+        self.http_call_result.timings = {
+            "upload": uploaded - started,
+            "server": first_byte - uploaded,
+            "download": max(0.0, finished - first_byte - self._sink_seconds),
+        }
+
+    def _stream(self, data: bytes):
+        """Passes a chunk to the stream sink and times it apart."""
+        started = time.perf_counter()
+        if self._first_byte is None:
+            # The sink runs within the download
+            self._first_byte = started
+        try:
+            self.stream_sink(data)
+        finally:
+            self._sink_seconds += time.perf_counter() - started
+
+    def uploadProgress(self, bytesSent, bytesTotal):
+        """Note the end of the upload"""
+        if self._uploaded is None and 0 < bytesTotal <= bytesSent:
+            self._uploaded = time.perf_counter()
+
     def downloadProgress(self, bytesReceived, bytesTotal):
         """Keep track of the download progress"""
         # self.msg_log("downloadProgress %s of %s ..." % (bytesReceived, bytesTotal))
-        pass
+        if self._first_byte is None and bytesReceived > 0:
+            self._first_byte = time.perf_counter()
+
+    def readBody(self):
+        """
+        Reads the available body of the reply, inflated if it was
+        requested with Accept-Encoding.
+        """
+        if self.inflate_error is not None:
+            raise self.inflate_error
+        data = bytes(self.reply.readAll())
+        self.http_call_result.received_bytes += len(data)
+        if self.inflater is None:
+            # Qt inflates itself unless Accept-Encoding was set
+            content_encoding = ""
+            if self.reply.request().hasRawHeader(b"Accept-Encoding"):
+                content_encoding = str(
+                    self.reply.rawHeader(b"Content-Encoding").data(),
+                    encoding="utf-8",
+                )
+            self.inflater = Inflater(content_encoding)
+        return self.inflater.feed(data)
+
+    def replyReadyRead(self):
+        """Pass the received chunk of a successful reply to the stream sink"""
+        if self.stream_sink is None or self.reply is None:
+            return
+        # Error bodies are read as a whole in replyFinished
+        if self.reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) != 200:
+            return
+        try:
+            data = self.readBody()
+        except zlib.error as err:
+            # Exceptions must not escape into the Qt event loop, the error
+            # is raised again in replyFinished
+            self.inflate_error = err
+            return
+        self._stream(data)
 
     def requestTimedOut(self, reply):
         """Trap the timeout. In Async mode requestTimedOut is called after replyFinished"""
@@ -332,6 +499,7 @@ class NetworkAccessManager(object):
         )
 
     def replyFinished(self):
+        self._finish_timings()
         err = self.reply.error()
         httpStatus = self.reply.attribute(
             QNetworkRequest.HttpStatusCodeAttribute
@@ -342,6 +510,8 @@ class NetworkAccessManager(object):
         self.http_call_result.status_code = httpStatus
         self.http_call_result.status = httpStatus
         self.http_call_result.status_message = httpStatusMessage
+        # Don't mix in the headers of a previous reply
+        self.http_call_result.headers = {}
         for k, v in self.reply.rawHeaderPairs():
             self.http_call_result.headers[
                 str(k.data(), encoding="utf-8")
@@ -370,8 +540,12 @@ class NetworkAccessManager(object):
                 msg = "Network error: {0}".format(errString)
 
             self.http_call_result.reason = msg
+            try:
+                body = self.readBody() + self.inflater.flush()
+            except zlib.error:
+                body = b""
             self.http_call_result.text = str(
-                self.reply.readAll().data(), encoding="utf-8"
+                body, encoding="utf-8", errors="replace"
             )
             self.http_call_result.ok = False
             self.msg_log(msg)
@@ -419,7 +593,15 @@ class NetworkAccessManager(object):
 
                 self.reply.deleteLater()
                 self.reply = None
-                self.request(redirectionUrl.toString())
+                self.request(
+                    redirectionUrl.toString(),
+                    blocking=self.blocking_mode,
+                    stream_sink=self.stream_sink,
+                    finished_callback=self.finished_callback,
+                )
+                if not self.blocking_mode:
+                    # The redirected reply finishes later
+                    return
 
             # really end request
             else:
@@ -427,10 +609,27 @@ class NetworkAccessManager(object):
                 self.http_call_result.reason = msg
                 self.msg_log(msg)
 
-                ba = self.reply.readAll()
-                self.http_call_result.content = bytes(ba)
-                self.http_call_result.text = str(ba.data(), encoding="utf-8")
-                self.http_call_result.ok = True
+                try:
+                    ba = self.readBody() + self.inflater.flush()
+                    self.http_call_result.ok = True
+                except zlib.error as err:
+                    ba = b""
+                    msg = "Invalid compressed content: {0}".format(err)
+                    self.http_call_result.reason = msg
+                    self.http_call_result.exception = RequestsException(msg)
+                    self.http_call_result.ok = False
+                    self.msg_log(msg)
+                if self.stream_sink is not None and httpStatus == 200:
+                    if len(ba):
+                        self._stream(ba)
+                        # The tail went through the sink after the reply
+                        # finished
+                        self._finish_timings()
+                    self.http_call_result.content = b""
+                    self.http_call_result.text = ""
+                else:
+                    self.http_call_result.content = ba
+                    self.http_call_result.text = str(ba, encoding="utf-8")
 
         # Let's log the whole response for debugging purposes:
         self.msg_log(
@@ -457,12 +656,16 @@ class NetworkAccessManager(object):
             self.reply.sslErrors.disconnect(self.sslErrors)
             self.reply.finished.disconnect(self.replyFinished)
             self.reply.downloadProgress.disconnect(self.downloadProgress)
+            self.reply.uploadProgress.disconnect(self.uploadProgress)
+            self.reply.readyRead.disconnect(self.replyReadyRead)
             self.reply.deleteLater()
             self.reply = None
         else:
             self.msg_log("Reply was already deleted ...")
 
         logger.log(msg)
+        if not self.blocking_mode and self.finished_callback is not None:
+            self.finished_callback(self.http_call_result)
 
     def sslErrors(self, ssl_errors):
         """
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Request rate and concurrency limits shared by all clients of a provider.
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from ohsomeTools.common import (
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_REQUESTS_PER_SECOND,
+)
+from ohsomeTools.utils import exceptions
+
+# Waits are split into steps of this many seconds to notice cancellation
+_WAIT_STEP = 0.2
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def parse_retry_after(value: str):
+    """
+    Parses a Retry-After header given in seconds or as HTTP date.
+
+    :returns: The delay in seconds or None if the header is invalid.
+    :rtype: float or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderLimiter:
+    """
+    Limits the requests to a provider with a token bucket and an adaptive
+    concurrency limit.
+
+    The bucket refills with requests_per_second tokens per second up to
+    burst tokens; every request takes one. The number of requests in flight
+    starts at max_in_flight, is halved on every 429/503 response and grows
+    by one slot per limit successful responses again (AIMD). A Retry-After
+    header pauses all requests to the provider.
+
+    Cheap requests like /metadata may be sent without a slot. They only
+    wait for a token, not for a Retry-After pause or long requests in
+    flight, so they may be sent from the main thread.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        max_in_flight: int,
+        burst: float = None,
+    ):
+        """
+        :param requests_per_second: Token refill rate, 0 for no rate limit.
+        :type requests_per_second: float
+
+        :param max_in_flight: Upper bound of concurrent requests.
+        :type max_in_flight: int
+
+        :param burst: Bucket size, defaults to one second of requests.
+        :type burst: float
+        """
+        self.requests_per_second = max(0.0, float(requests_per_second or 0))
+        self.burst = max(1.0, float(burst or self.requests_per_second))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.limit = float(self.max_in_flight)
+        self.in_flight = 0
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float):
+        if self.requests_per_second:
+            self._tokens = min(
+                self.burst,
+                self._tokens
+                + (now - self._refilled) * self.requests_per_second,
+            )
+        self._refilled = now
+
+    def _delay(self, now: float, slot: bool = True) -> float:
+        """Seconds until a request may start, 0 if it may start now."""
+        if slot and now < self._paused_until:
+            return self._paused_until - now
+        if slot and self.in_flight >= int(self.limit):
+            # Woken up by release
+            return _WAIT_STEP
+        if self.requests_per_second and self._tokens < 1:
+            return (1 - self._tokens) / self.requests_per_second
+        return 0.0
+
+    def _take(self, slot: bool = True):
+        if self.requests_per_second:
+            self._tokens -= 1
+        if slot:
+            self.in_flight += 1
+
+    def acquire(self, canceled=None, slot: bool = True):
+        """
+        Blocks until a request may be sent and takes a slot for it.
+
+        :param canceled: Returns True if the wait should be aborted.
+        :type canceled: callable
+
+        :param slot: False for cheap requests, which only wait for a token.
+            Release them with slot=False as well.
+        :type slot: bool
+
+        :raises ohsomeTools.utils.exceptions.Canceled: If canceled returned True.
+        """
+        with self._condition:
+            while True:
+                if canceled is not None and canceled():
+                    raise exceptions.Canceled(
+                        "Canceled", "The request was canceled."
+                    )
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._delay(now, slot)
+                if delay <= 0:
+                    break
+                self._condition.wait(min(delay, _WAIT_STEP))
+            self._take(slot)
+
+    def try_acquire(self, slot: bool = True) -> float:
+        """
+        Takes a slot for a request if one may be sent now, without blocking.
+
+        :param slot: See acquire.
+        :type slot: bool
+
+        :returns: 0 if a slot was taken, else the seconds to wait before
+            trying again.
+        :rtype: float
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            delay = self._delay(now, slot)
+            if delay > 0:
+                return delay
+            self._take(slot)
+            return 0.0
+
+    def release(
+        self,
+        throttled: bool = False,
+        retry_after: float = None,
+        slot: bool = True,
+    ):
+        """
+        Frees the slot of a finished request and adapts the concurrency.
+
+        :param throttled: The provider answered with 429 or 503.
+        :type throttled: bool
+
+        :param retry_after: Delay requested by the provider in seconds.
+        :type retry_after: float
+
+        :param slot: False if the request was acquired without a slot.
+        :type slot: bool
+        """
+        with self._condition:
+            if slot:
+                self.in_flight = max(0, self.in_flight - 1)
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(
+                    float(self.max_in_flight), self.limit + 1 / self.limit
+                )
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+            self._condition.notify_all()
+
+    def wait(self, seconds: float, canceled=None):
+        """
+        Sleeps without holding a slot, e.g. between retries.
+
+        :raises ohsomeTools.utils.exceptions.Canceled: If canceled returned True.
+        """
+        end = time.monotonic() + seconds
+        while True:
+            if canceled is not None and canceled():
+                raise exceptions.Canceled(
+                    "Canceled", "The request was canceled."
+                )
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, _WAIT_STEP))
+
+
+def limiter(provider: dict) -> ProviderLimiter:
+    """
+    Returns the limiter shared by all clients of a provider, configured by
+    its requests_per_second, burst and max_in_flight settings.
+
+    :param provider: An ohsome API provider from config.yml
+    :type provider: dict
+
+    :rtype: ProviderLimiter
+    """
+    requests_per_second = provider.get(
+        "requests_per_second", DEFAULT_REQUESTS_PER_SECOND
+    )
+    max_in_flight = provider.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)
+    burst = provider.get("burst")
+    settings = (requests_per_second, max_in_flight, burst)
+    with _limiters_lock:
+        entry = _limiters.get(provider["base_url"])
+        # Changed provider settings replace the limiter
+        if entry is None or entry[0] != settings:
+            entry = (
+                settings,
+                ProviderLimiter(requests_per_second, max_in_flight, burst),
+            )
+            _limiters[provider["base_url"]] = entry
+        return entry[1]
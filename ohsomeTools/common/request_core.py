@@ -23,25 +23,33 @@
  *                                                                         *
  ***************************************************************************/
 """
-import csv
 import json
+import os
 from datetime import datetime
 
-from PyQt5.QtCore import QVariant
+from PyQt5.QtCore import QThread
 from PyQt5.QtWidgets import QDialogButtonBox
 
 from qgis._core import (
+    QgsApplication,
     QgsVectorLayer,
-    QgsVectorDataProvider,
     QgsTask,
     Qgis,
     QgsProcessingUtils,
     QgsLayerMetadata,
 )
 
-from qgis.core import QgsFeature, QgsField, QgsProject
+from qgis.core import QgsProject
 
-from ohsomeTools.common import client
+from ohsomeTools.common import (
+    client,
+    memory,
+    telemetry,
+    temporal,
+    tiling,
+    writer,
+    DEFAULT_MAX_IN_FLIGHT,
+)
 from ohsomeTools.utils import exceptions, logger
 from ohsomeTools.utils.exceptions import OhsomeBaseException
 
@@ -66,41 +74,220 @@ def postprocess_metadata(original_json: dict, vlayer: QgsVectorLayer):
     vlayer.setMetadata(metadata=metadata)
 
 
+def group_by_rows(group_by_result: [dict]) -> ([dict], [str]):
+    """
+    Flattens the groups of a groupBy response into a single long table with
+    one row per group and timestamp, keyed by a groupByObject column.
+
+    :param group_by_result: The groupByResult of the response.
+    :type group_by_result: list
+
+    :returns: The rows and the column names.
+    :rtype: (list, list)
+    """
+    rows = []
+    header = {"groupByObject": None}
+    for group in group_by_result:
+        group_rows = group.get("result") or group.get("ratioResult") or []
+        for row in group_rows:
+            rows.append({"groupByObject": group.get("groupByObject"), **row})
+        if len(group_rows):
+            header.update(dict.fromkeys(group_rows[0]))
+    return rows, list(header)
+
+
 def create_ohsome_csv_layer(
-    iface, results, header, output_path, request_time: str
+    iface,
+    results,
+    header,
+    output_path,
+    request_time: str,
+    append=False,
+    add_to_project: bool = True,
+    timings: telemetry.Timings = None,
 ):
-    with open(output_path, "w", newline="") as f:
-        wr = csv.DictWriter(
-            f,
-            fieldnames=header,
-        )
-        wr.writeheader()
-        for row_result in results:
-            wr.writerow(row_result)
+    with telemetry.span(timings, "write"):
+        uri = writer.write_table(results, header, output_path, append)
     name = output_path.split("/")[-1].split(".")[0]
-    layer = QgsVectorLayer(output_path, name, "ogr")
-    QgsProject.instance().addMapLayer(layer)
+    with telemetry.span(timings, "load"):
+        layer = QgsVectorLayer(uri, name, "ogr")
+        if add_to_project:
+            QgsProject.instance().addMapLayer(layer)
     return layer
 
 
-def create_ohsome_vector_layer(
+def create_ohsome_vector_layers(
     iface,
     geojson: dict,
-    request_time: str,
     output_path: str,
+    keep_geometry_less: bool = False,
+    combine_single_with_multi_geometries: bool = False,
     activate_temporal: bool = False,
+    add_to_project: bool = True,
+    timings: telemetry.Timings = None,
+) -> [QgsVectorLayer]:
+    """
+    Writes the features of a GeoJSON response to a GeoPackage or FlatGeobuf
+    file with one table per geometry type and adds the tables to the
+    project.
+
+    :param geojson: The FeatureCollection response. Its features are
+        removed while they are written.
+    :type geojson: dict
+
+    :param output_path: The output file, see writer.output_format.
+    :type output_path: str
+
+    :param add_to_project: Add the layers to the project. Layers created in
+        a worker thread are added by the main thread instead.
+    :type add_to_project: bool
+
+    :param timings: Times the write and load phases.
+    :type timings: telemetry.Timings
+
+    :rtype: list
+    """
+    with telemetry.span(timings, "write"):
+        feature_writer = writer.FeatureWriter(
+            output_path,
+            keep_geometry_less=keep_geometry_less,
+            combine_single_with_multi_geometries=combine_single_with_multi_geometries,
+        )
+        features = geojson.pop("features", [])
+        for feature in features:
+            feature_writer.write(feature)
+        del features
+        outputs = feature_writer.close()
+    for warning in feature_writer.warnings:
+        logger.log(warning, 1)
+    vlayers = []
+    with telemetry.span(timings, "load"):
+        for uri, name in outputs:
+            vlayer = QgsVectorLayer(uri, name, "ogr")
+            if add_to_project:
+                QgsProject.instance().addMapLayer(vlayer)
+            postprocess_qgsvectorlayer(
+                vlayer, activate_temporal=activate_temporal
+            )
+            postprocess_metadata(geojson, vlayer)
+            vlayers.append(vlayer)
+    return vlayers
+
+
+def create_ohsome_memory_table(
+    iface,
+    results,
+    header,
+    name: str,
+    add_to_project: bool = True,
+    timings: telemetry.Timings = None,
 ):
-    with open(output_path, "w") as f:
-        f.write(json.dumps(geojson, indent=4))
-    name = output_path.split("/")[-1].split(".")[0]
-    vlayer = QgsVectorLayer(
-        output_path,
-        name,
-        "ogr",
-    )
-    QgsProject.instance().addMapLayer(vlayer)
-    postprocess_qgsvectorlayer(vlayer, activate_temporal=activate_temporal)
-    return vlayer
+    """
+    Adds the result rows of an aggregation to the project as memory table.
+
+    :rtype: QgsVectorLayer
+    """
+    with telemetry.span(timings, "write"):
+        layer = memory.memory_table(results, header, name)
+    if add_to_project:
+        with telemetry.span(timings, "load"):
+            QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+def create_ohsome_memory_layers(
+    iface,
+    geojson: dict,
+    name: str,
+    keep_geometry_less: bool = False,
+    combine_single_with_multi_geometries: bool = False,
+    activate_temporal: bool = False,
+    add_to_project: bool = True,
+    timings: telemetry.Timings = None,
+) -> [QgsVectorLayer]:
+    """
+    Adds the features of a GeoJSON response to the project as one memory
+    layer per geometry type, without writing them to a file.
+
+    :param geojson: The FeatureCollection response. Its features are
+        removed while they are added.
+    :type geojson: dict
+
+    :param name: The name prefix of the layers.
+    :type name: str
+
+    :param add_to_project: Add the layers to the project.
+    :type add_to_project: bool
+
+    :param timings: Times the write and load phases.
+    :type timings: telemetry.Timings
+
+    :rtype: list
+    """
+    with telemetry.span(timings, "write"):
+        memory_writer = memory.MemoryFeatureWriter(
+            name,
+            keep_geometry_less=keep_geometry_less,
+            combine_single_with_multi_geometries=combine_single_with_multi_geometries,
+        )
+        features = geojson.pop("features", [])
+        for feature in features:
+            memory_writer.write(feature)
+        del features
+        vlayers = memory_writer.close()
+    with telemetry.span(timings, "load"):
+        for vlayer in vlayers:
+            if add_to_project:
+                QgsProject.instance().addMapLayer(vlayer)
+            postprocess_qgsvectorlayer(
+                vlayer, activate_temporal=activate_temporal
+            )
+            postprocess_metadata(geojson, vlayer)
+    return vlayers
+
+
+def load_feature_output(
+    iface,
+    feature_output: memory.FeatureOutput,
+    geojson: dict,
+    activate_temporal: bool = False,
+    add_to_project: bool = True,
+    timings: telemetry.Timings = None,
+) -> [QgsVectorLayer]:
+    """
+    Finishes the features written to a memory.FeatureOutput while they were
+    downloaded and creates their layers, one per geometry type.
+
+    :param feature_output: The written features.
+    :type feature_output: memory.FeatureOutput
+
+    :param geojson: The FeatureCollection response without its features,
+        for the metadata of the layers.
+    :type geojson: dict
+
+    :param add_to_project: Add the layers to the project. Layers created in
+        a worker thread are added by the main thread instead.
+    :type add_to_project: bool
+
+    :param timings: Times the write and load phases.
+    :type timings: telemetry.Timings
+
+    :rtype: list
+    """
+    with telemetry.span(timings, "write"):
+        feature_output.close()
+    for warning in feature_output.warnings:
+        logger.log(warning, 1)
+    with telemetry.span(timings, "load"):
+        vlayers = feature_output.layers()
+        for vlayer in vlayers:
+            if add_to_project:
+                QgsProject.instance().addMapLayer(vlayer)
+            postprocess_qgsvectorlayer(
+                vlayer, activate_temporal=activate_temporal
+            )
+            postprocess_metadata(geojson, vlayer)
+    return vlayers
 
 
 def split_geojson_by_geometry(
@@ -109,150 +296,323 @@ def split_geojson_by_geometry(
     keep_geometry_less: bool = False,
     combine_single_with_multi_geometries: bool = False,
 ) -> [dict]:
-    geojson_per_geometry = []
+    """
+    Splits the features of a GeoJSON response by geometry type in a single
+    pass of writer.partition_features, without modifying the response. The
+    writers consume the partitioner directly, this collects its output for
+    callers that need the features in memory.
+
+    :param geojson: The FeatureCollection response.
+    :type geojson: dict
+
+    :param return_features_per_geometry: Return the features by geometry
+        type instead of one FeatureCollection per geometry type.
+    :type return_features_per_geometry: bool
+
+    :param combine_single_with_multi_geometries: Harmonize single geometries
+        into multi geometries of the same type.
+    :type combine_single_with_multi_geometries: bool
+
+    :rtype: list or dict
+    """
     features_per_geometry = {}
-    if geojson.get("features"):
-        features = geojson.pop("features")
-    elif geojson.get("geometry") and geojson.get("geometry").get("geometries"):
-        features = geojson.get("geometry").get("geometries")
-    elif geojson.get("geometries") and len(geojson.get("geometries")):
-        features = geojson.get("geometries")
-    else:
-        return {}
-    for feature in features:
-        try:
-            if "geometry" in feature and feature["geometry"] is not None:
-                geometry_type = feature["geometry"]["type"]
-            elif "type" in feature and feature["type"] is not None:
-                geometry_type = feature["type"]
-            else:
-                continue
-            if geometry_type == "GeometryCollection":
-                geometry_collection = split_geojson_by_geometry(
-                    feature, return_features_per_geometry=True
-                )
-                return_features_per_geometry = False
-                for feature_type in geometry_collection:
-                    for sub_feature in geometry_collection[feature_type]:
-                        sub_feature["properties"] = feature["properties"]
-                    if feature_type not in features_per_geometry:
-                        features_per_geometry[feature_type] = []
-                    element: {}
-                    features_per_geometry.get(feature_type).extend(
-                        geometry_collection[feature_type]
-                    )
-                continue
-            elif geometry_type not in features_per_geometry:
-                features_per_geometry[geometry_type] = []
-            features_per_geometry[geometry_type].append(feature)
-        except Exception as err:
-            raise exceptions.GeometryError(
-                str("error"),
-                f"Error constructing geometries from the GeoJSON response: {err}",
-            )
+    for geometry_type, geometry, properties in writer.partition_features(
+        geojson.get("features") or [],
+        keep_geometry_less=keep_geometry_less,
+        harmonize=combine_single_with_multi_geometries,
+    ):
+        features = features_per_geometry.get(geometry_type)
+        if features is None:
+            features = features_per_geometry[geometry_type] = []
+        features.append(
+            {"type": "Feature", "geometry": geometry, "properties": properties}
+        )
     if return_features_per_geometry:
         return features_per_geometry
-    if not keep_geometry_less and features_per_geometry.get("Feature"):
-        features_per_geometry.pop("Feature")
-    if combine_single_with_multi_geometries:
-        if all(i in features_per_geometry for i in ["Polygon", "MultiPolygon"]):
-            single_geometry = features_per_geometry.pop("Polygon")
-            features_per_geometry.get("MultiPolygon").extend(single_geometry)
-        if all(i in features_per_geometry for i in ["Point", "MultiPoint"]):
-            single_geometry = features_per_geometry.pop("Point")
-            features_per_geometry.get("MultiPoint").extend(single_geometry)
-        if all(
-            i in features_per_geometry
-            for i in ["LineString", "MultiLineString"]
-        ):
-            single_geometry = features_per_geometry.pop("LineString")
-            features_per_geometry.get("MultiLineString").extend(single_geometry)
-    for _, feature_set in features_per_geometry.items():
-        temp_geojson = geojson.copy()
-        temp_geojson["features"] = feature_set
-        geojson_per_geometry.append(temp_geojson)
-        del temp_geojson
-
-    return geojson_per_geometry
+    members = {
+        key: value for key, value in geojson.items() if key != "features"
+    }
+    return [
+        {**members, "features": features}
+        for features in features_per_geometry.values()
+    ]
 
 
 def postprocess_qgsvectorlayer(vlayer: QgsVectorLayer, activate_temporal: bool):
+    """
+    Configures the temporal properties of a layer written by the
+    writer.FeatureWriter, which already filled the end of the validity
+    intervals.
+    """
     if not vlayer or len(vlayer) <= 0:
         return
-    # Determine the id field
-    id_field = None
-    if vlayer.fields().names().__contains__("@osmId"):
-        id_field = "@osmId"
-    # elif vlayer.fields().names().__contains__("id"):
-    #     id_field = "id"
-    else:
-        return
-    if vlayer.fields().names().__contains__("@validFrom"):
-        date_start = "@validFrom"
-        date_end = "@validTo"
-    elif vlayer.fields().names().__contains__("@snapshotTimestamp"):
-        date_start = "@snapshotTimestamp"
-        date_end = "endDate"
-    elif vlayer.fields().names().__contains__("@timestamp"):
-        date_start = "@timestamp"
-        date_end = "endDate"
-    # elif vlayer.fields().names().__contains__("timestamp"):
-    #     date_start = "timestamp"
-    #     date_end = "endDate"
-    else:
+    fields = writer.validity_fields(vlayer.fields().names())
+    if fields is None:
         return
-
-    pr: QgsVectorDataProvider = vlayer.dataProvider()
-    # changes are only possible when editing the layer
-    vlayer.startEditing()
-    if not vlayer.fields().names().__contains__(date_end):
-        pr.addAttributes(
-            [QgsField(date_end, QVariant.DateTime)]
-        )  # Add durationsField
+    date_start, date_end = fields
     vlayer.temporalProperties().setMode(
         Qgis.VectorTemporalMode.FeatureDateTimeStartAndEndFromFields
     )  # Set the correct temporal mode
     vlayer.temporalProperties().setStartField(date_start)
     vlayer.temporalProperties().setEndField(date_end)
     vlayer.temporalProperties().setIsActive(activate_temporal)
-    vlayer.commitChanges()
-    vlayer.updateExtents()
 
-    if date_end == "@validTo":
-        features = sorted(
-            vlayer.getFeatures(),
-            key=lambda sort_timestamp: sort_timestamp[date_end],
-        )
-    else:
-        features = sorted(
-            vlayer.getFeatures(),
-            key=lambda sort_timestamp: sort_timestamp[date_start],
+
+def merge_results(results: [dict]) -> dict:
+    """
+    Merges the responses of several sub-requests into a single response.
+
+    Result rows are concatenated in the order of the given results,
+    independent of the order in which the requests finished. Streamed
+    features are merged in their output instead, see fetch_result.
+
+    :param results: The responses in the order of their sub-requests.
+    :type results: list
+
+    :returns: The merged response.
+    :rtype: dict
+    """
+    results = [result for result in results if result]
+    if not len(results):
+        return {}
+    merged = results[0].copy()
+    for key in [
+        "features",
+        "result",
+        "groupByResult",
+        "groupByBoundaryResult",
+        "ratioResult",
+    ]:
+        if key in merged:
+            merged[key] = [
+                item for result in results for item in result.get(key, [])
+            ]
+    return merged
+
+
+def streamed_request(
+    clnt: client.Client, url: str, post_json: dict, feature_sink=None
+) -> dict:
+    """
+    Requests an endpoint and passes the features of a GeoJSON response to
+    the feature sink while they are downloaded, so neither the raw
+    response body nor the features are held in memory as a whole.
+
+    :param clnt: The client to request with.
+    :type clnt: client.Client
+
+    :param url: The endpoint.
+    :type url: str
+
+    :param post_json: The request parameters.
+    :type post_json: dict
+
+    :param feature_sink: Receives the features, e.g. FeatureOutput.write.
+        Without it, they are part of the response.
+    :type feature_sink: callable
+
+    :rtype: dict
+    """
+    return clnt.request(url, {}, post_json=post_json, feature_sink=feature_sink)
+
+
+def streamed_requests(
+    clnt: client.Client,
+    url: str,
+    preferences: [dict],
+    canceled=None,
+    progress=None,
+    feature_sink=None,
+) -> [dict]:
+    """
+    Requests an endpoint with every set of parameters at once, multiplexed
+    over the network access manager of the calling thread. The features
+    of GeoJSON responses are passed to the feature sink while they are
+    downloaded.
+
+    :param clnt: The client to request with.
+    :type clnt: client.Client
+
+    :param url: The endpoint.
+    :type url: str
+
+    :param preferences: The request parameters of every request.
+    :type preferences: list
+
+    :param canceled: Returns True if the requests should be canceled.
+    :type canceled: callable
+
+    :param progress: Called with the number of finished requests.
+    :type progress: callable
+
+    :param feature_sink: Receives the features of all responses, e.g.
+        FeatureOutput.write. Without it, they are part of the responses.
+    :type feature_sink: callable
+
+    :raises: The exception of a failed request, the others are canceled.
+
+    :returns: The responses in the order of the preferences.
+    :rtype: list
+    """
+    requests = []
+    finished = []
+
+    def on_finished(future):
+        finished.append(future)
+        if future.exception() is not None:
+            # The merged result would be incomplete anyway
+            for other in requests:
+                other.cancel()
+        elif progress is not None:
+            progress(len(finished))
+
+    for post_json in preferences:
+        future = clnt.request_async(
+            url, {}, post_json=post_json, feature_sink=feature_sink
         )
-    youngest_timestamp = (
-        features[-1].attribute(date_start) if len(features) > 0 else None
-    )
-    youngest_timestamp = youngest_timestamp.addDays(1)
-    features = sorted(features, key=lambda sort_id: sort_id[id_field])
-    vlayer.dataProvider().deleteFeatures([feature.id() for feature in features])
-    for i in range(len(features) - 1):
-        feature: QgsFeature = features[i]
-        if (
-            i < len(features) - 1
-            and features[i + 1][id_field] == feature[id_field]
-            and feature[date_end] is None
+        future.add_done_callback(on_finished)
+        requests.append(future)
+    client.wait_all(requests, canceled)
+    # Report the error that caused the cancellation of the others
+    for future in finished:
+        if future.exception() is not None and not isinstance(
+            future.exception(), exceptions.Canceled
         ):
-            feature.setAttribute(
-                date_end, features[i + 1].attribute(date_start)
-            )
-        elif i < len(features) - 1 and feature[date_end] is not None:
-            pass
-        else:
-            feature.setAttribute(date_end, youngest_timestamp)
+            raise future.exception()
+    return [future.result() for future in requests]
+
 
-    vlayer.dataProvider().addFeatures(features)
+def fetch_result(
+    clnt: client.Client,
+    request_url: str,
+    preferences,
+    canceled=None,
+    progress=None,
+    feature_output=None,
+) -> dict:
+    """
+    Requests an endpoint split into tiles and time windows where
+    configured, with all parts in flight at once, and merges their
+    responses into one.
 
-    vlayer.commitChanges()
-    vlayer.updateExtents()
+    :param clnt: The client to request with.
+    :type clnt: client.Client
+
+    :param request_url: The endpoint without leading slash.
+    :type request_url: str
+
+    :param preferences: The request parameters. The responses of a list,
+        e.g. the bcircles batches of a point layer, are merged as well.
+    :type preferences: dict or list
+
+    :param canceled: Returns True if the requests should be canceled.
+    :type canceled: callable
+
+    :param progress: Called with the percentage of finished parts.
+    :type progress: callable
+
+    :param feature_output: Receives the features of an extraction while
+        they are downloaded, e.g. a memory.FeatureOutput or
+        writer.FeatureWriter. The features of several tiles and windows
+        are merged there. Without it, they are only concatenated in the
+        response.
+
+    :returns: The merged response, without the features written to the
+        feature output.
+    :rtype: dict
+    """
+    batches = preferences if isinstance(preferences, list) else [preferences]
+    tiles = [
+        tile
+        for batch in batches
+        for tile in tiling.plan_tiles(clnt, request_url, batch)
+    ]
+    windows = temporal.plan_windows(request_url, batches[0])
+    # Window by window, so the features stay in temporal order
+    sub_preferences = [
+        {**tile, "time": window["time"]} if len(windows) > 1 else tile
+        for window in windows
+        for tile in tiles
+    ]
+    # The number in flight is bounded by the rate limit of the provider
+    results = streamed_requests(
+        clnt,
+        f"/{request_url}",
+        sub_preferences,
+        canceled=canceled,
+        progress=None
+        if progress is None
+        else lambda finished: progress(100 * finished / len(sub_preferences)),
+        feature_sink=None if feature_output is None else feature_output.write,
+    )
+    with clnt.timings.span("merge"):
+        result = merge_results(results)
+        if feature_output is not None:
+            if len(tiles) > 1:
+                tiling.deduplicate_output(feature_output, request_url)
+            if len(windows) > 1:
+                temporal.stitch_output(feature_output, request_url, windows)
+    return result
+
+
+def add_bounded_subtasks(
+    parent: QgsTask, subtasks: [QgsTask], max_in_flight: int
+):
+    """
+    Adds the subtasks to the parent so that at most max_in_flight of them
+    run at the same time.
+
+    The subtasks are distributed round-robin over max_in_flight lanes. Each
+    subtask only depends on its predecessor in the same lane, so the lanes
+    run concurrently while each lane is processed serially.
+    """
+    lanes = max(1, int(max_in_flight))
+    for i, task in enumerate(subtasks):
+        dependencies = [subtasks[i - lanes]] if i >= lanes else []
+        parent.addSubTask(task, dependencies, QgsTask.ParentDependsOnSubTask)
+
+
+class OhsomeRequestTask(QgsTask):
+    """Performs a single sub-request of an ExtractionTaskFunction."""
+
+    def __init__(
+        self,
+        description: str,
+        provider,
+        request_url,
+        preferences,
+        timings: telemetry.Timings = None,
+        feature_sink=None,
+    ):
+        """
+        :param feature_sink: Receives the features of the response while
+            they are downloaded, see streamed_request.
+        :type feature_sink: callable
+        """
+        super().__init__(description, QgsTask.CanCancel)
+        self.request_url = request_url
+        self.preferences = preferences
+        self.feature_sink = feature_sink
+        self.result: dict = {}
+        self.exception: OhsomeBaseException = None
+        self.client = client.Client(provider, timings=timings)
+
+    def run(self):
+        try:
+            self.result = streamed_request(
+                self.client,
+                f"/{self.request_url.replace('groupby', 'groupBy')}",
+                self.preferences,
+                feature_sink=self.feature_sink,
+            )
+        except Exception as e:
+            self.result = None
+            self.exception = e
+        return True
+
+    def cancel(self):
+        self.client.cancel()
+        super().cancel()
 
 
 MESSAGE_CATEGORY = "RandomIntegerSumTask"
@@ -270,7 +630,21 @@ class ExtractionTaskFunction(QgsTask):
         request_url,
         preferences=None,
         activate_temporal: bool = False,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        timings: telemetry.Timings = None,
     ):
+        """
+        :param preferences: The request preferences. A list of preferences
+            is split into concurrent sub-requests whose results are merged.
+        :type preferences: dict or list
+
+        :param max_in_flight: Maximum number of concurrent sub-requests.
+        :type max_in_flight: int
+
+        :param timings: The timings of the run, e.g. of building the
+            preferences.
+        :type timings: telemetry.Timings
+        """
         super().__init__(description, QgsTask.CanCancel)
         self.iface = iface
         self.dlg = dlg
@@ -278,21 +652,78 @@ class ExtractionTaskFunction(QgsTask):
         self.iterations = 0
         self.exception = None
         self.request_url = request_url
-        self.preferences = preferences if preferences is not None else {}
+        if isinstance(preferences, list):
+            self.sub_preferences = preferences
+        else:
+            self.sub_preferences = [preferences] if preferences else []
+        self.preferences = (
+            self.sub_preferences[0] if len(self.sub_preferences) else {}
+        )
         self.activate_temporal = activate_temporal
+        # Read here, widgets must not be accessed from the worker thread
+        self.output_path = dlg.lineEdit_output.text()
+        self.keep_geometry_less = dlg.check_keep_geometryless.isChecked()
+        self.combine_single_with_multi_geometries = (
+            dlg.check_merge_geometries.isChecked()
+        )
+        self.layers = []
+        self.postprocess_exception = None
         self.result: dict = {}
         self.exception: OhsomeBaseException = None
         self.request_time = None
-        self.client = client.Client(provider)
+        self.timings = timings if timings is not None else telemetry.Timings()
+        self.client = client.Client(provider, timings=self.timings)
+        # The features of an extraction are written while they are
+        # downloaded, by the subtasks as well
+        self.feature_output = None
+        if tiling.is_extraction(request_url):
+            self.feature_output = memory.FeatureOutput(
+                self.output_path
+                or QgsProcessingUtils.generateTempFilename(
+                    f"Ohsome_{datetime.now()}.gpkg"
+                ),
+                keep_geometry_less=self.keep_geometry_less,
+                combine_single_with_multi_geometries=self.combine_single_with_multi_geometries,
+            )
+        feature_sink = (
+            None if self.feature_output is None else self.feature_output.write
+        )
+        self.subtasks = []
+        if len(self.sub_preferences) > 1:
+            self.subtasks = [
+                OhsomeRequestTask(
+                    f"{description} ({i + 1}/{len(self.sub_preferences)})",
+                    provider,
+                    request_url,
+                    sub_preference,
+                    timings=self.timings,
+                    feature_sink=feature_sink,
+                )
+                for i, sub_preference in enumerate(self.sub_preferences)
+            ]
+            add_bounded_subtasks(self, self.subtasks, max_in_flight)
 
     def postprocess_results(self) -> bool:
-        file = self.dlg.lineEdit_output.text()
+        """
+        Writes the result and creates its layers in the worker thread. The
+        layers are moved to the main thread, which only adds them to the
+        project in add_layers.
+        """
+        if not self.result or not len(self.result):
+            return False
+        file = self.output_path
         if not file:
+            # Features are written to a GeoPackage, results to a CSV file
+            extension = (
+                "gpkg"
+                if (self.result.get("type") or "").lower()
+                == "featurecollection"
+                else "csv"
+            )
             file = QgsProcessingUtils.generateTempFilename(
-                f"Ohsome_{datetime.now()}.csv"
+                f"Ohsome_{datetime.now()}.{extension}"
             )
-        if not self.result or not len(self.result):
-            return False
+        name = os.path.splitext(os.path.basename(file))[0]
         if "extractRegion" in self.result:
             vlayer: QgsVectorLayer = QgsVectorLayer(
                 json.dumps(
@@ -301,77 +732,75 @@ class ExtractionTaskFunction(QgsTask):
                 file,
                 "ogr",
             )
-            QgsProject.instance().addMapLayer(vlayer)
-            if vlayer:
-                return True
+            self.layers = [vlayer]
         elif (
-            all(i in self.result.keys() for i in ["type", "features"])
-            and self.result.get("type").lower() == "featurecollection"
+            self.feature_output is not None
+            and (self.result.get("type") or "").lower() == "featurecollection"
         ):
-            # Process GeoJSON
-            geojsons: [] = split_geojson_by_geometry(
+            # The features were written while they were downloaded
+            self.layers = load_feature_output(
+                self.iface,
+                self.feature_output,
                 self.result,
-                keep_geometry_less=self.dlg.check_keep_geometryless.isChecked(),
-                combine_single_with_multi_geometries=self.dlg.check_merge_geometries.isChecked(),
+                activate_temporal=self.activate_temporal,
+                add_to_project=False,
+                timings=self.timings,
             )
-            for i in range(len(geojsons)):
-                vlayer = create_ohsome_vector_layer(
+        else:
+            rows = header = None
+            if len(self.result.get("result") or []):
+                # Process flat tables
+                rows = self.result["result"]
+            elif len(self.result.get("groupByResult") or []):
+                # Process non-flat tables
+                rows, header = group_by_rows(self.result["groupByResult"])
+            elif len(self.result.get("ratioResult") or []):
+                # Process flat tables
+                rows = self.result["ratioResult"]
+            if rows is None:
+                return False
+            if header is None:
+                header = rows[0].keys()
+            if memory.use_memory_output(file, self.result):
+                vlayer = create_ohsome_memory_table(
                     self.iface,
-                    geojsons[i],
-                    self.request_time,
-                    self.dlg.lineEdit_output.text(),
-                    self.activate_temporal,
+                    rows,
+                    header,
+                    name,
+                    add_to_project=False,
+                    timings=self.timings,
                 )
-                postprocess_metadata(geojsons[i], vlayer)
-            return True
-        elif (
-            "result" in self.result.keys()
-            and len(self.result.get("result")) > 0
-        ):
-            # Process flat tables
-            header = self.result["result"][0].keys()
-            vlayer = create_ohsome_csv_layer(
-                self.iface,
-                self.result["result"],
-                header,
-                file,
-                self.request_time,
-            )
-            postprocess_metadata(self.result, vlayer)
-            return True
-        elif (
-            "groupByResult" in self.result.keys()
-            and len(self.result.get("groupByResult")) > 0
-        ):
-            # Process non-flat tables
-            results = self.result["groupByResult"]
-            for result_group in results:
-                header = results[0]["result"][0].keys()
+            else:
                 vlayer = create_ohsome_csv_layer(
                     self.iface,
-                    result_group["result"],
+                    rows,
                     header,
                     file,
                     self.request_time,
+                    add_to_project=False,
+                    timings=self.timings,
                 )
-                postprocess_metadata(self.result, vlayer)
-            return True
-        elif (
-            "ratioResult" in self.result.keys()
-            and len(self.result.get("ratioResult")) > 0
-        ):
-            # Process flat tables
-            header = self.result.get("ratioResult")[0].keys()
-            vlayer = create_ohsome_csv_layer(
-                self.iface,
-                self.result["ratioResult"],
-                header,
-                file,
-                self.request_time,
-            )
             postprocess_metadata(self.result, vlayer)
-            return True
-        return False
+            self.layers = [vlayer]
+        main_thread = QgsApplication.instance().thread()
+        for vlayer in self.layers:
+            # Memory layers of the features were created by the subtasks
+            # and already handed to this thread
+            if vlayer.thread() == QThread.currentThread():
+                vlayer.moveToThread(main_thread)
+        return len(self.layers) > 0
+
+    def add_layers(self):
+        """
+        Adds the layers created by postprocess_results to the project. Must
+        be called from the main thread.
+
+        :raises Exception: If the post-processing failed.
+        """
+        if self.postprocess_exception:
+            raise self.postprocess_exception
+        with self.timings.span("load"):
+            QgsProject.instance().addMapLayers(self.layers)
 
     def run(self):
         """Here you implement your heavy lifting.
@@ -385,17 +814,40 @@ class ExtractionTaskFunction(QgsTask):
         logger.log(f'Started task "{self.description()}"', Qgis.Info)
 
         try:
-            if len(self.preferences):
-                self.result = self.client.request(
+            if len(self.subtasks):
+                # The subtasks have already finished, merge in request order
+                for task in self.subtasks:
+                    if task.exception:
+                        raise task.exception
+                with self.timings.span("merge"):
+                    self.result = merge_results(
+                        [task.result for task in self.subtasks]
+                    )
+                    if self.feature_output is not None:
+                        tiling.deduplicate_output(
+                            self.feature_output, self.request_url
+                        )
+            elif len(self.preferences):
+                self.result = streamed_request(
+                    self.client,
                     f"/{self.request_url.replace('groupby', 'groupBy')}",
-                    {},
-                    post_json=self.preferences,
+                    self.preferences,
+                    feature_sink=None
+                    if self.feature_output is None
+                    else self.feature_output.write,
                 )
             else:
                 self.result = self.client.request(f"/metadata", {})
         except Exception as e:
             self.result = None
             self.exception = e
+        if self.result and not self.isCanceled():
+            try:
+                self.postprocess_results()
+            except Exception as e:
+                self.postprocess_exception = e
+        elif self.feature_output is not None:
+            self.feature_output.discard()
         return True
 
     def finished(self, valid_result):
@@ -413,14 +865,15 @@ class ExtractionTaskFunction(QgsTask):
             f"\nEndpoint: {self.request_url}"
             f'\nPreferences: {json.dumps(self.preferences, indent=4, sort_keys=True)}"'
         )
-        if "bpolys" in self.preferences:
-            self.preferences[
-                "bpolys"
-            ] = "Geometry shortened. For issue/debug copy from 'View'->'Panels'->'Log Messages'."
-        elif "bcircles" in self.preferences:
-            self.preferences[
-                "bcircles"
-            ] = "Geometry shortened. For issue/debug copy from 'View'->'Panels'->'Log Messages'."
+        for preferences in self.sub_preferences:
+            if "bpolys" in preferences:
+                preferences[
+                    "bpolys"
+                ] = "Geometry shortened. For issue/debug copy from 'View'->'Panels'->'Log Messages'."
+            elif "bcircles" in preferences:
+                preferences[
+                    "bcircles"
+                ] = "Geometry shortened. For issue/debug copy from 'View'->'Panels'->'Log Messages'."
         shortened_default_message = (
             f"\nAPI URL: {self.client.base_url}"
             f"\nEndpoint: {self.request_url}"
@@ -445,7 +898,7 @@ class ExtractionTaskFunction(QgsTask):
                     short_msg = msg = (
                         f"The request was successful:" + default_message
                     )
-                self.postprocess_results()
+                self.add_layers()
                 logger.log(msg, Qgis.Info)
                 self.iface.messageBar().pushMessage(
                     "Info",
@@ -473,7 +926,9 @@ class ExtractionTaskFunction(QgsTask):
                 )
             finally:
                 self.dlg.debug_text.append("> " + short_msg)
-        elif self.client.canceled:
+        elif self.client.canceled or any(
+            task.client.canceled for task in self.subtasks
+        ):
             msg = f"The request was canceled."
             logger.log(msg, Qgis.Warning)
             self.dlg.debug_text.append(msg)
@@ -525,6 +980,16 @@ class ExtractionTaskFunction(QgsTask):
                 level=Qgis.Warning,
                 duration=5,
             )
+        summary = telemetry.report(
+            self.timings,
+            endpoint=self.request_url,
+            provider=self.client.base_url,
+            sub_requests=len(self.sub_preferences),
+            ok=bool(
+                valid_result and self.result and not self.postprocess_exception
+            ),
+        )
+        self.dlg.debug_text.append(f"> {summary}")
         self.dlg.global_buttons.button(QDialogButtonBox.Ok).setEnabled(True)
 
     def cancel(self):
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Incremental parsing of GeoJSON FeatureCollection responses.
+"""
+
+import codecs
+import json
+import re
+
+_HEAD = 0
+_FEATURES = 1
+_TAIL = 2
+_PLAIN = 3
+
+# Give up looking for the features array after this many characters. The
+# members in front of it (attribution, apiVersion, ...) are small.
+MAX_HEAD_SIZE = 64 * 1024
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class FeatureCollectionParser:
+    """
+    Parses a GeoJSON FeatureCollection from chunks of bytes and passes each
+    feature to a sink as soon as it is complete.
+
+    Only the not yet complete feature is buffered, so the memory needed is
+    independent of the size of the response. Responses without a top-level
+    features array are buffered and parsed as a whole on close.
+
+    Usage
+    -----
+    ::
+        parser = FeatureCollectionParser(features.append)
+        for chunk in chunks:
+            parser.feed(chunk)
+        feature_collection = parser.close()
+    """
+
+    def __init__(self, sink):
+        """
+        :param sink: Called with every parsed feature.
+        :type sink: callable
+        """
+        self.sink = sink
+        self.feature_count = 0
+        self.bytes_received = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._state = _HEAD
+        self._buffer = ""
+        self._head = ""
+        self._retry_size = 0
+        # State of the scanner looking for the features array
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key = None
+        self._expect_features = False
+
+    def feed(self, data: bytes):
+        """
+        Parses the next chunk of the response.
+
+        :param data: The next chunk.
+        :type data: bytes
+        """
+        self.bytes_received += len(data)
+        self._buffer += self._decoder.decode(data)
+        if self._state == _HEAD:
+            self._scan_head()
+        if self._state == _FEATURES:
+            self._parse_features()
+
+    def close(self) -> dict:
+        """
+        Parses the rest of the response.
+
+        :raises ValueError: If the response is not valid JSON.
+
+        :returns: The response. Streamed features are not part of it.
+        :rtype: dict
+        """
+        self._buffer += self._decoder.decode(b"", final=True)
+        if self._state in [_HEAD, _PLAIN]:
+            return json.loads(self._head + self._buffer)
+        if self._state == _FEATURES:
+            self._parse_features(final=True)
+            if self._state == _FEATURES:
+                raise ValueError("The features array is incomplete.")
+        return json.loads(f"{self._head}[]{self._buffer}")
+
+    def _scan_head(self):
+        """Looks for the features array of the top-level object."""
+        buffer = self._buffer
+        position = self._position
+        while position < len(buffer):
+            character = buffer[position]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif character == "\\":
+                    self._escape = True
+                elif character == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._key = buffer[self._string_start + 1 : position]
+            elif character == '"':
+                self._in_string = True
+                self._string_start = position
+                self._expect_features = False
+            elif character == ":" and self._depth == 1:
+                self._expect_features = self._key == "features"
+            elif character == "[" and self._expect_features:
+                self._head += buffer[:position]
+                self._buffer = buffer[position + 1 :]
+                self._state = _FEATURES
+                return
+            elif character in "{[":
+                self._depth += 1
+                self._expect_features = False
+            elif character in "}]":
+                self._depth -= 1
+            elif not character.isspace():
+                self._expect_features = False
+            position += 1
+        self._position = position
+        if position > MAX_HEAD_SIZE:
+            self._state = _PLAIN
+
+    def _parse_features(self, final: bool = False):
+        buffer = self._buffer
+        position = 0
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+            if position >= len(buffer):
+                break
+            if buffer[position] == "]":
+                self._buffer = buffer[position + 1 :]
+                self._state = _TAIL
+                return
+            if not final and len(buffer) - position < self._retry_size:
+                # Wait until the pending feature had time to complete
+                break
+            try:
+                feature, end = self._json_decoder.raw_decode(buffer, position)
+            except ValueError:
+                if final:
+                    raise
+                # Only retry once the pending data has doubled, so that
+                # large features aren't parsed over and over again.
+                self._retry_size = 2 * (len(buffer) - position)
+                break
+            self._retry_size = 0
+            self.feature_count += 1
+            self.sink(feature)
+            position = end
+        self._buffer = buffer[position:]
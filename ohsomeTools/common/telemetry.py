@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+
+"""
+Timing spans and byte counts of the phases of ohsome requests, reported as
+summary and optionally appended to a JSONL telemetry file.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from qgis.core import QgsApplication
+
+from ohsomeTools import PLUGIN_NAME
+from ohsomeTools.utils import configmanager, logger
+
+DEFAULT_TELEMETRY_SETTINGS = {
+    "enabled": False,
+    "path": "",
+}
+
+# Phases of a run in the order they happen
+PHASES = [
+    "build",
+    "queue",
+    "upload",
+    "server",
+    "download",
+    "parse",
+    "merge",
+    "write",
+    "load",
+]
+
+
+def _telemetry_settings() -> dict:
+    settings = DEFAULT_TELEMETRY_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("telemetry", {})
+        or {}
+    )
+    return settings
+
+
+def telemetry_path() -> str:
+    """
+    :returns: The telemetry file of runtime.telemetry.path, by default
+        inside the QGIS profile.
+    :rtype: str
+    """
+    return _telemetry_settings()["path"] or os.path.join(
+        QgsApplication.qgisSettingsDirPath(), PLUGIN_NAME, "telemetry.jsonl"
+    )
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class Timings:
+    """
+    Sums up the seconds spent per phase and the counters of a run, e.g.
+    the transferred bytes. The phases of concurrent requests overlap, so
+    their sum can exceed the wall time. Can be shared by the threads of a
+    run.
+
+    Usage
+    -----
+    ::
+        timings = Timings()
+        with timings.span("build"):
+            bpolys = ...
+        timings.count("bytes_sent", len(bpolys))
+        logger.log(timings.summary())
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        """
+        :param phase: The phase, see PHASES.
+        :type phase: str
+
+        :param seconds: The time spent in the phase.
+        :type seconds: float
+        """
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + max(0.0, seconds)
+
+    def count(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def span(self, phase: str):
+        """Adds the time spent in the with block to phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add_reply(self, http_call_result):
+        """
+        Adds the phases and byte counts of a finished request of a
+        NetworkAccessManager.
+        """
+        for phase, seconds in (http_call_result.get("timings") or {}).items():
+            self.add(phase, seconds)
+        self.count("requests")
+        self.count("bytes_sent", http_call_result.get("sent_bytes") or 0)
+        self.count(
+            "bytes_received", http_call_result.get("received_bytes") or 0
+        )
+
+    def wall_time(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        """
+        :returns: The seconds per phase and the byte counts in one line.
+        :rtype: str
+        """
+        with self._lock:
+            phases = [
+                f"{phase} {self.phases[phase]:.2f} s"
+                for phase in PHASES + sorted(set(self.phases) - set(PHASES))
+                if phase in self.phases
+            ]
+            counters = dict(self.counters)
+        text = (
+            f"Timings: {', '.join(phases) or 'none'} "
+            f"({self.wall_time():.2f} s wall time)"
+        )
+        if counters.get("requests"):
+            text += (
+                f"; {counters['requests']} requests, "
+                f"{_format_bytes(counters.get('bytes_sent', 0))} sent, "
+                f"{_format_bytes(counters.get('bytes_received', 0))} received"
+            )
+        return text
+
+    def record(self, **context) -> dict:
+        """
+        :param context: Describes the run, e.g. endpoint and provider.
+
+        :returns: The telemetry record of the run.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                **context,
+                "wall_time": round(self.wall_time(), 3),
+                "phases": {
+                    phase: round(seconds, 3)
+                    for phase, seconds in self.phases.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+
+@contextmanager
+def span(timings: Timings, phase: str):
+    """Like Timings.span, but does nothing if timings is None."""
+    if timings is None:
+        yield
+        return
+    with timings.span(phase):
+        yield
+
+
+def report(timings: Timings, **context) -> str:
+    """
+    Logs the summary of a run and appends its record to the telemetry file
+    if runtime.telemetry is enabled.
+
+    :param timings: The timings of the run.
+    :type timings: Timings
+
+    :param context: Describes the run, e.g. endpoint and provider.
+
+    :returns: The summary.
+    :rtype: str
+    """
+    summary = timings.summary()
+    logger.log(summary, 0)
+    if not _telemetry_settings()["enabled"]:
+        return summary
+    path = telemetry_path()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(timings.record(**context)) + "\n")
+    except OSError as err:
+        logger.log(f"The telemetry could not be written to {path}: {err}", 1)
+    return summary
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Splits full-history and contributions extractions into time windows and
+stitches their results back together. Refreshes aggregation time series
+incrementally.
+"""
+
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from ohsomeTools.common import tiling
+from ohsomeTools.utils import configmanager, logger
+
+DEFAULT_TIME_WINDOW_SETTINGS = {
+    "enabled": True,
+    "window_months": 24,
+}
+
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Columns of aggregation results that hold the (end of the) period
+TIME_COLUMNS = ["timestamp", "toTimestamp"]
+
+
+def _time_window_settings() -> dict:
+    settings = DEFAULT_TIME_WINDOW_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("time_windows", {})
+        or {}
+    )
+    return settings
+
+
+def _normalize(timestamp: str) -> str:
+    """Cuts a timestamp to seconds without time zone designator."""
+    return str(timestamp).rstrip("Z")[:19]
+
+
+def _parse(timestamp: str):
+    try:
+        return datetime.fromisoformat(_normalize(timestamp))
+    except ValueError:
+        return None
+
+
+def _add_months(date: datetime, months: int) -> datetime:
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    # Clamp to the last day of shorter months
+    day = date.day
+    while True:
+        try:
+            return date.replace(year=year, month=month, day=day)
+        except ValueError:
+            day -= 1
+
+
+def is_history(request_url: str) -> bool:
+    """
+    Checks whether the endpoint extracts the history of the elements within
+    a time range.
+
+    :param request_url: The endpoint, e.g. elementsFullHistory/geometry.
+    :type request_url: str
+
+    :rtype: bool
+    """
+    return tiling.is_extraction(request_url) and request_url.strip("/").split(
+        "/"
+    )[0] in ["elementsFullHistory", "contributions"]
+
+
+def split_time(time: str, window_months: int) -> [str]:
+    """
+    Splits a "start,end" time parameter into consecutive windows, each
+    starting where the previous one ends.
+
+    :param time: The time parameter.
+    :type time: str
+
+    :param window_months: Length of a window in months.
+    :type window_months: int
+
+    :returns: The time parameter of every window. Parameters that are no
+        time range are returned unchanged.
+    :rtype: list
+    """
+    dates = time.split(",")
+    if len(dates) != 2 or window_months <= 0:
+        return [time]
+    start, end = _parse(dates[0]), _parse(dates[1])
+    if start is None or end is None or start >= end:
+        return [time]
+    windows = []
+    window_start = start
+    while window_start < end:
+        # Count from the start, so short months don't shift later windows
+        window_end = min(
+            _add_months(start, (len(windows) + 1) * window_months), end
+        )
+        windows.append(
+            f"{window_start.strftime(_TIMESTAMP_FORMAT)},"
+            f"{window_end.strftime(_TIMESTAMP_FORMAT)}"
+        )
+        window_start = window_end
+    return windows
+
+
+def plan_windows(request_url: str, preferences: dict) -> [dict]:
+    """
+    Splits a full-history or contributions extraction into time windows of
+    runtime.time_windows.window_months.
+
+    :param request_url: The endpoint.
+    :type request_url: str
+
+    :param preferences: The request parameters.
+    :type preferences: dict
+
+    :returns: The request parameters of every window.
+    :rtype: list
+    """
+    settings = _time_window_settings()
+    if (
+        not settings["enabled"]
+        or not is_history(request_url)
+        or "time" not in preferences
+    ):
+        return [preferences]
+    windows = []
+    for time in split_time(preferences["time"], int(settings["window_months"])):
+        window = preferences.copy()
+        window["time"] = time
+        windows.append(window)
+    if len(windows) > 1:
+        logger.log(
+            f"Split the time range {preferences['time']} into "
+            f"{len(windows)} windows.",
+            0,
+        )
+    return windows
+
+
+def window_boundaries(windows: [dict]) -> set:
+    """
+    :param windows: The request parameters of the windows.
+    :type windows: list
+
+    :returns: The normalized timestamps where one window ends and the next
+        one starts.
+    :rtype: set
+    """
+    return {_normalize(window["time"].split(",")[1]) for window in windows[:-1]}
+
+
+def _signature(properties: dict, geometry: bytes) -> bytes:
+    """Identifies a version of an element independent of its validity."""
+    properties = {
+        key: value
+        for key, value in properties.items()
+        if key not in ["@validFrom", "@validTo"]
+    }
+    signature = hashlib.sha1(
+        json.dumps(properties, sort_keys=True, default=str).encode("utf-8")
+    )
+    signature.update(geometry or b"")
+    return signature.digest()
+
+
+def continued_versions(versions, boundaries: set) -> [tuple]:
+    """
+    Finds the full-history versions that were cut at a window boundary.
+    A version ending at a boundary and the version of the same element with
+    the same geometry and properties starting there are one version.
+
+    :param versions: (reference, osm id, valid from, valid to, signature)
+        tuples of the versions, in any order.
+
+    :param boundaries: The window boundaries, see window_boundaries.
+    :type boundaries: set
+
+    :returns: A (reference, valid to, references) tuple for every cut
+        version: the part that is kept, the end of the last part and the
+        parts that continue it.
+    :rtype: list
+    """
+    cut = sorted(
+        (osm_id, signature, _normalize(valid_from), reference, valid_to)
+        for reference, osm_id, valid_from, valid_to, signature in versions
+        if _normalize(valid_from) in boundaries
+        or _normalize(valid_to) in boundaries
+    )
+    stitched = []
+    previous = None
+    for osm_id, signature, valid_from, reference, valid_to in cut:
+        if (
+            previous is not None
+            and previous[0] == (osm_id, signature)
+            and _normalize(previous[2]) == valid_from
+            and valid_from in boundaries
+        ):
+            previous[2] = valid_to
+            previous[3].append(reference)
+            continue
+        if previous is not None and len(previous[3]):
+            stitched.append((previous[1], previous[2], previous[3]))
+        previous = [(osm_id, signature), reference, valid_to, []]
+    if previous is not None and len(previous[3]):
+        stitched.append((previous[1], previous[2], previous[3]))
+    return stitched
+
+
+def superseded_contributions(contributions) -> list:
+    """
+    Finds the latest contributions of the earlier windows that a later
+    contribution to the same element replaces.
+
+    :param contributions: (reference, osm id, timestamp) tuples of the
+        latest contributions of all windows.
+
+    :returns: The references of the replaced contributions.
+    :rtype: list
+    """
+    contributions = list(contributions)
+    latest = {}
+    for _, osm_id, timestamp in contributions:
+        timestamp = _normalize(timestamp)
+        if timestamp > latest.get(osm_id, ""):
+            latest[osm_id] = timestamp
+    return [
+        reference
+        for reference, osm_id, timestamp in contributions
+        if _normalize(timestamp) < latest[osm_id]
+    ]
+
+
+def stitch_output(feature_output, request_url: str, windows: [dict]):
+    """
+    Merges the written features of consecutive time windows.
+
+    Full-history versions cut at a window boundary are joined into one
+    feature spanning both windows. Contributions at a boundary are returned
+    by both windows and are deduplicated. Of the latest contributions only
+    the one of the last window per element is kept.
+
+    :param feature_output: The written features, e.g. a writer.FeatureWriter
+        or memory.MemoryFeatureWriter.
+
+    :param request_url: The endpoint.
+    :type request_url: str
+
+    :param windows: The request parameters of the windows.
+    :type windows: list
+    """
+    boundaries = window_boundaries(windows)
+    endpoint = request_url.strip("/").split("/")
+    if endpoint[0] == "elementsFullHistory":
+        versions = (
+            (
+                reference,
+                properties["@osmId"],
+                properties.get("@validFrom"),
+                properties.get("@validTo"),
+                _signature(properties, geometry),
+            )
+            for reference, properties, geometry in (
+                feature_output.repeated_features(["@osmId"])
+            )
+        )
+        changes = {}
+        removed = []
+        for reference, valid_to, continuations in continued_versions(
+            versions, boundaries
+        ):
+            changes[reference] = {"@validTo": valid_to}
+            removed.extend(continuations)
+        feature_output.update_features(changes)
+        feature_output.delete_features(removed)
+        return
+    if len(endpoint) > 1 and endpoint[1] == "latest":
+        feature_output.delete_features(
+            superseded_contributions(
+                (reference, properties["@osmId"], properties.get("@timestamp"))
+                for reference, properties, _ in (
+                    feature_output.repeated_features(["@osmId"])
+                )
+            )
+        )
+    tiling.deduplicate_output(feature_output, request_url)
+
+
+def _time_column(row: dict):
+    for column in TIME_COLUMNS:
+        if column in row:
+            return column
+    return None
+
+
+def last_timestamp(path: str):
+    """
+    Finds the latest timestamp of an aggregation result written to a CSV
+    file.
+
+    :param path: The CSV file.
+    :type path: str
+
+    :returns: The timestamp or None if there is no such CSV file with a
+        time column.
+    :rtype: str or None
+    """
+    if not path.lower().endswith(".csv") or not os.path.isfile(path):
+        return None
+    last = None
+    try:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                column = _time_column(row)
+                if column is None:
+                    return None
+                if _parse(row[column]) is not None and (
+                    last is None or _parse(row[column]) > _parse(last)
+                ):
+                    last = row[column]
+    except (UnicodeDecodeError, csv.Error) as err:
+        logger.log(f"{path} could not be read: {err}", 1)
+        return None
+    return last
+
+
+def incremental_time(time: str, last: str):
+    """
+    Moves the start of a "start/end/period" time parameter to the last
+    timestamp already fetched. The series stays aligned to the period, as
+    the timestamps are counted from the start.
+
+    :param time: The time parameter.
+    :type time: str
+
+    :param last: The latest timestamp already fetched.
+    :type last: str
+
+    :returns: The time parameter of the newer periods, None if there are
+        none. Parameters that are no periodic range are returned unchanged.
+    :rtype: str or None
+    """
+    parts = time.split("/")
+    if len(parts) != 3 or _parse(last) is None or _parse(parts[1]) is None:
+        return time
+    if _parse(last) >= _parse(parts[1]):
+        return None
+    return f"{_normalize(last)}/{parts[1]}/{parts[2]}"
+
+
+def incremental_preferences(preferences, last: str):
+    """
+    Restricts the time parameter of the preferences to the periods after
+    the last timestamp of an existing output.
+
+    :param preferences: The request parameters.
+    :type preferences: dict or list
+
+    :param last: The last timestamp of the existing output.
+    :type last: str
+
+    :returns: The restricted preferences or None if there are no newer
+        periods.
+    :rtype: dict or list or None
+    """
+    batches = preferences if isinstance(preferences, list) else [preferences]
+    refreshed = []
+    for batch in batches:
+        time = incremental_time(batch["time"], last)
+        if time is None:
+            return None
+        refreshed.append({**batch, "time": time})
+    return refreshed if isinstance(preferences, list) else refreshed[0]
+
+
+def newer_rows(rows: [dict], last: str) -> [dict]:
+    """
+    :param rows: Result rows of an aggregation.
+    :type rows: list
+
+    :param last: The latest timestamp already fetched.
+    :type last: str
+
+    :returns: The rows of the periods after last.
+    :rtype: list
+    """
+    last = _parse(last)
+    newer = []
+    for row in rows:
+        column = _time_column(row)
+        timestamp = _parse(row[column]) if column else None
+        if timestamp is not None and timestamp > last:
+            newer.append(row)
+    return newer
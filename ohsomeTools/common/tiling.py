@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Splits large extraction areas into tiles that are requested separately.
+GDAL is imported by the functions that split geometries, so the others
+run without it, e.g. in the tests.
+"""
+
+import json
+import math
+
+from ohsomeTools.common import EXTRACTION_SPECS
+from ohsomeTools.utils import configmanager, logger
+
+DEFAULT_TILING_SETTINGS = {
+    "enabled": True,
+    "max_elements_per_tile": 50000,
+    "max_tiles": 64,
+}
+
+# Properties that identify a feature of an extraction response. Features
+# crossing tile borders are returned by several tiles.
+FEATURE_KEY_FIELDS = [
+    "@osmId",
+    "@validFrom",
+    "@validTo",
+    "@snapshotTimestamp",
+    "@timestamp",
+    "@contributionChangesetId",
+]
+
+
+def _tiling_settings() -> dict:
+    settings = DEFAULT_TILING_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config().get("runtime", {}).get("tiling", {}) or {}
+    )
+    return settings
+
+
+def is_extraction(request_url: str) -> bool:
+    """
+    Checks whether the endpoint returns features, whose results of
+    several tiles can be merged.
+
+    :param request_url: The endpoint, e.g. elements/geometry.
+    :type request_url: str
+
+    :rtype: bool
+    """
+    endpoint = request_url.strip("/").split("/")
+    return (
+        endpoint[0] in EXTRACTION_SPECS
+        and "/".join(endpoint[1:]) in EXTRACTION_SPECS[endpoint[0]]
+    )
+
+
+def estimate_elements(clnt, preferences: dict):
+    """
+    Estimates the number of elements of an extraction with an elements/count
+    request for the same area, filter and time.
+
+    :param clnt: The client to request with.
+    :type clnt: client.Client
+
+    :param preferences: The extraction request parameters.
+    :type preferences: dict
+
+    :returns: The largest count of all requested timestamps or None if the
+        count request failed.
+    :rtype: int or None
+    """
+    probe = {
+        key: preferences[key]
+        for key in ["bpolys", "filter", "time", "timeout"]
+        if key in preferences
+    }
+    try:
+        result = clnt.request("/elements/count", {}, post_json=probe)
+    except Exception as err:
+        logger.log(f"The element count could not be estimated: {err}", 1)
+        return None
+    values = [row.get("value", 0) for row in result.get("result", [])]
+    return int(max(values)) if len(values) else None
+
+
+def _polygonal(geometry):
+    """Drops the points and lines an intersection may contain."""
+    from osgeo import ogr
+
+    if geometry is None or geometry.IsEmpty():
+        return None
+    geometry_type = ogr.GT_Flatten(geometry.GetGeometryType())
+    if geometry_type in [ogr.wkbPolygon, ogr.wkbMultiPolygon]:
+        return geometry
+    if geometry_type != ogr.wkbGeometryCollection:
+        return None
+    polygons = ogr.Geometry(ogr.wkbMultiPolygon)
+    for i in range(geometry.GetGeometryCount()):
+        part = _polygonal(geometry.GetGeometryRef(i))
+        if part is None:
+            continue
+        if ogr.GT_Flatten(part.GetGeometryType()) == ogr.wkbPolygon:
+            polygons.AddGeometry(part)
+        else:
+            for j in range(part.GetGeometryCount()):
+                polygons.AddGeometry(part.GetGeometryRef(j))
+    return polygons if polygons.GetGeometryCount() else None
+
+
+def split_bpolys(bpolys: str, columns: int, rows: int) -> [str]:
+    """
+    Splits a bpolys FeatureCollection along a regular grid over its extent.
+    Every feature is clipped to the grid cells and keeps its id and
+    properties, so groupBy/boundary results stay assigned to it.
+
+    :param bpolys: The GeoJSON FeatureCollection.
+    :type bpolys: str
+
+    :param columns: Number of grid columns.
+    :type columns: int
+
+    :param rows: Number of grid rows.
+    :type rows: int
+
+    :returns: One FeatureCollection per non-empty grid cell.
+    :rtype: list
+    """
+    from osgeo import ogr
+
+    feature_collection = json.loads(bpolys)
+    features = [
+        (feature, ogr.CreateGeometryFromJson(json.dumps(feature["geometry"])))
+        for feature in feature_collection.get("features", [])
+        if feature.get("geometry")
+    ]
+    features = [
+        (feature, geometry)
+        for feature, geometry in features
+        if geometry is not None
+    ]
+    if not len(features):
+        return [bpolys]
+    envelopes = [geometry.GetEnvelope() for _, geometry in features]
+    min_x = min(envelope[0] for envelope in envelopes)
+    max_x = max(envelope[1] for envelope in envelopes)
+    min_y = min(envelope[2] for envelope in envelopes)
+    max_y = max(envelope[3] for envelope in envelopes)
+    width = (max_x - min_x) / columns
+    height = (max_y - min_y) / rows
+
+    tiles = []
+    for column in range(columns):
+        for row in range(rows):
+            left = min_x + column * width
+            right = max_x if column == columns - 1 else left + width
+            bottom = min_y + row * height
+            top = max_y if row == rows - 1 else bottom + height
+            ring = ogr.Geometry(ogr.wkbLinearRing)
+            for x, y in [
+                (left, bottom),
+                (right, bottom),
+                (right, top),
+                (left, top),
+                (left, bottom),
+            ]:
+                ring.AddPoint_2D(x, y)
+            cell = ogr.Geometry(ogr.wkbPolygon)
+            cell.AddGeometry(ring)
+
+            tile_features = []
+            for (feature, geometry), envelope in zip(features, envelopes):
+                if (
+                    envelope[0] > right
+                    or envelope[1] < left
+                    or envelope[2] > top
+                    or envelope[3] < bottom
+                ):
+                    continue
+                if cell.Contains(geometry):
+                    clipped = geometry
+                else:
+                    clipped = _polygonal(geometry.Intersection(cell))
+                if clipped is None:
+                    continue
+                tile_feature = feature.copy()
+                tile_feature["geometry"] = json.loads(clipped.ExportToJson())
+                tile_features.append(tile_feature)
+            if len(tile_features):
+                tile = feature_collection.copy()
+                tile["features"] = tile_features
+                tiles.append(json.dumps(tile))
+    return tiles
+
+
+def plan_tiles(clnt, request_url: str, preferences: dict) -> [dict]:
+    """
+    Splits an extraction into tiles that each return about
+    max_elements_per_tile elements according to an elements/count probe,
+    assuming the elements are evenly distributed.
+
+    Requests that are no bpolys extraction, small extractions or disabled
+    tiling return the preferences unchanged.
+
+    :param clnt: The client to probe with.
+    :type clnt: client.Client
+
+    :param request_url: The endpoint.
+    :type request_url: str
+
+    :param preferences: The request parameters.
+    :type preferences: dict
+
+    :returns: The request parameters of every tile.
+    :rtype: list
+    """
+    settings = _tiling_settings()
+    if (
+        not settings["enabled"]
+        or "bpolys" not in preferences
+        or not is_extraction(request_url)
+    ):
+        return [preferences]
+    estimate = estimate_elements(clnt, preferences)
+    max_elements = max(1, int(settings["max_elements_per_tile"]))
+    if estimate is None or estimate <= max_elements:
+        return [preferences]
+    grid_size = min(
+        math.ceil(math.sqrt(estimate / max_elements)),
+        max(1, math.floor(math.sqrt(settings["max_tiles"]))),
+    )
+    if grid_size <= 1:
+        return [preferences]
+    tiles = []
+    for bpolys in split_bpolys(preferences["bpolys"], grid_size, grid_size):
+        tile = preferences.copy()
+        tile["bpolys"] = bpolys
+        tiles.append(tile)
+    logger.log(
+        f"Split the extraction of about {estimate} elements into "
+        f"{len(tiles)} tiles.",
+        0,
+    )
+    return tiles
+
+
+def feature_key(properties: dict):
+    """
+    Identifies a feature of an extraction response by its properties in
+    FEATURE_KEY_FIELDS.
+
+    :param properties: The properties of the feature.
+    :type properties: dict
+
+    :returns: The key, None if the feature has no @osmId.
+    :rtype: tuple or None
+    """
+    if properties.get("@osmId") is None:
+        return None
+    return tuple(properties.get(field) for field in FEATURE_KEY_FIELDS)
+
+
+def unites_geometries(request_url: str) -> bool:
+    """
+    Whether the tiles of an endpoint return the clipped geometries of a
+    feature crossing their borders, which have to be united. The centroid
+    and bbox of a feature are the same in every tile.
+
+    :param request_url: The endpoint.
+    :type request_url: str
+
+    :rtype: bool
+    """
+    return request_url.strip("/").split("/")[-1] == "geometry"
+
+
+def duplicate_groups(features) -> [list]:
+    """
+    Groups the features that several tiles returned.
+
+    :param features: (feature key, reference) pairs of the features in
+        output order, see feature_key.
+
+    :returns: The references of every feature returned more than once, in
+        output order.
+    :rtype: list
+    """
+    groups = {}
+    for key, reference in features:
+        if key is not None:
+            groups.setdefault(key, []).append(reference)
+    return [references for references in groups.values() if len(references) > 1]
+
+
+def deduplicate_output(feature_output, request_url: str):
+    """
+    Removes the features that several tiles returned from the written
+    output. The clipped geometries of a feature crossing tile borders are
+    united, of centroids and bboxes the first feature is kept.
+
+    :param feature_output: The written features, e.g. a writer.FeatureWriter
+        or memory.MemoryFeatureWriter.
+
+    :param request_url: The endpoint.
+    :type request_url: str
+    """
+    groups = duplicate_groups(
+        (feature_key(properties), reference)
+        for reference, properties, _ in feature_output.repeated_features(
+            FEATURE_KEY_FIELDS
+        )
+    )
+    unite = unites_geometries(request_url)
+    for references in groups:
+        if unite:
+            feature_output.unite_features(references)
+        else:
+            feature_output.delete_features(references[1:])
@@ -0,0 +1,915 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Writes GeoJSON features of ohsome API responses to GeoPackage or
+FlatGeobuf files and aggregation results to typed tables.
+"""
+
+import csv
+import json
+import os
+
+from osgeo import ogr, osr
+
+from ohsomeTools.utils import exceptions
+
+GEOMETRY_TYPES = {
+    "Point": ogr.wkbPoint,
+    "LineString": ogr.wkbLineString,
+    "Polygon": ogr.wkbPolygon,
+    "MultiPoint": ogr.wkbMultiPoint,
+    "MultiLineString": ogr.wkbMultiLineString,
+    "MultiPolygon": ogr.wkbMultiPolygon,
+}
+
+# Geometry type names by OGR geometry type
+_GEOMETRY_TYPE_NAMES = {
+    ogr_type: name for name, ogr_type in GEOMETRY_TYPES.items()
+}
+
+# Table of the features without geometry
+NO_GEOMETRY = "NoGeometry"
+
+SINGLE_TO_MULTI = {
+    "Point": "MultiPoint",
+    "LineString": "MultiLineString",
+    "Polygon": "MultiPolygon",
+}
+
+TIMESTAMP_FIELDS = [
+    "@validFrom",
+    "@validTo",
+    "@snapshotTimestamp",
+    "@timestamp",
+    "endDate",
+]
+
+# Columns of aggregation results holding timestamps
+RESULT_TIMESTAMP_FIELDS = ["timestamp", "fromTimestamp", "toTimestamp"]
+
+ID_FIELD = "@osmId"
+
+# Start and end field of the validity interval in order of precedence
+VALIDITY_FIELDS = [
+    ("@validFrom", "@validTo"),
+    ("@snapshotTimestamp", "endDate"),
+    ("@timestamp", "endDate"),
+]
+
+
+def output_format(output_path: str) -> (str, str):
+    """
+    Determines the OGR driver from the file extension. Paths without a
+    supported extension are written as GeoPackage, see
+    FeatureWriter.warnings.
+
+    :param output_path: The requested output path.
+    :type output_path: str
+
+    :returns: The driver name and the path to write to.
+    :rtype: (str, str)
+    """
+    root, extension = os.path.splitext(output_path)
+    if extension.lower() == ".fgb":
+        return "FlatGeobuf", output_path
+    if extension.lower() == ".gpkg":
+        return "GPKG", output_path
+    return "GPKG", f"{root}.gpkg"
+
+
+# Field types a property is widened to if its values need it, narrowest
+# first
+_WIDENING = [
+    (ogr.OFTInteger, ogr.OFSTBoolean),
+    (ogr.OFTInteger64, ogr.OFSTNone),
+    (ogr.OFTReal, ogr.OFSTNone),
+    (ogr.OFTString, ogr.OFSTNone),
+]
+
+
+def widen_field_type(current: (int, int), required: (int, int)) -> (int, int):
+    """
+    Returns the narrowest field type that holds the values of both types,
+    e.g. a real for integers and reals and a string if the values conflict.
+
+    :param current: The OGR field type and subtype of a field.
+    :type current: (int, int)
+
+    :param required: The type a new value of the field needs.
+    :type required: (int, int)
+
+    :rtype: (int, int)
+    """
+    if current == required:
+        return current
+    if current in _WIDENING and required in _WIDENING:
+        return max(current, required, key=_WIDENING.index)
+    return ogr.OFTString, ogr.OFSTNone
+
+
+def _field_type(name: str, value) -> (int, int):
+    if name in TIMESTAMP_FIELDS:
+        return ogr.OFTDateTime, ogr.OFSTNone
+    if isinstance(value, bool):
+        return ogr.OFTInteger, ogr.OFSTBoolean
+    if isinstance(value, int):
+        return ogr.OFTInteger64, ogr.OFSTNone
+    if isinstance(value, float):
+        return ogr.OFTReal, ogr.OFSTNone
+    return ogr.OFTString, ogr.OFSTNone
+
+
+def column_type(name: str, values: list) -> (int, int):
+    """
+    Infers the type of a column of aggregation results from its values.
+
+    :param name: The column name.
+    :type name: str
+
+    :param values: The values of the column.
+    :type values: list
+
+    :returns: The OGR field type and subtype.
+    :rtype: (int, int)
+    """
+    if name in TIMESTAMP_FIELDS + RESULT_TIMESTAMP_FIELDS:
+        return ogr.OFTDateTime, ogr.OFSTNone
+    values = [value for value in values if value is not None]
+    if not len(values):
+        return ogr.OFTString, ogr.OFSTNone
+    if all(isinstance(value, bool) for value in values):
+        return ogr.OFTInteger, ogr.OFSTBoolean
+    if all(
+        isinstance(value, int) and not isinstance(value, bool)
+        for value in values
+    ):
+        return ogr.OFTInteger64, ogr.OFSTNone
+    if all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in values
+    ):
+        return ogr.OFTReal, ogr.OFSTNone
+    return ogr.OFTString, ogr.OFSTNone
+
+
+def _csvt_type(field_type: int, sub_type: int) -> str:
+    if sub_type == ogr.OFSTBoolean:
+        return "Integer(Boolean)"
+    return {
+        ogr.OFTDateTime: "DateTime",
+        ogr.OFTInteger64: "Integer64",
+        ogr.OFTReal: "Real",
+    }.get(field_type, "String")
+
+
+def _table_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _write_csv_table(rows: [dict], header, path: str, append: bool):
+    if append and os.path.isfile(path):
+        with open(path, newline="") as f:
+            header = next(csv.reader(f), header)
+    else:
+        append = False
+    header = list(header)
+    with open(path, "a" if append else "w", newline="") as f:
+        table = csv.writer(f)
+        if not append:
+            table.writerow(header)
+        table.writerows(
+            [
+                [
+                    "" if row.get(column) is None else _table_value(row[column])
+                    for column in header
+                ]
+                for row in rows
+            ]
+        )
+    # Column types read by the OGR CSV driver. Only written with a new file,
+    # the appended rows alone, e.g. none if the file is up to date, don't
+    # tell the types of the existing columns.
+    if not append:
+        csvt_path = f"{os.path.splitext(path)[0]}.csvt"
+        with open(csvt_path, "w", newline="") as f:
+            csv.writer(f, quoting=csv.QUOTE_ALL).writerow(
+                [
+                    _csvt_type(
+                        *column_type(column, [row.get(column) for row in rows])
+                    )
+                    for column in header
+                ]
+            )
+    return path
+
+
+def _write_gpkg_table(rows: [dict], header, path: str, append: bool):
+    name = os.path.splitext(os.path.basename(path))[0]
+    driver = ogr.GetDriverByName("GPKG")
+    dataset = ogr.Open(path, 1) if append and os.path.isfile(path) else None
+    layer = dataset.GetLayerByName(name) if dataset is not None else None
+    if dataset is None:
+        _delete_output(driver, path)
+        dataset = driver.CreateDataSource(path)
+    if dataset is None:
+        raise exceptions.PluginError(
+            "Output error", f"The output file {path} could not be created."
+        )
+    if layer is None:
+        layer = dataset.CreateLayer(name, None, ogr.wkbNone)
+        if layer is None:
+            raise exceptions.PluginError(
+                "Output error",
+                f"The table {name} could not be created in {path}.",
+            )
+        for column in header:
+            field_type, sub_type = column_type(
+                column, [row.get(column) for row in rows]
+            )
+            field = ogr.FieldDefn(column, field_type)
+            field.SetSubType(sub_type)
+            layer.CreateField(field)
+    definition = layer.GetLayerDefn()
+    columns = [
+        definition.GetFieldDefn(i).GetName()
+        for i in range(definition.GetFieldCount())
+    ]
+    dataset.StartTransaction()
+    for row in rows:
+        ogr_feature = ogr.Feature(definition)
+        for column in columns:
+            if row.get(column) is not None:
+                ogr_feature.SetField(column, _table_value(row[column]))
+        if layer.CreateFeature(ogr_feature) != ogr.OGRERR_NONE:
+            dataset.RollbackTransaction()
+            raise exceptions.PluginError(
+                "Output error", f"A row could not be written to {path}."
+            )
+    dataset.CommitTransaction()
+    dataset = None
+    return f"{path}|layername={name}"
+
+
+def write_table(
+    rows: [dict], header, output_path: str, append: bool = False
+) -> str:
+    """
+    Writes result rows of an aggregation with typed columns, timestamps as
+    date and time and numbers as such.
+
+    A .gpkg output is written as GeoPackage attribute table inside a single
+    transaction. Any other output is written as CSV file with a .csvt file
+    of the column types next to it, which OGR reads along.
+
+    :param rows: The rows.
+    :type rows: list
+
+    :param header: The column names.
+    :type header: list
+
+    :param output_path: The output file.
+    :type output_path: str
+
+    :param append: Append the rows to an existing output, in the order of
+        its columns.
+    :type append: bool
+
+    :returns: The data source uri of the table.
+    :rtype: str
+    """
+    if os.path.splitext(output_path)[1].lower() == ".gpkg":
+        return _write_gpkg_table(rows, header, output_path, append)
+    return _write_csv_table(rows, header, output_path, append)
+
+
+def harmonize_geometry(geometry: dict) -> dict:
+    """
+    Wraps a single geometry into the multi geometry of the same type. The
+    coordinates are referenced, not copied.
+
+    :param geometry: A GeoJSON geometry.
+    :type geometry: dict
+
+    :returns: The multi geometry, or the geometry itself if it is none of
+        the single geometry types.
+    :rtype: dict
+    """
+    multi_type = SINGLE_TO_MULTI.get(geometry.get("type"))
+    if multi_type is None:
+        return geometry
+    return {"type": multi_type, "coordinates": [geometry.get("coordinates")]}
+
+
+def _partition_geometry(geometry: dict, properties: dict, harmonize: bool):
+    geometry_type = geometry.get("type")
+    if geometry_type == "GeometryCollection":
+        for part in geometry.get("geometries") or []:
+            yield from _partition_geometry(part, properties, harmonize)
+        return
+    if geometry_type not in GEOMETRY_TYPES:
+        raise exceptions.GeometryError(
+            "error",
+            f"Error constructing geometries from the GeoJSON response: "
+            f"unsupported geometry type {geometry_type}",
+        )
+    if harmonize and geometry_type in SINGLE_TO_MULTI:
+        geometry = harmonize_geometry(geometry)
+        geometry_type = geometry["type"]
+    yield geometry_type, geometry, properties
+
+
+def partition_feature(
+    feature: dict, keep_geometry_less: bool = False, harmonize: bool = False
+):
+    """
+    Routes a GeoJSON feature to the table of its geometry type. Geometry
+    collections are split into their parts, which share the properties of
+    the feature. The feature is not modified.
+
+    :param feature: The GeoJSON feature.
+    :type feature: dict
+
+    :param keep_geometry_less: Route features without geometry to the
+        NO_GEOMETRY table instead of dropping them.
+    :type keep_geometry_less: bool
+
+    :param harmonize: Route single geometries as multi geometries of the
+        same type, so both share one table.
+    :type harmonize: bool
+
+    :returns: A generator of (geometry type, GeoJSON geometry or None,
+        properties) tuples.
+    """
+    properties = feature.get("properties") or {}
+    geometry = feature.get("geometry")
+    if geometry is None:
+        if keep_geometry_less:
+            yield NO_GEOMETRY, None, properties
+        return
+    yield from _partition_geometry(geometry, properties, harmonize)
+
+
+def partition_features(
+    features, keep_geometry_less: bool = False, harmonize: bool = False
+):
+    """
+    Routes GeoJSON features to the tables of their geometry types in a
+    single pass, see partition_feature.
+
+    :param features: An iterable of GeoJSON features.
+
+    :returns: A generator of (geometry type, GeoJSON geometry or None,
+        properties) tuples.
+    """
+    for feature in features:
+        yield from partition_feature(feature, keep_geometry_less, harmonize)
+
+
+def validity_fields(field_names: [str]):
+    """
+    Returns the start and end field of the validity interval of features
+    with the given fields.
+
+    :param field_names: The field names of a table.
+    :type field_names: list
+
+    :returns: The start and end field or None if the features have no
+        validity interval.
+    :rtype: (str, str) or None
+    """
+    if ID_FIELD not in field_names:
+        return None
+    for date_start, date_end in VALIDITY_FIELDS:
+        if date_start in field_names:
+            return date_start, date_end
+    return None
+
+
+def _quote(identifier: str) -> str:
+    return '"{}"'.format(identifier.replace('"', '""'))
+
+
+def _delete_output(driver, path: str):
+    if os.path.exists(path):
+        driver.DeleteDataSource(path)
+
+
+class FeatureWriter:
+    """
+    Writes GeoJSON features to one table per geometry type while they are
+    received, so no GeoJSON text has to be serialised and parsed again.
+
+    The tables are staged in a GeoPackage inside one transaction, so an
+    existing output is only replaced once the output is complete. A
+    GeoPackage output is the staged file itself. FlatGeobuf only holds one
+    table per file and needs its fields before the first feature, so the
+    tables are copied into one file per geometry type on close. Both
+    formats are written with a spatial index.
+
+    Features written more than once, e.g. by several tiles of an
+    extraction, are merged in the staged tables, see repeated_features.
+
+    Usage
+    -----
+    ::
+        writer = FeatureWriter("extraction.gpkg")
+        for feature in features:
+            writer.write(feature)
+        for uri, name in writer.close():
+            QgsVectorLayer(uri, name, "ogr")
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        keep_geometry_less: bool = False,
+        combine_single_with_multi_geometries: bool = False,
+    ):
+        """
+        :param output_path: The output file. Unsupported extensions are
+            replaced by .gpkg and reported in warnings.
+        :type output_path: str
+
+        :param keep_geometry_less: Write features without geometry.
+        :type keep_geometry_less: bool
+
+        :param combine_single_with_multi_geometries: Write single geometries
+            as multi geometries of the same type, into one table.
+        :type combine_single_with_multi_geometries: bool
+        """
+        self.driver_name, self.path = output_format(output_path)
+        # Messages for the user, e.g. about a replaced file extension
+        self.warnings = []
+        if self.path != output_path:
+            self.warnings.append(
+                f"{os.path.basename(output_path)} has no supported feature "
+                "output format (.gpkg, .fgb), the features are written to "
+                f"{self.path} instead."
+            )
+        self.name = os.path.splitext(os.path.basename(self.path))[0]
+        self.keep_geometry_less = keep_geometry_less
+        self.combine_single_with_multi_geometries = (
+            combine_single_with_multi_geometries
+        )
+        self.feature_count = 0
+        self.tables = {}
+        self._fields = {}
+        self._srs = osr.SpatialReference()
+        self._srs.ImportFromEPSG(4326)
+        self._srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        self._gpkg_driver = ogr.GetDriverByName("GPKG")
+        self._staging_path = f"{self.path}.staging.gpkg"
+        _delete_output(self._gpkg_driver, self._staging_path)
+        self._dataset = self._gpkg_driver.CreateDataSource(self._staging_path)
+        if self._dataset is None:
+            raise exceptions.PluginError(
+                "Output error",
+                f"The output file {self._staging_path} could not be created.",
+            )
+        self._dataset.StartTransaction()
+
+    def table_name(self, geometry_type: str) -> str:
+        return f"{self.name}_{geometry_type}"
+
+    def write(self, feature: dict):
+        """
+        Writes a GeoJSON feature, see partition_feature.
+
+        :param feature: The GeoJSON feature.
+        :type feature: dict
+        """
+        for geometry_type, geometry, properties in partition_feature(
+            feature,
+            self.keep_geometry_less,
+            self.combine_single_with_multi_geometries,
+        ):
+            if geometry is not None:
+                geometry = self._ogr_geometry(geometry_type, geometry)
+            self._write(geometry_type, geometry, properties)
+
+    @staticmethod
+    def _ogr_geometry(geometry_type: str, geometry: dict):
+        ogr_geometry = ogr.CreateGeometryFromJson(json.dumps(geometry))
+        if ogr_geometry is None:
+            raise exceptions.GeometryError(
+                "error",
+                "Error constructing geometries from the GeoJSON response: "
+                f"invalid {geometry_type}",
+            )
+        return ogr_geometry
+
+    def _table(self, geometry_type: str):
+        layer = self.tables.get(geometry_type)
+        if layer is not None:
+            return layer
+        layer = self._dataset.CreateLayer(
+            self.table_name(geometry_type),
+            None if geometry_type == NO_GEOMETRY else self._srs,
+            GEOMETRY_TYPES.get(geometry_type, ogr.wkbNone),
+            ["SPATIAL_INDEX=YES"],
+        )
+        if layer is None:
+            raise exceptions.PluginError(
+                "Output error",
+                f"The table {self.table_name(geometry_type)} could not be "
+                f"created in {self._staging_path}.",
+            )
+        self.tables[geometry_type] = layer
+        # The field types by name
+        self._fields[geometry_type] = {}
+        return layer
+
+    def _add_fields(self, geometry_type: str, layer, properties: dict):
+        """
+        Adds the fields of new properties and widens the fields of values
+        that don't fit their type, e.g. a real of a property that was an
+        integer so far.
+        """
+        fields = self._fields[geometry_type]
+        for name, value in properties.items():
+            if value is None:
+                continue
+            required = _field_type(name, value)
+            if name not in fields:
+                field = ogr.FieldDefn(name, required[0])
+                field.SetSubType(required[1])
+                layer.CreateField(field)
+                fields[name] = required
+                continue
+            widened = widen_field_type(fields[name], required)
+            if widened != fields[name]:
+                self._alter_field(layer, name, widened)
+                fields[name] = widened
+
+    def _alter_field(self, layer, name: str, field_type: (int, int)):
+        field = ogr.FieldDefn(name, field_type[0])
+        field.SetSubType(field_type[1])
+        # Changing the type rewrites the table, which GeoPackage doesn't
+        # support within a transaction
+        self._dataset.CommitTransaction()
+        try:
+            result = layer.AlterFieldDefn(
+                layer.GetLayerDefn().GetFieldIndex(name),
+                field,
+                ogr.ALTER_TYPE_FLAG,
+            )
+        finally:
+            self._dataset.StartTransaction()
+        if result != ogr.OGRERR_NONE:
+            raise exceptions.PluginError(
+                "Output error",
+                f"The type of the field {name} could not be changed in "
+                f"{self._staging_path}.",
+            )
+
+    def _write(self, geometry_type: str, geometry, properties: dict):
+        layer = self._table(geometry_type)
+        self._add_fields(geometry_type, layer, properties)
+        ogr_feature = ogr.Feature(layer.GetLayerDefn())
+        for name, value in properties.items():
+            if value is None:
+                continue
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            elif isinstance(value, bool):
+                value = int(value)
+            ogr_feature.SetField(name, value)
+        if geometry is not None:
+            ogr_feature.SetGeometryDirectly(geometry)
+        if layer.CreateFeature(ogr_feature) != ogr.OGRERR_NONE:
+            raise exceptions.PluginError(
+                "Output error",
+                f"A feature could not be written to {self._staging_path}.",
+            )
+        self.feature_count += 1
+
+    def _properties(self, geometry_type: str, ogr_feature) -> dict:
+        """The properties of a written feature, timestamps in ISO 8601."""
+        properties = {}
+        for name, field_type in self._fields[geometry_type].items():
+            index = ogr_feature.GetFieldIndex(name)
+            if not ogr_feature.IsFieldSetAndNotNull(index):
+                properties[name] = None
+            elif field_type[0] == ogr.OFTDateTime:
+                (
+                    year,
+                    month,
+                    day,
+                    hour,
+                    minute,
+                    second,
+                    _,
+                ) = ogr_feature.GetFieldAsDateTime(index)
+                properties[name] = (
+                    f"{year:04d}-{month:02d}-{day:02d}T"
+                    f"{hour:02d}:{minute:02d}:{int(second):02d}Z"
+                )
+            else:
+                properties[name] = ogr_feature.GetField(index)
+        return properties
+
+    def repeated_features(self, fields: [str]):
+        """
+        Yields the written features that share their values of fields with
+        another written feature, e.g. an element returned by several tiles.
+        Features without ID_FIELD are left out. The features are selected
+        by SQLite, only the repeated ones are read.
+
+        :param fields: The property names, the first one is ID_FIELD.
+        :type fields: list
+
+        :returns: A generator of (reference, properties, geometry as WKB or
+            None) tuples. The features must not be changed before it is
+            exhausted.
+        """
+        tables = {
+            geometry_type: layer
+            for geometry_type, layer in self.tables.items()
+            if ID_FIELD in self._fields[geometry_type]
+        }
+        if not len(tables):
+            return
+
+        def column(geometry_type: str, name: str) -> str:
+            if name in self._fields[geometry_type]:
+                return _quote(name)
+            return "NULL"
+
+        columns = ", ".join(f"c{i}" for i in range(len(fields)))
+        selects = " UNION ALL ".join(
+            "SELECT "
+            + ", ".join(
+                f"{column(geometry_type, name)} AS c{i}"
+                for i, name in enumerate(fields)
+            )
+            + f" FROM {_quote(layer.GetName())} "
+            f"WHERE {_quote(ID_FIELD)} IS NOT NULL"
+            for geometry_type, layer in tables.items()
+        )
+        for statement in [
+            f"CREATE TEMP TABLE repeated AS SELECT {columns} FROM "
+            f"({selects}) GROUP BY {columns} HAVING COUNT(*) > 1",
+            "CREATE INDEX temp.repeated_id ON repeated (c0)",
+        ]:
+            self._dataset.ExecuteSQL(statement)
+        try:
+            for geometry_type, layer in tables.items():
+                # GeoPackage attribute filters are SQLite expressions
+                layer.SetAttributeFilter(
+                    "EXISTS (SELECT 1 FROM repeated WHERE "
+                    + " AND ".join(
+                        f"repeated.c{i} IS {column(geometry_type, name)}"
+                        for i, name in enumerate(fields)
+                    )
+                    + ")"
+                )
+                try:
+                    for ogr_feature in layer:
+                        geometry = ogr_feature.GetGeometryRef()
+                        yield (
+                            (geometry_type, ogr_feature.GetFID()),
+                            self._properties(geometry_type, ogr_feature),
+                            None
+                            if geometry is None
+                            else bytes(geometry.ExportToWkb()),
+                        )
+                finally:
+                    layer.SetAttributeFilter(None)
+        finally:
+            self._dataset.ExecuteSQL("DROP TABLE repeated")
+
+    def update_features(self, changes: dict):
+        """
+        Changes properties of written features.
+
+        :param changes: The new property values by feature reference, see
+            repeated_features.
+        :type changes: dict
+        """
+        for (geometry_type, fid), properties in changes.items():
+            layer = self.tables[geometry_type]
+            self._add_fields(geometry_type, layer, properties)
+            ogr_feature = layer.GetFeature(fid)
+            for name, value in properties.items():
+                if value is None:
+                    ogr_feature.SetFieldNull(name)
+                else:
+                    ogr_feature.SetField(name, _table_value(value))
+            if layer.SetFeature(ogr_feature) != ogr.OGRERR_NONE:
+                raise exceptions.PluginError(
+                    "Output error",
+                    f"A feature could not be changed in {self._staging_path}.",
+                )
+
+    def delete_features(self, references: list):
+        """
+        Removes written features.
+
+        :param references: The references of the features, see
+            repeated_features.
+        :type references: list
+        """
+        for geometry_type, fid in references:
+            if self.tables[geometry_type].DeleteFeature(fid) != ogr.OGRERR_NONE:
+                raise exceptions.PluginError(
+                    "Output error",
+                    f"A feature could not be removed from {self._staging_path}.",
+                )
+            self.feature_count -= 1
+
+    def unite_features(self, references: list):
+        """
+        Unites the geometries of written features into the first one and
+        removes the others. The united feature moves to the table of its
+        new geometry type, e.g. from Polygon to MultiPolygon.
+
+        :param references: The references of the features, see
+            repeated_features.
+        :type references: list
+        """
+        first_type, first_fid = references[0]
+        first = self.tables[first_type].GetFeature(first_fid)
+        geometry = first.GetGeometryRef()
+        union = None if geometry is None else geometry.Clone()
+        for geometry_type, fid in references[1:]:
+            geometry = (
+                self.tables[geometry_type].GetFeature(fid).GetGeometryRef()
+            )
+            if geometry is None:
+                continue
+            if union is None:
+                union = geometry.Clone()
+            elif geometry.ExportToWkb() != union.ExportToWkb():
+                united = union.Union(geometry)
+                if united is not None:
+                    union = united
+        self.delete_features(references[1:])
+        geometry = first.GetGeometryRef()
+        if union is None or (
+            geometry is not None
+            and geometry.ExportToWkb() == union.ExportToWkb()
+        ):
+            return
+        geometry_type = _GEOMETRY_TYPE_NAMES.get(
+            ogr.GT_Flatten(union.GetGeometryType())
+        )
+        if (
+            self.combine_single_with_multi_geometries
+            and geometry_type in SINGLE_TO_MULTI
+        ):
+            union = ogr.ForceToMulti(union)
+            geometry_type = SINGLE_TO_MULTI[geometry_type]
+        if geometry_type is None:
+            # E.g. a geometry collection, the first part is kept
+            return
+        if geometry_type == first_type:
+            first.SetGeometry(union)
+            if self.tables[first_type].SetFeature(first) != ogr.OGRERR_NONE:
+                raise exceptions.PluginError(
+                    "Output error",
+                    f"A feature could not be changed in {self._staging_path}.",
+                )
+            return
+        properties = self._properties(first_type, first)
+        self.delete_features([references[0]])
+        self._write(
+            geometry_type,
+            union,
+            {
+                name: value
+                for name, value in properties.items()
+                if value is not None
+            },
+        )
+
+    def _fill_validity_intervals(self, geometry_type: str):
+        """
+        Sets the missing end of every validity interval to the start of the
+        next version of the same OSM element. The last version of an
+        element is valid until one day after the youngest start in the
+        table.
+
+        The versions are sorted once by SQLite and only the end column is
+        written, so the features are neither read into Python nor
+        rewritten.
+        """
+        layer = self.tables[geometry_type]
+        fields = validity_fields(self._fields[geometry_type])
+        if fields is None:
+            return
+        date_start, date_end = fields
+        if date_end not in self._fields[geometry_type]:
+            layer.CreateField(ogr.FieldDefn(date_end, ogr.OFTDateTime))
+            self._fields[geometry_type][date_end] = (
+                ogr.OFTDateTime,
+                ogr.OFSTNone,
+            )
+        table = _quote(layer.GetName())
+        fid = _quote(layer.GetFIDColumn())
+        date_start, date_end = _quote(date_start), _quote(date_end)
+        youngest = self._dataset.ExecuteSQL(
+            f"SELECT strftime('%Y-%m-%dT%H:%M:%fZ', MAX({date_start}), "
+            f"'+1 day') FROM {table}"
+        )
+        youngest_timestamp = youngest.GetNextFeature().GetField(0)
+        self._dataset.ReleaseResultSet(youngest)
+        if youngest_timestamp is None:
+            return
+        for statement in [
+            "CREATE TEMP TABLE validity "
+            "(fid INTEGER PRIMARY KEY, valid_to TEXT)",
+            f"INSERT INTO validity SELECT {fid}, LEAD({date_start}) OVER "
+            f"(PARTITION BY {_quote(ID_FIELD)} ORDER BY {date_start}) "
+            f"FROM {table}",
+            f"UPDATE {table} SET {date_end} = COALESCE("
+            f"(SELECT valid_to FROM validity WHERE validity.fid = {table}.{fid}), "
+            f"'{youngest_timestamp}') WHERE {date_end} IS NULL",
+            "DROP TABLE validity",
+        ]:
+            self._dataset.ExecuteSQL(statement)
+
+    def close(self) -> [(str, str)]:
+        """
+        Finishes the output.
+
+        :returns: The data source uri and name of every written table.
+        :rtype: list
+        """
+        for geometry_type in self.tables:
+            self._fill_validity_intervals(geometry_type)
+        self._dataset.CommitTransaction()
+        outputs = []
+        if self.driver_name == "GPKG":
+            outputs = [
+                (
+                    f"{self.path}|layername={self.table_name(geometry_type)}",
+                    self.table_name(geometry_type),
+                )
+                for geometry_type in self.tables
+            ]
+            self.tables = {}
+            self._dataset = None
+            _delete_output(self._gpkg_driver, self.path)
+            os.replace(self._staging_path, self.path)
+            return outputs
+        fgb_driver = ogr.GetDriverByName(self.driver_name)
+        root = os.path.splitext(self.path)[0]
+        for geometry_type, layer in self.tables.items():
+            path = (
+                self.path
+                if len(self.tables) == 1
+                else f"{root}_{geometry_type}.fgb"
+            )
+            _delete_output(fgb_driver, path)
+            dataset = fgb_driver.CreateDataSource(path)
+            if dataset is None:
+                raise exceptions.PluginError(
+                    "Output error",
+                    f"The output file {path} could not be created.",
+                )
+            dataset.CopyLayer(
+                layer, self.table_name(geometry_type), ["SPATIAL_INDEX=YES"]
+            )
+            dataset = None
+            outputs.append((path, self.table_name(geometry_type)))
+        self.tables = {}
+        self._dataset = None
+        _delete_output(self._gpkg_driver, self._staging_path)
+        return outputs
+
+    def discard(self):
+        """Drops the written features, an existing output is kept."""
+        if self._dataset is None:
+            return
+        self._dataset.RollbackTransaction()
+        self.tables = {}
+        self._dataset = None
+        _delete_output(self._gpkg_driver, self._staging_path)
@@ -43,7 +43,6 @@ from PyQt5.QtWidgets import (
 )
 from qgis._core import (
     Qgis,
-    QgsTask,
     QgsApplication,
 )
 from qgis.core import (
@@ -82,6 +81,7 @@ from ohsomeTools.common import (
     EXTRACTION_SPECS,
     AGGREGATION_SPECS,
     DATA_AGGREGATION_FORMAT,
+    DEFAULT_MAX_IN_FLIGHT,
 )
 from ohsomeTools.gui import ohsome_spec
 
@@ -217,7 +217,10 @@ class OhsomeToolsDialogMain:
 
     def select_output_file(self):
         filename, _filter = QFileDialog.getSaveFileName(
-            self.dlg, "Select   output file ", "", "*.csv"
+            self.dlg,
+            "Select   output file ",
+            "",
+            "GeoPackage (*.gpkg);;FlatGeobuf (*.fgb);;CSV (*.csv)",
         )
         self.dlg.lineEdit_output.setText(filename)
 
@@ -302,6 +305,7 @@ class OhsomeToolsDialogMain:
             self.dlg.debug_text.append("> " + msg)
 
         clnt = client.Client(provider)
+        max_in_flight = provider.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)
 
         metadata_check = clnt.check_api_metadata(self.iface)
 
@@ -331,6 +335,7 @@ class OhsomeToolsDialogMain:
                     request_url=preferences.get_request_url(),
                     preferences=preferences.get_bcircles_request_preferences(),
                     activate_temporal=preferences.activate_temporal_feature,
+                    timings=preferences.timings,
                 )
                 QgsApplication.taskManager().addTask(globals()[task_name])
             elif (
@@ -349,31 +354,17 @@ class OhsomeToolsDialogMain:
                         QDialogButtonBox.Ok
                     ).setEnabled(True)
                     return
-                last_task = None
-                for point_layer_preference in layer_preferences:
-                    task = ExtractionTaskFunction(
-                        iface=self.iface,
-                        dlg=self.dlg,
-                        description=f"OHSOME task",
-                        provider=provider,
-                        request_url=preferences.get_request_url(),
-                        preferences=point_layer_preference,
-                        activate_temporal=preferences.activate_temporal_feature,
-                    )
-                    if last_task and last_task != globals()[task_name]:
-                        # Never add the main task as a dependency!
-                        globals()[task_name].addSubTask(
-                            task,
-                            [last_task],
-                            QgsTask.ParentDependsOnSubTask,
-                        )
-                    elif last_task:
-                        globals()[task_name].addSubTask(
-                            task, [], QgsTask.ParentDependsOnSubTask
-                        )
-                    else:
-                        globals()[task_name] = task
-                    last_task = task
+                globals()[task_name] = ExtractionTaskFunction(
+                    iface=self.iface,
+                    dlg=self.dlg,
+                    description=f"OHSOME task",
+                    provider=provider,
+                    request_url=preferences.get_request_url(),
+                    preferences=layer_preferences,
+                    activate_temporal=preferences.activate_temporal_feature,
+                    max_in_flight=max_in_flight,
+                    timings=preferences.timings,
+                )
                 self.dlg.debug_text.append(
                     f"> cURL: {preferences.cURL(provider)}"
                 )
@@ -389,31 +380,17 @@ class OhsomeToolsDialogMain:
                 layer_preferences = (
                     preferences.get_polygon_layer_request_preferences()
                 )
-                last_task = None
-                for polygon_layer_preference in layer_preferences:
-                    task = ExtractionTaskFunction(
-                        iface=self.iface,
-                        dlg=self.dlg,
-                        description=f"OHSOME task",
-                        provider=provider,
-                        request_url=preferences.get_request_url(),
-                        preferences=polygon_layer_preference,
-                        activate_temporal=preferences.activate_temporal_feature,
-                    )
-                    if last_task and last_task != globals()[task_name]:
-                        # Never add the main task as a dependency!
-                        globals()[task_name].addSubTask(
-                            task,
-                            [last_task],
-                            QgsTask.ParentDependsOnSubTask,
-                        )
-                    elif last_task:
-                        globals()[task_name].addSubTask(
-                            task, [], QgsTask.ParentDependsOnSubTask
-                        )
-                    else:
-                        globals()[task_name] = task
-                    last_task = task
+                globals()[task_name] = ExtractionTaskFunction(
+                    iface=self.iface,
+                    dlg=self.dlg,
+                    description=f"OHSOME task",
+                    provider=provider,
+                    request_url=preferences.get_request_url(),
+                    preferences=layer_preferences,
+                    activate_temporal=preferences.activate_temporal_feature,
+                    max_in_flight=max_in_flight,
+                    timings=preferences.timings,
+                )
                 self.dlg.debug_text.append(
                     f"> cURL: {preferences.cURL(provider)}"
                 )
@@ -626,7 +603,7 @@ class OhsomeToolsDialog(QDialog, Ui_OhsomeToolsDialogBase):
             else:
                 end_date = self.date_end.dateTime()
             self.debug_text.setText(
-                f"API success: The API {clnt.url} could be reached. Metadata set.\n"
+                f"API success: Metadata of the API {clnt.base_url} set.\n"
             )
         except IndexError:
             msg = (
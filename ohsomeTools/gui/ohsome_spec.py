@@ -31,8 +31,12 @@ from qgis._core import (
     QgsWkbTypes,
 )
 
+from ohsomeTools.utils.bcircles import BcirclesEncoder
+from ohsomeTools.common import telemetry, tiling
 from ohsomeTools.utils.datamanager import (
+    bcircles_batch_limits,
     convert_point_features_to_ohsome_bcircles,
+    reduce_bpolys,
 )
 from ohsomeTools.utils import exceptions, logger
 
@@ -46,6 +50,8 @@ class OhsomeSpec:
         :type dlg: QDialog
         """
         self.dlg: QDialog = dlg
+        # Phases of the run, starting with building the request parameters
+        self.timings = telemetry.Timings()
 
     @property
     def _api_spec(self):
@@ -85,20 +91,15 @@ class OhsomeSpec:
 
     @property
     def _request_bcircles_coordinates(self) -> str:
-        coordinate_string = ""
+        encoder = BcirclesEncoder(radius=None)
         layers_list = self.dlg.ohsome_centroid_location_list
         for idx in range(layers_list.count()):
             item: str = layers_list.item(idx).text()
             param_cords, radius = item.rsplit(" | Radius: ")
             _, coordinates = param_cords.split(": ")
-
-            if len(coordinate_string) <= 0:
-                coordinate_string = f"id{idx}:{coordinates},{radius}"
-            else:
-                coordinate_string = (
-                    f"{coordinate_string}|id{idx}:{coordinates},{radius}"
-                )
-        return coordinate_string
+            # The coordinates are sent as they were entered
+            encoder.append(f"id{idx}:{coordinates},{radius}")
+        return encoder.encode()
 
     @property
     def _request_filter(self) -> str:
@@ -240,10 +241,20 @@ class OhsomeSpec:
         features = [layer.getFeatures()]
         ordered_list_of_features.extend(features)
         list_of_coordinates = convert_point_features_to_ohsome_bcircles(
-            ordered_list_of_features, radius
+            ordered_list_of_features, radius, **self._bcircles_batch_limits
         )
         return list_of_coordinates
 
+    @property
+    def _bcircles_batch_limits(self) -> dict:
+        # Only results assigned to the circles can be split into batches
+        if (
+            tiling.is_extraction(self._request_url)
+            or "groupBy/boundary" in self._request_url
+        ):
+            return bcircles_batch_limits()
+        return {}
+
     def __prepare_request_properties(self):
         """
         Builds parameters across different api specification combinations. Not all api endpoints support the same set of parameters.
@@ -275,15 +286,17 @@ class OhsomeSpec:
         endpoint_specific_request_properties = (
             self.__prepare_request_properties()
         )
-        endpoint_specific_request_properties[
-            "bcircles"
-        ] = self._request_bcircles_coordinates
+        with self.timings.span("build"):
+            endpoint_specific_request_properties[
+                "bcircles"
+            ] = self._request_bcircles_coordinates
         return endpoint_specific_request_properties
 
     def get_point_layer_request_preferences(self) -> []:
         endpoint_specific_request_properties = []
         request_properties = self.__prepare_request_properties()
-        list_of_bcircles = self._get_selected_point_layers_geometries()
+        with self.timings.span("build"):
+            list_of_bcircles = self._get_selected_point_layers_geometries()
         for bcircles in list_of_bcircles:
             request_properties["bcircles"] = bcircles
             endpoint_specific_request_properties.append(
@@ -295,9 +308,16 @@ class OhsomeSpec:
         endpoint_specific_request_properties = []
         request_properties = self.__prepare_request_properties()
 
-        request_properties[
-            "bpolys"
-        ] = self._get_selected_polygon_layers_geometries()
+        with self.timings.span("build"):
+            bpolys = self._get_selected_polygon_layers_geometries()
+            reduced_bpolys, saved_bytes = reduce_bpolys(bpolys)
+        if saved_bytes:
+            self._report(
+                f"Reduced the bpolys parameter from {len(bpolys.encode())} "
+                f"to {len(reduced_bpolys.encode())} bytes, "
+                f"saved {saved_bytes} bytes."
+            )
+        request_properties["bpolys"] = reduced_bpolys
 
         endpoint_specific_request_properties.append(request_properties.copy())
         return endpoint_specific_request_properties
@@ -305,6 +325,10 @@ class OhsomeSpec:
     def get_request_url(self) -> str:
         return self._request_url
 
+    def _report(self, message: str):
+        logger.log(message, 0)
+        self.dlg.debug_text.append(f"> {message}")
+
     def __dict__(self) -> dict:
         return {
             "api_spec": self._api_spec,
@@ -341,7 +365,7 @@ class OhsomeSpec:
             groupby_values = ""
 
         if self._get_selected_point_layers_geometries():
-            geoms = f'&bcircles={"".join(self._get_selected_point_layers_geometries())}'
+            geoms = f'&bcircles={"|".join(self._get_selected_point_layers_geometries())}'
         elif self._get_selected_polygon_layers_geometries():
             geoms = f'&bpolys={"".join(self._get_selected_polygon_layers_geometries())}'
 
@@ -352,6 +376,11 @@ class ProcessingOhsomeSpec(OhsomeSpec):
     def __init__(self, params, feedback):
         self.params = params
         self.feedback = feedback
+        self.timings = telemetry.Timings()
+
+    def _report(self, message: str):
+        logger.log(message, 0)
+        self.feedback.pushInfo(message)
 
     @property
     def _request_filter2(self) -> str:
@@ -466,7 +495,7 @@ class ProcessingOhsomeSpec(OhsomeSpec):
             ]
             ordered_list_of_features.extend(features)
         list_of_coordinates = convert_point_features_to_ohsome_bcircles(
-            ordered_list_of_features, radius
+            ordered_list_of_features, radius, **self._bcircles_batch_limits
         )
         return list_of_coordinates
 
@@ -26,12 +26,10 @@ from qgis.core import (
     QgsProcessingParameterFileDestination,
 )
 
-from qgis.utils import iface
-
 from ohsomeTools.utils import configmanager
 
-from ohsomeTools.common import AGGREGATION_SPECS, client
-from ..procDialog import run_processing_alg
+from ohsomeTools.common import AGGREGATION_SPECS
+from ..procDialog import run_processing_alg, cached_temporal_extent
 
 
 class ContributionsCount(QgsProcessingAlgorithm):
@@ -58,6 +56,7 @@ class ContributionsCount(QgsProcessingAlgorithm):
     FILTER = "FILTER"
     check_activate_temporal = "check_activate_temporal"
     check_show_metadata = "check_show_metadata"
+    check_incremental = "check_incremental"
     timeout_input = "timeout_input"
     check_clip_geometry = "check_clip_geometry"
     property_groups_check_tags = "property_groups_check_tags"
@@ -148,25 +147,9 @@ class ContributionsCount(QgsProcessingAlgorithm):
         Here we define the inputs and output of the algorithm, along
         with some other properties.
         """
-        try:
-            provider = configmanager.read_config()["providers"][0]
-            clnt = client.Client(provider)
-            metadata = clnt.check_api_metadata(iface)
-
-            start_date_string = (
-                metadata.get("extractRegion")
-                .get("temporalExtent")
-                .get("fromTimestamp")
-            )
-
-            end_date_string = (
-                metadata.get("extractRegion")
-                .get("temporalExtent")
-                .get("toTimestamp")
-            )
-        except:
-            start_date_string = ""
-            end_date_string = ""
+        # Only use cached metadata here, loading the algorithms must not block
+        # on the network. Missing dates are resolved on execution.
+        start_date_string, end_date_string = cached_temporal_extent()
 
         # We add the input vector features source. It can have any kind of
         # geometry.
@@ -219,7 +202,10 @@ class ContributionsCount(QgsProcessingAlgorithm):
 
         self.addParameter(
             QgsProcessingParameterDateTime(
-                self.date_start, "Start Date", defaultValue=start_date_string
+                self.date_start,
+                "Start Date",
+                defaultValue=start_date_string,
+                optional=True,
             )
         )
 
@@ -231,7 +217,10 @@ class ContributionsCount(QgsProcessingAlgorithm):
 
         self.addParameter(
             QgsProcessingParameterDateTime(
-                self.date_end, "End Date", defaultValue=end_date_string
+                self.date_end,
+                "End Date",
+                defaultValue=end_date_string,
+                optional=True,
             )
         )
 
@@ -267,6 +256,11 @@ class ContributionsCount(QgsProcessingAlgorithm):
                 self.tr("Show metadata"),
                 defaultValue=False,
             ),
+            QgsProcessingParameterBoolean(
+                self.check_incremental,
+                self.tr("Append newer periods to an existing CSV output"),
+                defaultValue=False,
+            ),
             QgsProcessingParameterBoolean(
                 self.check_merge_geometries,
                 self.tr("Harmonize geometries"),
@@ -331,6 +325,9 @@ class ContributionsCount(QgsProcessingAlgorithm):
             "check_show_metadata": self.parameterAsBool(
                 parameters, self.check_show_metadata, context
             ),
+            "check_incremental": self.parameterAsBool(
+                parameters, self.check_incremental, context
+            ),
             "timeout_input": self.parameterAsInt(
                 parameters, self.timeout_input, context
             ),
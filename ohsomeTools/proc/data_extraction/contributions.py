@@ -26,12 +26,10 @@ from qgis.core import (
     QgsProcessingParameterFileDestination,
 )
 
-from qgis.utils import iface
-
 from ohsomeTools.utils import configmanager
 
-from ohsomeTools.common import EXTRACTION_SPECS, client
-from ..procDialog import run_processing_alg
+from ohsomeTools.common import EXTRACTION_SPECS
+from ..procDialog import run_processing_alg, cached_temporal_extent
 
 
 class Contributions(QgsProcessingAlgorithm):
@@ -149,25 +147,9 @@ class Contributions(QgsProcessingAlgorithm):
         Here we define the inputs and output of the algorithm, along
         with some other properties.
         """
-        try:
-            provider = configmanager.read_config()["providers"][0]
-            clnt = client.Client(provider)
-            metadata = clnt.check_api_metadata(iface)
-
-            start_date_string = (
-                metadata.get("extractRegion")
-                .get("temporalExtent")
-                .get("fromTimestamp")
-            )
-
-            end_date_string = (
-                metadata.get("extractRegion")
-                .get("temporalExtent")
-                .get("toTimestamp")
-            )
-        except:
-            start_date_string = ""
-            end_date_string = ""
+        # Only use cached metadata here, loading the algorithms must not block
+        # on the network. Missing dates are resolved on execution.
+        start_date_string, end_date_string = cached_temporal_extent()
 
         # We add the input vector features source. It can have any kind of
         # geometry.
@@ -222,13 +204,19 @@ class Contributions(QgsProcessingAlgorithm):
 
         self.addParameter(
             QgsProcessingParameterDateTime(
-                self.date_start, "Start Date", defaultValue=start_date_string
+                self.date_start,
+                "Start Date",
+                defaultValue=start_date_string,
+                optional=True,
             )
         )
 
         self.addParameter(
             QgsProcessingParameterDateTime(
-                self.date_end, "End Date", defaultValue=end_date_string
+                self.date_end,
+                "End Date",
+                defaultValue=end_date_string,
+                optional=True,
             )
         )
 
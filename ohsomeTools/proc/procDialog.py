@@ -1,4 +1,6 @@
-from ohsomeTools.common import client
+from PyQt5.QtCore import QDateTime
+
+from ohsomeTools.common import cache, client
 from ohsomeTools.utils import exceptions, logger, configmanager
 from qgis.utils import iface
 from ohsomeTools.gui import ohsome_spec
@@ -6,6 +8,57 @@ from ohsomeTools.gui import ohsome_spec
 from .procRequest import processing_request
 
 
+def cached_temporal_extent():
+    """
+    Returns the temporal extent of the first provider from the metadata cache
+    without touching the network.
+
+    :returns: The start and end timestamp or empty strings if unknown.
+    :rtype: (str, str)
+    """
+    try:
+        provider = configmanager.read_config()["providers"][0]
+        metadata, _ = cache.metadata_cache().get(provider["base_url"])
+        temporal_extent = metadata["extractRegion"]["temporalExtent"]
+        return temporal_extent["fromTimestamp"], temporal_extent["toTimestamp"]
+    except (IndexError, KeyError, TypeError):
+        return "", ""
+
+
+def _metadata_timestamp(timestamp: str) -> QDateTime:
+    date = QDateTime.fromString(timestamp, "yyyy-MM-dd'T'HH:mm:ss'Z'")
+    if not date.isValid():
+        date = QDateTime.fromString(timestamp, "yyyy-MM-dd'T'HH:mm'Z'")
+    return date
+
+
+def resolve_missing_dates(processingParams, metadata):
+    """
+    Fills empty start and end dates with the temporal extent of the provider.
+
+    :param processingParams: The processing parameters.
+    :type processingParams: dict
+
+    :param metadata: The provider /metadata response.
+    :type metadata: dict
+    """
+    try:
+        temporal_extent = metadata["extractRegion"]["temporalExtent"]
+    except (KeyError, TypeError):
+        return
+    for key, timestamp in [
+        ("date_start", "fromTimestamp"),
+        ("date_end", "toTimestamp"),
+    ]:
+        date = processingParams.get(key)
+        if (date is None or not date.isValid()) and temporal_extent.get(
+            timestamp
+        ):
+            processingParams[key] = _metadata_timestamp(
+                temporal_extent.get(timestamp)
+            )
+
+
 def run_processing_alg(processingParams, feedback):
 
     # Clean the debug text
@@ -21,11 +74,15 @@ def run_processing_alg(processingParams, feedback):
     clnt = client.ProcessingClient(provider, feedback=feedback)
 
     metadata_check = clnt.check_api_metadata(iface)
+    if metadata_check:
+        resolve_missing_dates(processingParams, metadata_check)
 
     # get preferences from dialog
     preferences = ohsome_spec.ProcessingOhsomeSpec(
         params=processingParams, feedback=feedback
     )
+    # Building the parameters and the requests are timed together
+    clnt.timings = preferences.timings
 
     try:
         if not metadata_check or not preferences.is_valid(False):
@@ -45,15 +102,14 @@ def run_processing_alg(processingParams, feedback):
             if not len(layer_preferences):
                 return
 
-            for point_layer_preference in layer_preferences:
-
-                processing_request(
-                    clnt,
-                    preferences,
-                    processingParams,
-                    feedback,
-                    point_layer_preference,
-                )
+            # The bcircles batches of the layer are merged into one output
+            processing_request(
+                clnt,
+                preferences,
+                processingParams,
+                feedback,
+                layer_preferences,
+            )
 
         elif geom == 2:
             layer_preferences = (
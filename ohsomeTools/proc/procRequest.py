@@ -1,20 +1,78 @@
 import json
+import os
 from datetime import datetime
 from qgis._core import QgsVectorLayer, QgsProcessingUtils, QgsProject
-from ohsomeTools.common import client, request_core
+from ohsomeTools.common import (
+    client,
+    memory,
+    request_core,
+    telemetry,
+    temporal,
+    tiling,
+)
 from qgis.utils import iface
 
 
 def processing_request(
     clnt, preferences, parameters, feedback, point_layer_preference={}
 ):
+    """
+    Requests the preferences and loads the result, then reports the timings
+    of the run to the feedback.
+    """
+    try:
+        return _processing_request(
+            clnt, preferences, parameters, feedback, point_layer_preference
+        )
+    finally:
+        feedback.pushInfo(
+            telemetry.report(
+                clnt.timings,
+                endpoint=preferences.get_request_url(),
+                provider=clnt.base_url,
+            )
+        )
+
+
+def _processing_request(
+    clnt, preferences, parameters, feedback, point_layer_preference={}
+):
+    file = parameters["output"].replace(".file", ".csv")
+    # Time series are continued after the last timestamp of the output
+    last = None
+    if parameters.get("check_incremental") and len(point_layer_preference):
+        last = temporal.last_timestamp(file)
+    # The features of an extraction are written while they are downloaded
+    feature_output = None
+    if tiling.is_extraction(preferences.get_request_url()):
+        feature_output = memory.FeatureOutput(
+            parameters["output"],
+            keep_geometry_less=parameters["check_keep_geometryless"],
+            combine_single_with_multi_geometries=parameters[
+                "check_merge_geometries"
+            ],
+        )
     try:
         request_time = datetime.now().strftime("%m-%d-%Y:%H-%M-%S")
         if len(point_layer_preference):
-            result = clnt.request(
-                f"/{preferences.get_request_url()}",
-                {},
-                post_json=point_layer_preference,
+            if last:
+                point_layer_preference = temporal.incremental_preferences(
+                    point_layer_preference, last
+                )
+                if point_layer_preference is None:
+                    feedback.pushInfo(f"{file} is up to date.")
+                    request_core.create_ohsome_csv_layer(
+                        iface, [], [], file, request_time, append=True
+                    )
+                    return True
+            # Batches of a point layer are merged into one output
+            result = request_core.fetch_result(
+                clnt,
+                preferences.get_request_url(),
+                point_layer_preference,
+                canceled=feedback.isCanceled,
+                progress=feedback.setProgress,
+                feature_output=feature_output,
             )
         else:
             result = clnt.request(f"/metadata", {})
@@ -22,8 +80,12 @@ def processing_request(
         result = None
 
     if not result or not len(result):
+        if feature_output is not None:
+            feature_output.discard()
         return False
-    file = parameters["output"].replace(".file", ".csv")
+    # Appended time series are always written to the existing file
+    in_memory = not last and memory.use_memory_output(file, result)
+    name = os.path.splitext(os.path.basename(file))[0]
     if "extractRegion" in result:
         vlayer: QgsVectorLayer = QgsVectorLayer(
             json.dumps(result.get("extractRegion").get("spatialExtent")),
@@ -34,33 +96,35 @@ def processing_request(
         if vlayer:
             return True
     elif (
-        all(i in result.keys() for i in ["type", "features"])
-        and result.get("type").lower() == "featurecollection"
+        feature_output is not None
+        and (result.get("type") or "").lower() == "featurecollection"
     ):
-        # Process GeoJSON
-        geojsons: [] = request_core.split_geojson_by_geometry(
-            result,
-            keep_geometry_less=parameters["check_keep_geometryless"],
-            combine_single_with_multi_geometries=parameters[
-                "check_merge_geometries"
-            ],
+        # The features were written while they were downloaded
+        request_core.load_feature_output(
+            iface, feature_output, result, timings=clnt.timings
         )
-        for i in range(len(geojsons)):
-            vlayer = request_core.create_ohsome_vector_layer(
-                iface, geojsons[i], request_time, file
-            )
-            request_core.postprocess_metadata(geojsons[i], vlayer)
         return True
     elif "result" in result.keys() and len(result.get("result")) > 0:
         # Process flat tables
         header = result["result"][0].keys()
-        vlayer = request_core.create_ohsome_csv_layer(
-            iface,
-            result["result"],
-            header,
-            file,
-            request_time,
-        )
+        rows = result["result"]
+        if last:
+            rows = temporal.newer_rows(rows, last)
+            feedback.pushInfo(f"Appending {len(rows)} newer rows to {file}.")
+        if in_memory:
+            vlayer = request_core.create_ohsome_memory_table(
+                iface, rows, header, name, timings=clnt.timings
+            )
+        else:
+            vlayer = request_core.create_ohsome_csv_layer(
+                iface,
+                rows,
+                header,
+                file,
+                request_time,
+                append=bool(last),
+                timings=clnt.timings,
+            )
         request_core.postprocess_metadata(result, vlayer)
         return True
     elif (
@@ -68,28 +132,47 @@ def processing_request(
         and len(result.get("groupByResult")) > 0
     ):
         # Process non-flat tables
-        results = result["groupByResult"]
-        for result_group in results:
-            header = results[0]["result"][0].keys()
+        rows, header = request_core.group_by_rows(result["groupByResult"])
+        if last:
+            rows = temporal.newer_rows(rows, last)
+            feedback.pushInfo(f"Appending {len(rows)} newer rows to {file}.")
+        if in_memory:
+            vlayer = request_core.create_ohsome_memory_table(
+                iface, rows, header, name, timings=clnt.timings
+            )
+        else:
             vlayer = request_core.create_ohsome_csv_layer(
                 iface,
-                result_group["result"],
+                rows,
                 header,
                 file,
                 request_time,
+                append=bool(last),
+                timings=clnt.timings,
             )
-            request_core.postprocess_metadata(result, vlayer)
+        request_core.postprocess_metadata(result, vlayer)
         return True
     elif "ratioResult" in result.keys() and len(result.get("ratioResult")) > 0:
         # Process flat tables
         header = result.get("ratioResult")[0].keys()
-        vlayer = request_core.create_ohsome_csv_layer(
-            iface,
-            result["ratioResult"],
-            header,
-            file,
-            request_time,
-        )
+        rows = result["ratioResult"]
+        if last:
+            rows = temporal.newer_rows(rows, last)
+            feedback.pushInfo(f"Appending {len(rows)} newer rows to {file}.")
+        if in_memory:
+            vlayer = request_core.create_ohsome_memory_table(
+                iface, rows, header, name, timings=clnt.timings
+            )
+        else:
+            vlayer = request_core.create_ohsome_csv_layer(
+                iface,
+                rows,
+                header,
+                file,
+                request_time,
+                append=bool(last),
+                timings=clnt.timings,
+            )
         request_core.postprocess_metadata(result, vlayer)
         return True
     feedback.reportError("Request Error")
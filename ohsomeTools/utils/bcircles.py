@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Encodes points as ohsome API bcircles parameter.
+"""
+
+import math
+
+# Decimal places of WGS84 coordinates, about 0.1 m at the equator
+DEFAULT_PRECISION = 6
+
+
+def format_coordinate(value: float, precision: int = None) -> str:
+    """
+    Formats a coordinate, rounded to precision decimal places without
+    trailing zeros.
+
+    :param value: The coordinate.
+    :type value: float
+
+    :param precision: Decimal places, None keeps all of them.
+    :type precision: int
+
+    :rtype: str
+    """
+    if precision is None:
+        return f"{value}"
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def format_circle(
+    circle_id: str, x: float, y: float, radius, precision: int = None
+) -> str:
+    """
+    Formats a circle of a bcircles parameter.
+
+    :param circle_id: The id of the circle.
+    :type circle_id: str
+
+    :param radius: Radius of the circle in meters.
+    :type radius: int
+
+    :param precision: Decimal places of the coordinates.
+    :type precision: int
+
+    :rtype: str
+    """
+    return (
+        f"{circle_id}:{format_coordinate(x, precision)},"
+        f"{format_coordinate(y, precision)},{radius}"
+    )
+
+
+class BcirclesEncoder:
+    """
+    Collects circles and joins them into a bcircles parameter once, so
+    building it is linear in the number of circles.
+
+    Usage
+    -----
+    ::
+        encoder = BcirclesEncoder(radius=100)
+        for x, y in points:
+            encoder.add(x, y)
+        bcircles = encoder.encode()
+    """
+
+    def __init__(self, radius, precision: int = DEFAULT_PRECISION):
+        """
+        :param radius: Default radius of the circles in meters.
+        :type radius: int
+
+        :param precision: Decimal places of the coordinates, None keeps all
+            of them.
+        :type precision: int
+        """
+        self.radius = radius
+        self.precision = precision
+        self.byte_size = 0
+        self._circles = []
+
+    def __len__(self) -> int:
+        return len(self._circles)
+
+    def add(self, x: float, y: float, circle_id=None, radius=None) -> str:
+        """
+        Adds a circle.
+
+        :param circle_id: The id of the circle, defaults to id<index>.
+        :type circle_id: str
+
+        :param radius: Radius of this circle, defaults to the encoder radius.
+        :type radius: int
+
+        :returns: The encoded circle.
+        :rtype: str
+        """
+        if circle_id is None:
+            circle_id = f"id{len(self._circles)}"
+        return self.append(
+            format_circle(
+                circle_id,
+                x,
+                y,
+                self.radius if radius is None else radius,
+                self.precision,
+            )
+        )
+
+    def append(self, circle: str) -> str:
+        """
+        Adds an encoded circle.
+
+        :param circle: The circle as returned by format_circle.
+        :type circle: str
+
+        :returns: The encoded circle.
+        :rtype: str
+        """
+        self._circles.append(circle)
+        # Including the separator
+        self.byte_size += len(circle) + (len(self._circles) > 1)
+        return circle
+
+    def encode(self) -> str:
+        """
+        :returns: The bcircles parameter of all added circles.
+        :rtype: str
+        """
+        return "|".join(self._circles)
+
+
+def circle_area(radius: float) -> float:
+    """
+    :param radius: Radius of the circle in meters.
+    :type radius: float
+
+    :returns: The area of the circle in square kilometers.
+    :rtype: float
+    """
+    return math.pi * (float(radius) / 1000) ** 2
+
+
+class BcirclesBatcher:
+    """
+    Distributes circles over several bcircles parameters, so that none of
+    them exceeds max_bytes or covers more than max_area square kilometers.
+    The covered area estimates the cost of a request on the server, which
+    has to process every element within it.
+
+    Usage
+    -----
+    ::
+        batcher = BcirclesBatcher(radius=100, max_bytes=262144)
+        for x, y in points:
+            batcher.add(x, y)
+        bcircles_parameters = batcher.encode()
+    """
+
+    def __init__(
+        self,
+        radius,
+        precision: int = DEFAULT_PRECISION,
+        max_bytes: int = None,
+        max_area: float = None,
+    ):
+        """
+        :param radius: Default radius of the circles in meters.
+        :type radius: int
+
+        :param precision: Decimal places of the coordinates.
+        :type precision: int
+
+        :param max_bytes: Size limit of a bcircles parameter, None for none.
+        :type max_bytes: int
+
+        :param max_area: Limit of the area of the circles of a bcircles
+            parameter in square kilometers, None for none.
+        :type max_area: float
+        """
+        self.radius = radius
+        self.precision = precision
+        self.max_bytes = max_bytes
+        self.max_area = max_area
+        self._batches = []
+        self._area = 0.0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, x: float, y: float, circle_id=None, radius=None):
+        """
+        Adds a circle to the current batch or starts a new batch if the
+        circle would exceed its limits. A batch takes at least one circle.
+
+        :param circle_id: The id of the circle, defaults to id<index> of all
+            added circles, so ids are unique across the batches.
+        :type circle_id: str
+
+        :param radius: Radius of this circle, defaults to the batcher radius.
+        :type radius: int
+        """
+        if circle_id is None:
+            circle_id = f"id{self._count}"
+        if radius is None:
+            radius = self.radius
+        circle = format_circle(circle_id, x, y, radius, self.precision)
+        area = circle_area(radius)
+        batch = self._batches[-1] if len(self._batches) else None
+        if (
+            batch is None
+            or self.max_area is not None
+            and len(batch)
+            and self._area + area > self.max_area
+            or self.max_bytes is not None
+            and len(batch)
+            # Including the separator
+            and batch.byte_size + 1 + len(circle) > self.max_bytes
+        ):
+            batch = BcirclesEncoder(self.radius, self.precision)
+            self._batches.append(batch)
+            self._area = 0.0
+        batch.append(circle)
+        self._area += area
+        self._count += 1
+
+    def encode(self) -> [str]:
+        """
+        :returns: One bcircles parameter per batch.
+        :rtype: list
+        """
+        return [batch.encode() for batch in self._batches if len(batch)]
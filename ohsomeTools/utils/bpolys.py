@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ohsomeTools
+                                 A QGIS plugin
+ QGIS client to query the ohsome API
+                              -------------------
+        begin                : 2021-05-01
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Julian Psotta
+        email                : julian.psotta@heigit.org
+ ***************************************************************************/
+
+ This plugin provides access to the ohsome API (https://api.ohsome.org),
+ developed and maintained by the Heidelberg Institute for Geoinformation
+ Technology, HeiGIT gGmbH, Heidelberg, Germany.
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+"""
+Reduces the size of bpolys parameters before they are sent.
+"""
+
+import json
+
+from osgeo import ogr
+
+# Length of a degree of latitude in meters
+METERS_PER_DEGREE = 111320
+
+
+def quantize_ring(ring: list, precision: int):
+    """
+    Rounds the coordinates of a linear ring and removes consecutive
+    duplicate vertices.
+
+    :param ring: The positions of the closed ring.
+    :type ring: list
+
+    :param precision: Decimal places of the coordinates.
+    :type precision: int
+
+    :returns: The reduced ring or None if it collapsed to less than
+        four positions.
+    :rtype: list or None
+    """
+    reduced = []
+    for position in ring:
+        position = [round(value, precision) for value in position[:2]]
+        if not len(reduced) or position != reduced[-1]:
+            reduced.append(position)
+    if len(reduced) < 4 or reduced[0] != reduced[-1]:
+        return None
+    return reduced
+
+
+def _quantize_polygon(rings: list, precision: int):
+    exterior = quantize_ring(rings[0], precision) if len(rings) else None
+    if exterior is None:
+        return None
+    # Collapsed holes are dropped
+    holes = [quantize_ring(ring, precision) for ring in rings[1:]]
+    return [exterior] + [hole for hole in holes if hole is not None]
+
+
+def quantize_geometry(geometry: dict, precision: int):
+    """
+    Rounds the coordinates of a GeoJSON (Multi)Polygon and removes the
+    duplicate vertices and collapsed rings this creates.
+
+    :param geometry: The GeoJSON geometry.
+    :type geometry: dict
+
+    :param precision: Decimal places of the coordinates.
+    :type precision: int
+
+    :returns: The reduced geometry, the unchanged geometry if it is no
+        (Multi)Polygon, or None if it collapsed completely.
+    :rtype: dict or None
+    """
+    if geometry["type"] == "Polygon":
+        rings = _quantize_polygon(geometry["coordinates"], precision)
+        return (
+            None if rings is None else {"type": "Polygon", "coordinates": rings}
+        )
+    if geometry["type"] == "MultiPolygon":
+        polygons = [
+            _quantize_polygon(polygon, precision)
+            for polygon in geometry["coordinates"]
+        ]
+        polygons = [polygon for polygon in polygons if polygon is not None]
+        if not len(polygons):
+            return None
+        return {"type": "MultiPolygon", "coordinates": polygons}
+    return geometry
+
+
+def _reduce_geometry(geometry: dict, tolerance: float, precision: int):
+    original = ogr.CreateGeometryFromJson(json.dumps(geometry))
+    if original is None or original.IsEmpty():
+        return geometry
+    reduced = original
+    if tolerance:
+        simplified = original.SimplifyPreserveTopology(
+            tolerance / METERS_PER_DEGREE
+        )
+        if simplified is not None and not simplified.IsEmpty():
+            reduced = simplified
+    reduced_json = json.loads(reduced.ExportToJson())
+    if precision is not None:
+        quantized = quantize_geometry(reduced_json, precision)
+        if quantized is not None:
+            # Rounding may let edges cross, keep full precision then
+            quantized_geometry = ogr.CreateGeometryFromJson(
+                json.dumps(quantized)
+            )
+            if quantized_geometry is not None and quantized_geometry.IsValid():
+                return quantized
+    return reduced_json
+
+
+def share_borders(geometries: [dict]) -> bool:
+    """
+    Whether any two of the geometries touch or overlap.
+
+    :param geometries: The GeoJSON geometries.
+    :type geometries: list
+
+    :rtype: bool
+    """
+    geometries = [
+        ogr.CreateGeometryFromJson(json.dumps(geometry))
+        for geometry in geometries
+    ]
+    geometries = [
+        geometry
+        for geometry in geometries
+        if geometry is not None and not geometry.IsEmpty()
+    ]
+    # Sweep along x, only geometries with overlapping envelopes may touch
+    envelopes = sorted(
+        (geometry.GetEnvelope(), i) for i, geometry in enumerate(geometries)
+    )
+    for k, (envelope, i) in enumerate(envelopes):
+        for other_envelope, j in envelopes[k + 1 :]:
+            if other_envelope[0] > envelope[1]:
+                break
+            if (
+                other_envelope[2] <= envelope[3]
+                and other_envelope[3] >= envelope[2]
+                and geometries[i].Intersects(geometries[j])
+            ):
+                return True
+    return False
+
+
+def reduce_bpolys(
+    bpolys: str, tolerance: float = 0, precision: int = None
+) -> str:
+    """
+    Shrinks a bpolys FeatureCollection in WGS84. The geometries are
+    simplified without creating self-intersections, their coordinates are
+    rounded and duplicate vertices are removed. Ids and properties of the
+    features are kept, so groupBy/boundary results stay assigned to them.
+
+    Polygons that share borders are not simplified, as simplifying each of
+    them on its own would open gaps and overlaps along the shared borders.
+
+    :param bpolys: The GeoJSON FeatureCollection.
+    :type bpolys: str
+
+    :param tolerance: Simplification tolerance in meters, 0 to not
+        simplify.
+    :type tolerance: float
+
+    :param precision: Decimal places of the coordinates, None to not round
+        them.
+    :type precision: int
+
+    :returns: The reduced FeatureCollection without insignificant
+        whitespace.
+    :rtype: str
+    """
+    feature_collection = json.loads(bpolys)
+    features = [
+        feature
+        for feature in feature_collection.get("features", [])
+        if feature.get("geometry")
+    ]
+    if tolerance and share_borders(
+        [feature["geometry"] for feature in features]
+    ):
+        tolerance = 0
+    for feature in features:
+        feature["geometry"] = _reduce_geometry(
+            feature["geometry"], tolerance, precision
+        )
+    return json.dumps(feature_collection, separators=(",", ":"))
@@ -11,7 +11,74 @@ def check_list_duplicates(list_widget: QListWidget, item_name: str) -> bool:
     return False
 
 
-from ohsomeTools.utils import transform
+from ohsomeTools.utils import bcircles, bpolys, configmanager, transform
+
+DEFAULT_BCIRCLES_BATCH_SETTINGS = {
+    "enabled": True,
+    "max_area_km2": 5000,
+    "max_bytes": 262144,
+}
+
+
+def bcircles_batch_limits() -> dict:
+    """
+    Reads the limits of a bcircles request from runtime.bcircles_batches.
+
+    :returns: The max_bytes, max_area and precision keyword arguments of
+        convert_point_features_to_ohsome_bcircles, empty if batching is
+        disabled.
+    :rtype: dict
+    """
+    settings = DEFAULT_BCIRCLES_BATCH_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config()
+        .get("runtime", {})
+        .get("bcircles_batches", {})
+        or {}
+    )
+    if not settings["enabled"]:
+        return {}
+    return {
+        "max_bytes": settings["max_bytes"],
+        "max_area": settings["max_area_km2"],
+        "precision": bcircles.DEFAULT_PRECISION,
+    }
+
+
+DEFAULT_BPOLYS_REDUCTION_SETTINGS = {
+    "enabled": False,
+    "precision": 5,
+    "tolerance_m": 10,
+}
+
+
+def reduce_bpolys(bpolys_parameter: str) -> (str, int):
+    """
+    Simplifies and quantises a bpolys parameter as configured in
+    runtime.bpolys_reduction.
+
+    :param bpolys_parameter: The GeoJSON FeatureCollection.
+    :type bpolys_parameter: str
+
+    :returns: The reduced parameter and the number of bytes saved, the
+        unchanged parameter and 0 if the reduction is disabled.
+    :rtype: (str, int)
+    """
+    settings = DEFAULT_BPOLYS_REDUCTION_SETTINGS.copy()
+    settings.update(
+        configmanager.read_config()
+        .get("runtime", {})
+        .get("bpolys_reduction", {})
+        or {}
+    )
+    if not settings["enabled"] or not bpolys_parameter:
+        return bpolys_parameter, 0
+    reduced = bpolys.reduce_bpolys(
+        bpolys_parameter,
+        tolerance=float(settings["tolerance_m"] or 0),
+        precision=settings["precision"],
+    )
+    return reduced, len(bpolys_parameter.encode()) - len(reduced.encode())
 
 
 def _get_layer_polygons(layer):
@@ -44,22 +111,62 @@ def _get_layer_polygons(layer):
 
 
 def convert_point_features_to_ohsome_bcircles(
-    features: [QgsFeature], radius: [int]
+    features: [QgsFeature],
+    radius: [int],
+    precision: int = None,
+    max_bytes: int = None,
+    max_area: float = None,
 ):
+    """
+    Encodes the point features of every feature iterator as bcircles
+    parameters. A layer that fits into one parameter keeps the circles
+    named id0, id1, ... in feature order with all decimal places. Layers
+    split into batches name their circles id<feature id> instead, so the
+    results of all batches stay assigned to the original features.
+
+    :param features: One iterator of features per layer.
+    :type features: list
+
+    :param radius: Radius of the circles in meters.
+    :type radius: int
+
+    :param precision: Decimal places of the coordinates of split layers,
+        None keeps all of them.
+    :type precision: int
+
+    :param max_bytes: Size limit of a bcircles parameter. Larger layers are
+        split into several batches.
+    :type max_bytes: int
+
+    :param max_area: Limit of the area of the circles of a bcircles
+        parameter in square kilometers.
+    :type max_area: float
+
+    :returns: The bcircles parameters of every layer with points, one per
+        batch.
+    :rtype: list
+    """
     coordinates_list = []
-    for i in range(len(features)):
-        coordinates = None
-        counter = 0
-        for feature in features[i]:
+    for layer_features in features:
+        points = []
+        for feature in layer_features:
             geometry: QgsGeometry = feature.geometry()
             if geometry.type() == QgsWkbTypes.PointGeometry:
-                point: QgsPointXY = feature.geometry().asPoint()
-                coordinates = (
-                    f"{coordinates}|id{counter}:{point.x()},{point.y()},{radius}"
-                    if coordinates
-                    else f"id{counter}:{point.x()},{point.y()},{radius}"
-                )
-                counter += 1
-        if coordinates:
-            coordinates_list.append(coordinates)
+                point: QgsPointXY = geometry.asPoint()
+                points.append((point.x(), point.y(), feature.id()))
+        if not len(points):
+            continue
+        batcher = bcircles.BcirclesBatcher(
+            radius, precision, max_bytes, max_area
+        )
+        for x, y, feature_id in points:
+            batcher.add(x, y, f"id{feature_id}")
+        batches = batcher.encode()
+        if len(batches) == 1:
+            # Not split, encoded as without limits
+            encoder = bcircles.BcirclesEncoder(radius, precision=None)
+            for x, y, _ in points:
+                encoder.add(x, y)
+            batches = [encoder.encode()]
+        coordinates_list.extend(batches)
     return coordinates_list
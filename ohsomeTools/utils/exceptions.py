@@ -113,6 +113,18 @@ class ServiceUnavailable(OhsomeBaseException):
     pass
 
 
+class TooManyRequests(OhsomeBaseException):
+    """Signifies that the request failed because the client exceeded the rate limit of the provider."""
+
+    pass
+
+
+class Canceled(OhsomeBaseException):
+    """The request was canceled while it waited to be sent."""
+
+    pass
+
+
 class Timeout(OhsomeBaseException):
     """The request timed out."""
 
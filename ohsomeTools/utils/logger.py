@@ -24,8 +24,6 @@
  ***************************************************************************/
 """
 
-from qgis.core import QgsMessageLog, Qgis
-
 from ohsomeTools import PLUGIN_NAME
 
 
@@ -40,6 +38,9 @@ def log(message, level_in=0, tag=PLUGIN_NAME):
     :type level_in: int
     @param tag: if relevant give tag name.
     """
+    # Imported on use, so modules that log can be imported without QGIS
+    from qgis.core import QgsMessageLog, Qgis
+
     if level_in == 0:
         level = Qgis.Info
     elif level_in == 1:
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the bcircles encoding against the former string
+concatenation. Runs without QGIS from the repository root:
+
+    python scripts/benchmark_bcircles.py
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ohsomeTools.utils.bcircles import BcirclesEncoder  # noqa: E402
+
+
+def concatenate(points, radius):
+    """The former quadratic implementation."""
+    coordinates = None
+    for counter, (x, y) in enumerate(points):
+        coordinates = (
+            f"{coordinates}|id{counter}:{x},{y},{radius}"
+            if coordinates
+            else f"id{counter}:{x},{y},{radius}"
+        )
+    return coordinates
+
+
+def encode(points, radius, precision):
+    encoder = BcirclesEncoder(radius, precision)
+    for x, y in points:
+        encoder.add(x, y)
+    return encoder.encode()
+
+
+def main():
+    random.seed(0)
+    for size in [10000, 100000]:
+        points = [
+            (random.uniform(-180, 180), random.uniform(-90, 90))
+            for _ in range(size)
+        ]
+        print(f"{size} points")
+        for name, function in [
+            ("concatenation", lambda: concatenate(points, 100)),
+            ("encoder", lambda: encode(points, 100, None)),
+            ("encoder, 6 decimals", lambda: encode(points, 100, 6)),
+        ]:
+            seconds = min(timeit.repeat(function, number=1, repeat=3))
+            print(
+                f"  {name:<20} {seconds * 1000:8.1f} ms "
+                f"{len(function()) / 1024:8.0f} KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
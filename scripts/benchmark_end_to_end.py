@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark against the local mock ohsome API of
+scripts/mock_ohsome_api.py, which it starts itself. Drives the client, the
+request building of the processing spec, the post-processing of
+request_core and the processing algorithms, and reports the latency,
+throughput and peak Python memory of every scenario. Needs the QGIS Python
+libraries and runs offscreen from the repository root:
+
+    python scripts/benchmark_end_to_end.py --elements 100000 --latency 0.05
+
+The response cache is disabled, so every run reaches the mock API. The
+processing algorithms use the provider of config.yml with the base URL of
+the mock API, by default the local example provider on port 8080, and are
+skipped if there is none.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qgis.core import (  # noqa: E402
+    QgsApplication,
+    QgsFeature,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProcessingFeedback,
+    QgsProject,
+    QgsRectangle,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QDateTime  # noqa: E402
+
+from ohsomeTools.common import (  # noqa: E402
+    cache,
+    client,
+    request_core,
+    writer,
+)
+from ohsomeTools.gui import ohsome_spec  # noqa: E402
+from ohsomeTools.utils import configmanager  # noqa: E402
+
+MOCK_API = os.path.join(os.path.dirname(__file__), "mock_ohsome_api.py")
+# Same as the default extent of the mock API
+EXTENT = (8.6, 49.35, 8.75, 49.45)
+FILTER = "building=* or (type:way and highway=residential)"
+# Seconds to wait for the mock API to come up
+STARTUP_TIMEOUT = 30
+
+
+def start_mock_api(args) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            MOCK_API,
+            "--port",
+            str(args.port),
+            "--elements",
+            str(args.elements),
+            "--latency",
+            str(args.latency),
+            "--bandwidth",
+            str(args.bandwidth),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            mock_stats(args.url, reset=True)
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("The mock ohsome API did not start.")
+            time.sleep(0.1)
+
+
+def mock_stats(url: str, reset: bool = False) -> dict:
+    query = "?reset=true" if reset else ""
+    with urllib.request.urlopen(f"{url}/mock/stats{query}") as response:
+        return json.loads(response.read())
+
+
+def configured_provider(url: str):
+    """The index and settings of the provider of config.yml with url."""
+    providers = configmanager.read_config()["providers"]
+    for index, provider in enumerate(providers):
+        if provider["base_url"].rstrip("/") == url:
+            return index, provider
+    return None, None
+
+
+def polygon_layer(grid: int) -> QgsVectorLayer:
+    """A grid of squares over the extent."""
+    layer = QgsVectorLayer(
+        "Polygon?crs=EPSG:4326&field=id:integer", "benchmark_polygons", "memory"
+    )
+    width = (EXTENT[2] - EXTENT[0]) / grid
+    height = (EXTENT[3] - EXTENT[1]) / grid
+    features = []
+    for i, j in itertools.product(range(grid), range(grid)):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([i * grid + j])
+        feature.setGeometry(
+            QgsGeometry.fromRect(
+                QgsRectangle(
+                    EXTENT[0] + i * width,
+                    EXTENT[1] + j * height,
+                    EXTENT[0] + (i + 1) * width,
+                    EXTENT[1] + (j + 1) * height,
+                )
+            )
+        )
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def point_layer(count: int) -> QgsVectorLayer:
+    layer = QgsVectorLayer(
+        "Point?crs=EPSG:4326&field=id:integer", "benchmark_points", "memory"
+    )
+    features = []
+    for i in range(count):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([i])
+        feature.setGeometry(
+            QgsGeometry.fromPointXY(
+                QgsPointXY(
+                    random.uniform(EXTENT[0], EXTENT[2]),
+                    random.uniform(EXTENT[1], EXTENT[3]),
+                )
+            )
+        )
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def spec_params(provider_index, layer, api_spec, preference, specification):
+    """The parameters the processing algorithms pass to the spec."""
+    return {
+        "provider": provider_index,
+        "geom": 2 if layer.name() == "benchmark_polygons" else 1,
+        "selection": api_spec,
+        "preference": preference,
+        "preference_specification": specification,
+        "filter": FILTER,
+        "filter_2": "",
+        "LAYER": layer,
+        "RADIUS": 500,
+        "date_start": QDateTime.fromString("2010-01-01", "yyyy-MM-dd"),
+        "date_end": QDateTime.fromString("2020-01-01", "yyyy-MM-dd"),
+        "period": "/P1M",
+        "timeout_input": 0,
+        "data_aggregation_format": "json",
+        "check_show_metadata": False,
+        "check_incremental": False,
+        "check_clip_geometry": True,
+        "check_activate_temporal": False,
+        "group_by_values_line_edit": "",
+        "group_by_key_line_edit": "",
+        "property_groups_check_tags": True,
+        "property_groups_check_metadata": False,
+        "check_keep_geometryless": False,
+        "check_merge_geometries": True,
+    }
+
+
+def _percentile(values: [float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def measure(name: str, unit: str, scenario, args):
+    """
+    Runs a scenario repeat times for the latency and throughput and once
+    more under tracemalloc for the peak memory.
+
+    :param scenario: Runs the scenario and returns the number of units it
+        processed.
+    :type scenario: callable
+    """
+    scenario()
+    mock_stats(args.url, reset=True)
+    seconds = []
+    units = 0
+    for _ in range(args.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        units += scenario()
+        seconds.append(time.perf_counter() - start)
+    stats = mock_stats(args.url, reset=True)
+    gc.collect()
+    tracemalloc.start()
+    scenario()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    total = sum(seconds)
+    print(
+        f"{name:<34} {_percentile(seconds, 50) * 1000:8.0f} "
+        f"{_percentile(seconds, 95) * 1000:8.0f} "
+        f"{max(seconds) * 1000:8.0f} "
+        f"{stats['requests'] / total:8.1f} "
+        f"{stats['bytes'] / total / 1024 ** 2:8.2f} "
+        f"{units / total:10.0f} {unit:<9}"
+        f"{peak / 1024 ** 2:8.1f}",
+        flush=True,
+    )
+
+
+def client_scenarios(clnt, bpolys: str, args, directory: str) -> [tuple]:
+    def metadata():
+        clnt.request("/metadata", {})
+        return 1
+
+    def count():
+        result = clnt.request(
+            "/elements/count",
+            {},
+            post_json={
+                "bpolys": bpolys,
+                "filter": FILTER,
+                "time": "2010-01-01/2020-01-01/P1M",
+            },
+        )
+        return len(result["result"])
+
+    def count_async(identical: bool):
+        futures = [
+            clnt.request_async(
+                "/elements/count",
+                {},
+                post_json={
+                    "bpolys": bpolys,
+                    # Identical requests in flight are sent once
+                    "filter": FILTER if identical else f"{FILTER} or id:{k}",
+                    "time": "2010-01-01/2020-01-01/P1M",
+                },
+            )
+            for k in range(args.concurrency)
+        ]
+        client.wait_all(futures)
+        for future in futures:
+            future.result()
+        return len(futures)
+
+    def group_by_boundary():
+        result = clnt.request(
+            "/elements/count/groupBy/boundary",
+            {},
+            post_json={
+                "bpolys": bpolys,
+                "filter": FILTER,
+                "time": "2010-01-01/2020-01-01/P1M",
+            },
+        )
+        return len(request_core.group_by_rows(result["groupByResult"])[0])
+
+    def extraction():
+        features = []
+        clnt.request(
+            "/elements/geometry",
+            {},
+            post_json={
+                "bpolys": bpolys,
+                "filter": FILTER,
+                "time": "2020-01-01",
+            },
+            feature_sink=features.append,
+        )
+        return len(features)
+
+    runs = itertools.count()
+
+    def full_history():
+        # The windows are stitched in the written output
+        feature_writer = writer.FeatureWriter(
+            os.path.join(directory, f"full_history_{next(runs)}.gpkg")
+        )
+        request_core.fetch_result(
+            clnt,
+            "elementsFullHistory/geometry",
+            {
+                "bpolys": bpolys,
+                "filter": FILTER,
+                "time": "2010-01-01,2020-01-01",
+                "properties": "tags",
+            },
+            feature_output=feature_writer,
+        )
+        feature_writer.close()
+        return feature_writer.feature_count
+
+    return [
+        ("client metadata", "requests", metadata),
+        ("client elements/count", "rows", count),
+        (
+            f"client {args.concurrency} async elements/count",
+            "requests",
+            lambda: count_async(identical=False),
+        ),
+        (
+            f"client {args.concurrency} identical async",
+            "requests",
+            lambda: count_async(identical=True),
+        ),
+        ("client groupBy/boundary", "rows", group_by_boundary),
+        ("client elements/geometry streamed", "features", extraction),
+        ("fetch_result elementsFullHistory", "features", full_history),
+    ]
+
+
+def spec_scenarios(provider_index, polygons, points) -> [tuple]:
+    feedback = QgsProcessingFeedback()
+
+    def spec(layer, api_spec, preference, specification):
+        return ohsome_spec.ProcessingOhsomeSpec(
+            params=spec_params(
+                provider_index, layer, api_spec, preference, specification
+            ),
+            feedback=feedback,
+        )
+
+    def bpolys():
+        return len(
+            spec(
+                polygons, "data-Aggregation", "elements/count", ""
+            ).get_polygon_layer_request_preferences()
+        )
+
+    def bcircles():
+        # Extractions split the circles into batches
+        batches = spec(
+            points, "data-Extraction", "elements", "geometry"
+        ).get_point_layer_request_preferences()
+        return sum(len(batch["bcircles"].split("|")) for batch in batches)
+
+    return [
+        ("spec bpolys", "batches", bpolys),
+        ("spec bcircles", "circles", bcircles),
+    ]
+
+
+def postprocess_scenarios(clnt, bpolys: str, directory: str) -> [tuple]:
+    # Fetched once, so only the post-processing is measured
+    extraction = clnt.request(
+        "/elements/geometry",
+        {},
+        post_json={"bpolys": bpolys, "filter": FILTER, "time": "2020-01-01"},
+    )
+    group_by = clnt.request(
+        "/elements/count/groupBy/boundary",
+        {},
+        post_json={
+            "bpolys": bpolys,
+            "filter": FILTER,
+            "time": "2010-01-01/2020-01-01/P1M",
+        },
+    )
+    runs = itertools.count()
+
+    def copy(result: dict) -> dict:
+        # The features are removed while they are written
+        return {**result, "features": list(result["features"])}
+
+    def vector_layers():
+        request_core.create_ohsome_vector_layers(
+            None,
+            copy(extraction),
+            os.path.join(directory, f"extraction_{next(runs)}.gpkg"),
+            combine_single_with_multi_geometries=True,
+            add_to_project=False,
+        )
+        return len(extraction["features"])
+
+    def memory_layers():
+        request_core.create_ohsome_memory_layers(
+            None,
+            copy(extraction),
+            "extraction",
+            combine_single_with_multi_geometries=True,
+            add_to_project=False,
+        )
+        return len(extraction["features"])
+
+    def csv_table():
+        rows, header = request_core.group_by_rows(group_by["groupByResult"])
+        request_core.create_ohsome_csv_layer(
+            None,
+            rows,
+            header,
+            os.path.join(directory, f"group_by_{next(runs)}.csv"),
+            "",
+            add_to_project=False,
+        )
+        return len(rows)
+
+    return [
+        ("request_core vector layers", "features", vector_layers),
+        ("request_core memory layers", "features", memory_layers),
+        ("request_core groupBy CSV", "rows", csv_table),
+    ]
+
+
+def processing_scenarios(provider_index, polygons, points, directory):
+    import processing
+    from ohsomeTools.proc.data_aggregation.elements_aggregation import (
+        ElementsAggregation,
+    )
+    from ohsomeTools.proc.data_extraction.elements import Elements
+
+    runs = itertools.count()
+    inputs = {polygons.id(), points.id()}
+    common = {
+        "PROVIDER": provider_index,
+        "date_start": QDateTime.fromString("2010-01-01", "yyyy-MM-dd"),
+        "date_end": QDateTime.fromString("2020-01-01", "yyyy-MM-dd"),
+        "FILTER": FILTER,
+        "check_activate_temporal": False,
+    }
+
+    def run(algorithm: str, parameters: dict):
+        processing.run(
+            f"ohsomeTools:{algorithm}",
+            {**common, **parameters},
+            feedback=QgsProcessingFeedback(),
+        )
+        # Keep the project from growing over the runs
+        QgsProject.instance().removeMapLayers(
+            [
+                layer_id
+                for layer_id in QgsProject.instance().mapLayers()
+                if layer_id not in inputs
+            ]
+        )
+        return 1
+
+    def aggregation_polygons():
+        return run(
+            "elementsaggregation",
+            {
+                "LAYER": polygons,
+                "PARAMETER": ElementsAggregation.parameters.index("count"),
+                "GROUPBY": ElementsAggregation.group_by_list.index("Boundary"),
+                "OUTPUT": os.path.join(
+                    directory, f"aggregation_{next(runs)}.csv"
+                ),
+            },
+        )
+
+    def aggregation_points():
+        return run(
+            "elementsaggregation",
+            {
+                "LAYER": points,
+                "PARAMETER": ElementsAggregation.parameters.index("count"),
+                "OUTPUT": os.path.join(
+                    directory, f"aggregation_{next(runs)}.csv"
+                ),
+            },
+        )
+
+    def extraction():
+        return run(
+            "elements",
+            {
+                "LAYER": polygons,
+                "extraction_type": Elements.endpoints.index("elements"),
+                "PARAMETER": Elements.parameters.index("geometry"),
+                "date_start": QDateTime.fromString("2020-01-01", "yyyy-MM-dd"),
+                "OUTPUT": os.path.join(
+                    directory, f"extraction_{next(runs)}.gpkg"
+                ),
+            },
+        )
+
+    def full_history():
+        return run(
+            "elements",
+            {
+                "LAYER": polygons,
+                "extraction_type": Elements.endpoints.index(
+                    "elementsFullHistory"
+                ),
+                "PARAMETER": Elements.parameters.index("geometry"),
+                "OUTPUT": os.path.join(directory, f"history_{next(runs)}.gpkg"),
+            },
+        )
+
+    return [
+        ("processing aggregation bpolys", "runs", aggregation_polygons),
+        ("processing aggregation bcircles", "runs", aggregation_points),
+        ("processing elements extraction", "runs", extraction),
+        ("processing full history extraction", "runs", full_history),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--elements", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--bandwidth", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Asynchronous requests started at once",
+    )
+    parser.add_argument("--grid", type=int, default=4)
+    parser.add_argument("--points", type=int, default=50)
+    args = parser.parse_args()
+    args.url = f"http://localhost:{args.port}"
+    random.seed(0)
+
+    QgsApplication.setPrefixPath(os.environ.get("QGIS_PREFIX_PATH", ""), True)
+    app = QgsApplication([], False)
+    app.initQgis()
+    # Every run has to reach the mock API
+    cache._response_cache = False
+
+    mock = start_mock_api(args)
+    directory = tempfile.mkdtemp()
+    try:
+        provider_index, provider = configured_provider(args.url)
+        clnt = client.Client(
+            provider or {"name": "Mock ohsome API", "base_url": args.url}
+        )
+        polygons = polygon_layer(args.grid)
+        points = point_layer(args.points)
+        QgsProject.instance().addMapLayers([polygons, points])
+        bpolys = ohsome_spec.ProcessingOhsomeSpec(
+            params=spec_params(
+                provider_index,
+                polygons,
+                "data-Aggregation",
+                "elements/count",
+                "",
+            ),
+            feedback=QgsProcessingFeedback(),
+        ).get_polygon_layer_request_preferences()[0]["bpolys"]
+        scenarios = (
+            client_scenarios(clnt, bpolys, args, directory)
+            + spec_scenarios(provider_index, polygons, points)
+            + postprocess_scenarios(clnt, bpolys, directory)
+        )
+        if provider is not None:
+            sys.path.append(
+                os.path.join(QgsApplication.pkgDataPath(), "python", "plugins")
+            )
+            from processing.core.Processing import Processing
+
+            from ohsomeTools.proc.provider import OhsomeToolsProvider
+
+            Processing.initialize()
+            QgsApplication.processingRegistry().addProvider(
+                OhsomeToolsProvider()
+            )
+            scenarios += processing_scenarios(
+                provider_index, polygons, points, directory
+            )
+        else:
+            print(
+                f"No provider with the base URL {args.url} in config.yml, "
+                "skipping the processing algorithms."
+            )
+
+        print(
+            f"{args.elements} elements, {args.latency * 1000:.0f} ms latency, "
+            f"{args.repeat} runs"
+        )
+        print(
+            f"{'scenario':<34} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+            f"{'req/s':>8} {'MiB/s':>8} {'units/s':>10} {'':<9}"
+            f"{'peak MiB':>8}"
+        )
+        for name, unit, scenario in scenarios:
+            measure(name, unit, scenario, args)
+    finally:
+        mock.terminate()
+        mock.wait()
+        QgsProject.instance().removeAllMapLayers()
+        app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
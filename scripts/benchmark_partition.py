@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the single-pass geometry partitioner against the former
+split_geojson_by_geometry on synthetic feature collections. Needs the GDAL
+Python bindings, runs from the repository root:
+
+    python scripts/benchmark_partition.py [features]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ohsomeTools.common.writer import partition_features  # noqa: E402
+
+
+def split_geojson_by_geometry(
+    geojson: dict,
+    return_features_per_geometry: bool = False,
+    keep_geometry_less: bool = False,
+    combine_single_with_multi_geometries: bool = False,
+) -> [dict]:
+    """The former implementation, without its error handling."""
+    geojson_per_geometry = []
+    features_per_geometry = {}
+    if geojson.get("features"):
+        features = geojson.pop("features")
+    elif geojson.get("geometry") and geojson.get("geometry").get("geometries"):
+        features = geojson.get("geometry").get("geometries")
+    elif geojson.get("geometries") and len(geojson.get("geometries")):
+        features = geojson.get("geometries")
+    else:
+        return {}
+    for feature in features:
+        if "geometry" in feature and feature["geometry"] is not None:
+            geometry_type = feature["geometry"]["type"]
+        elif "type" in feature and feature["type"] is not None:
+            geometry_type = feature["type"]
+        else:
+            continue
+        if geometry_type == "GeometryCollection":
+            geometry_collection = split_geojson_by_geometry(
+                feature, return_features_per_geometry=True
+            )
+            return_features_per_geometry = False
+            for feature_type in geometry_collection:
+                for sub_feature in geometry_collection[feature_type]:
+                    sub_feature["properties"] = feature["properties"]
+                if feature_type not in features_per_geometry:
+                    features_per_geometry[feature_type] = []
+                features_per_geometry.get(feature_type).extend(
+                    geometry_collection[feature_type]
+                )
+            continue
+        elif geometry_type not in features_per_geometry:
+            features_per_geometry[geometry_type] = []
+        features_per_geometry[geometry_type].append(feature)
+    if return_features_per_geometry:
+        return features_per_geometry
+    if not keep_geometry_less and features_per_geometry.get("Feature"):
+        features_per_geometry.pop("Feature")
+    if combine_single_with_multi_geometries:
+        for single, multi in [
+            ("Polygon", "MultiPolygon"),
+            ("Point", "MultiPoint"),
+            ("LineString", "MultiLineString"),
+        ]:
+            if all(i in features_per_geometry for i in [single, multi]):
+                features_per_geometry.get(multi).extend(
+                    features_per_geometry.pop(single)
+                )
+    for _, feature_set in features_per_geometry.items():
+        temp_geojson = geojson.copy()
+        temp_geojson["features"] = feature_set
+        geojson_per_geometry.append(temp_geojson)
+    return geojson_per_geometry
+
+
+def geometry(geometry_type: str) -> dict:
+    x, y = random.uniform(-180, 179), random.uniform(-90, 89)
+    ring = [[x, y], [x + 1, y], [x + 1, y + 1], [x, y]]
+    return {
+        "Point": {"type": "Point", "coordinates": [x, y]},
+        "LineString": {"type": "LineString", "coordinates": ring[:2]},
+        "Polygon": {"type": "Polygon", "coordinates": [ring]},
+        "MultiPolygon": {"type": "MultiPolygon", "coordinates": [[ring]]},
+    }[geometry_type]
+
+
+def feature_collection(count: int) -> dict:
+    features = []
+    for i in range(count):
+        kind = i % 10
+        if kind == 0:
+            shape = None
+        elif kind == 1:
+            shape = {
+                "type": "GeometryCollection",
+                "geometries": [geometry("Point"), geometry("Polygon")],
+            }
+        else:
+            shape = geometry(
+                ["Point", "LineString", "Polygon", "MultiPolygon"][kind % 4]
+            )
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": shape,
+                "properties": {"@osmId": f"way/{i}"},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def former(geojson: dict) -> Counter:
+    counts = Counter()
+    for collection in split_geojson_by_geometry(
+        geojson, combine_single_with_multi_geometries=True
+    ):
+        for feature in collection["features"]:
+            # Parts of geometry collections are bare geometries
+            counts[(feature.get("geometry") or feature)["type"]] += 1
+    return counts
+
+
+def partitioner(geojson: dict) -> Counter:
+    counts = Counter()
+    for geometry_type, _, _ in partition_features(
+        geojson["features"], harmonize=True
+    ):
+        counts[geometry_type] += 1
+    return counts
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(0)
+    geojson = feature_collection(count)
+    print(f"{count} features")
+    for name, function in [("former", former), ("partitioner", partitioner)]:
+        seconds = []
+        for _ in range(3):
+            # The former implementation pops the features from its input
+            response = {**geojson, "features": list(geojson["features"])}
+            start = time.perf_counter()
+            function(response)
+            seconds.append(time.perf_counter() - start)
+        response = {**geojson, "features": list(geojson["features"])}
+        tracemalloc.start()
+        function(response)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"  {name:<12} {min(seconds) * 1000:8.0f} ms "
+            f"{peak / 1024 ** 2:8.1f} MiB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Measures how long the QGIS event loop stalls while an extraction result is
+written and loaded, once on the main thread as the finished handler of the
+request task used to do and once in the worker thread of a task that only
+hands the layers to the main thread. Needs the QGIS Python libraries and
+runs offscreen from the repository root:
+
+    python scripts/benchmark_postprocess.py [features]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qgis.core import QgsApplication, QgsProject, QgsTask  # noqa: E402
+from qgis.PyQt.QtCore import QEventLoop, QTimer  # noqa: E402
+
+from ohsomeTools.common import request_core  # noqa: E402
+
+# Interval of the main thread timer in milliseconds
+HEARTBEAT_INTERVAL = 10
+
+
+def feature_collection(count: int) -> dict:
+    """A full-history like response of small squares."""
+    features = []
+    for i in range(count):
+        x, y = random.uniform(8.6, 8.7), random.uniform(49.3, 49.4)
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [
+                            [x, y],
+                            [x + 0.0001, y],
+                            [x + 0.0001, y + 0.0001],
+                            [x, y + 0.0001],
+                            [x, y],
+                        ]
+                    ],
+                },
+                "properties": {
+                    "@osmId": f"way/{i // 3}",
+                    "@validFrom": f"20{10 + i % 3}-01-01T00:00:00Z",
+                    "building": "yes",
+                    "height": random.uniform(3, 30),
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+class Heartbeat:
+    """Records the largest gap between the ticks of a main thread timer."""
+
+    def __init__(self):
+        self.max_gap = 0.0
+        self._last = None
+        self._timer = QTimer()
+        self._timer.setInterval(HEARTBEAT_INTERVAL)
+        self._timer.timeout.connect(self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.max_gap = max(self.max_gap, now - self._last)
+        self._last = now
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._tick()
+        self._timer.stop()
+
+
+class PostprocessTask(QgsTask):
+    """Writes the layers in run and adds them to the project in finished."""
+
+    def __init__(self, geojson: dict, output_path: str, done):
+        super().__init__("Post-processing benchmark", QgsTask.CanCancel)
+        self.geojson = geojson
+        self.output_path = output_path
+        self.done = done
+        self.layers = []
+
+    def run(self):
+        self.layers = request_core.create_ohsome_vector_layers(
+            None, self.geojson, self.output_path, add_to_project=False
+        )
+        for layer in self.layers:
+            layer.moveToThread(QgsApplication.instance().thread())
+        return True
+
+    def finished(self, result):
+        QgsProject.instance().addMapLayers(self.layers)
+        self.done()
+
+
+def measure(start) -> (float, float):
+    """
+    Runs the event loop until the work started by start calls done.
+
+    :returns: The wall time and the largest stall of the event loop in
+        seconds.
+    """
+    loop = QEventLoop()
+    heartbeat = Heartbeat()
+    heartbeat.start()
+    began = time.perf_counter()
+    QTimer.singleShot(HEARTBEAT_INTERVAL * 5, lambda: start(loop.quit))
+    loop.exec_()
+    heartbeat.stop()
+    return time.perf_counter() - began, heartbeat.max_gap
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    QgsApplication.setPrefixPath(os.environ.get("QGIS_PREFIX_PATH", ""), True)
+    app = QgsApplication([], False)
+    app.initQgis()
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    tasks = []
+
+    # Generated up front, so only the post-processing is measured
+    responses = [feature_collection(count), feature_collection(count)]
+
+    def on_main_thread(done):
+        QgsProject.instance().addMapLayers(
+            request_core.create_ohsome_vector_layers(
+                None,
+                responses[0],
+                os.path.join(directory, "main.gpkg"),
+                add_to_project=False,
+            )
+        )
+        done()
+
+    def in_task(done):
+        task = PostprocessTask(
+            responses[1], os.path.join(directory, "task.gpkg"), done
+        )
+        tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+
+    print(f"{count} features")
+    for name, start in [("main thread", on_main_thread), ("task", in_task)]:
+        seconds, stall = measure(start)
+        print(
+            f"  {name:<12} {seconds * 1000:8.0f} ms total "
+            f"{stall * 1000:8.0f} ms longest UI stall"
+        )
+    QgsProject.instance().removeAllMapLayers()
+    app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the registration of the processing provider, as done on QGIS
+startup, with a cold, a fresh and a stale metadata cache. Loading the
+provider and its algorithms must not touch the network, so every network
+request fails the benchmark. Needs the QGIS Python libraries and runs
+offscreen from the repository root:
+
+    python scripts/benchmark_startup.py --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qgis.core import QgsApplication, QgsNetworkAccessManager  # noqa: E402
+
+from ohsomeTools.common import cache, networkaccessmanager  # noqa: E402
+from ohsomeTools.utils import configmanager  # noqa: E402
+
+METADATA = {
+    "extractRegion": {
+        "temporalExtent": {
+            "fromTimestamp": "2007-10-08T00:00:00Z",
+            "toTimestamp": "2023-01-01T00:00:00Z",
+        }
+    }
+}
+
+
+class NetworkMonitor:
+    """
+    Records the requests of the plugin and of QGIS. The network access
+    manager of the plugin is stubbed, so no request leaves the machine.
+    """
+
+    def __init__(self):
+        self.requests = []
+        QgsNetworkAccessManager.instance().requestAboutToBeCreated.connect(
+            lambda parameters: self.requests.append(
+                parameters.request().url().toString()
+            )
+        )
+
+        def request(nam, url, *args, **kwargs):
+            self.requests.append(url)
+            raise networkaccessmanager.RequestsException(
+                f"Network access on startup: {url}"
+            )
+
+        networkaccessmanager.NetworkAccessManager.request = request
+
+
+def metadata_cache(directory: str, state: str) -> cache.MetadataCache:
+    """A metadata cache of the first provider that is cold, fresh or stale."""
+    metadata = cache.MetadataCache(
+        os.path.join(directory, f"{state}.json"), refresh_interval=3600
+    )
+    if state != "cold":
+        base_url = configmanager.read_config()["providers"][0]["base_url"]
+        metadata.put(base_url, METADATA)
+        if state == "stale":
+            metadata._entries[base_url.rstrip("/")]["fetched"] = 0
+    return metadata
+
+
+def load_provider(provider_class) -> (float, int):
+    """
+    Registers and removes the provider once.
+
+    :returns: The seconds the registration took and the number of loaded
+        algorithms.
+    :rtype: (float, int)
+    """
+    registry = QgsApplication.processingRegistry()
+    provider = provider_class()
+    start = time.perf_counter()
+    registry.addProvider(provider)
+    seconds = time.perf_counter() - start
+    algorithms = len(provider.algorithms())
+    registry.removeProvider(provider)
+    return seconds, algorithms
+
+
+def _percentile(values: [float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    QgsApplication.setPrefixPath(os.environ.get("QGIS_PREFIX_PATH", ""), True)
+    app = QgsApplication([], False)
+    app.initQgis()
+    monitor = NetworkMonitor()
+
+    start = time.perf_counter()
+    from ohsomeTools.proc.provider import OhsomeToolsProvider
+
+    print(f"import {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(
+        f"{'metadata cache':<16} {'algorithms':>10} {'p50 ms':>8} "
+        f"{'max ms':>8} {'requests':>8}"
+    )
+    directory = tempfile.mkdtemp()
+    for state in ["cold", "fresh", "stale"]:
+        cache._metadata_cache = metadata_cache(directory, state)
+        before = len(monitor.requests)
+        seconds = []
+        for _ in range(args.repeat):
+            elapsed, algorithms = load_provider(OhsomeToolsProvider)
+            seconds.append(elapsed)
+        # Deliver queued signals and finished background tasks
+        QgsApplication.processEvents()
+        print(
+            f"{state:<16} {algorithms:>10} "
+            f"{_percentile(seconds, 50) * 1000:8.1f} "
+            f"{max(seconds) * 1000:8.1f} "
+            f"{len(monitor.requests) - before:8}",
+            flush=True,
+        )
+
+    running = QgsApplication.taskManager().count()
+    app.exitQgis()
+    if len(monitor.requests) or running:
+        print(
+            f"Loading the provider made {len(monitor.requests)} network "
+            f"requests and started {running} tasks: "
+            f"{', '.join(monitor.requests)}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,848 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the ohsome API that answers the metadata, aggregation
+and extraction endpoints with synthetic data of configurable size and
+latency, e.g. to benchmark the plugin without the public API. Only needs
+the Python standard library:
+
+    python scripts/mock_ohsome_api.py --port 8080 --elements 100000 \
+        --latency 0.1
+
+The elements are spread evenly over the extent of the metadata. A request
+gets the elements inside the bounding boxes of its bboxes, bcircles or
+bpolys, filters are ignored. The same request always gets the same
+response. GET /mock/stats returns the number of requests and bytes served
+per endpoint, /mock/stats?reset=true resets them afterwards.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+API_VERSION = "1.10.1"
+ATTRIBUTION = {
+    "url": "https://ohsome.org/copyrights",
+    "text": "© OpenStreetMap contributors",
+}
+# Heidelberg
+DEFAULT_EXTENT = (8.6, 49.35, 8.75, 49.45)
+FROM_TIMESTAMP = "2007-10-08T00:00:00Z"
+TO_TIMESTAMP = "2023-01-01T00:00:00Z"
+# More timestamps in one time parameter are rejected
+MAX_TIMESTAMPS = 10000
+CHUNK_SIZE = 64 * 1024
+METERS_PER_DEGREE = 111320.0
+# Edge length of the element geometries in degrees
+ELEMENT_SIZE = 0.0002
+
+# OSM type, geometry type and tag of the elements by index modulo 10
+KINDS = [
+    ("node", "Point", ("amenity", "bench")),
+    ("way", "Polygon", ("building", "yes")),
+    ("way", "Polygon", ("building", "yes")),
+    ("way", "Polygon", ("building", "house")),
+    ("way", "Polygon", ("landuse", "meadow")),
+    ("way", "LineString", ("highway", "residential")),
+    ("way", "LineString", ("highway", "residential")),
+    ("way", "LineString", ("highway", "service")),
+    ("relation", "MultiPolygon", ("building", "yes")),
+    ("node", "Point", ("amenity", "bench")),
+]
+# Factor of an element in the value of the aggregations
+MEASURES = {"count": 1.0, "length": 85.0, "perimeter": 60.0, "area": 220.0}
+EXTRACTIONS = ["elements", "elementsFullHistory", "contributions"]
+GEOMETRY_TYPES = ["geometry", "bbox", "centroid"]
+
+_PERIOD = re.compile(r"^P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)W)?(?:(\d+)D)?$")
+
+
+def _parse_time(timestamp: str) -> datetime:
+    try:
+        return datetime.fromisoformat(timestamp.strip().rstrip("Z")[:19])
+    except ValueError:
+        raise ValueError(f"The timestamp {timestamp} is invalid.")
+
+
+def _format_time(date: datetime) -> str:
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _add_period(date: datetime, years, months, weeks, days) -> datetime:
+    month = date.month - 1 + 12 * years + months
+    day = date.day
+    while True:
+        try:
+            date = date.replace(
+                year=date.year + month // 12, month=month % 12 + 1, day=day
+            )
+            break
+        except ValueError:
+            # Clamp to the last day of shorter months
+            day -= 1
+    return date + timedelta(weeks=weeks, days=days)
+
+
+def timestamps(time_parameter: str) -> [datetime]:
+    """
+    Expands a time parameter like "2010-01-01/2020-01-01/P1Y" or
+    "2015-01-01,2020-01-01" into its timestamps.
+    """
+    if not time_parameter:
+        return [_parse_time(TO_TIMESTAMP)]
+    dates = set()
+    for part in time_parameter.split(","):
+        items = part.split("/")
+        if len(items) == 1:
+            dates.add(_parse_time(items[0]))
+            continue
+        start = _parse_time(items[0] or FROM_TIMESTAMP)
+        end = _parse_time(items[1] or TO_TIMESTAMP)
+        if len(items) < 3 or not items[2]:
+            dates.update([start, end])
+            continue
+        match = _PERIOD.match(items[2])
+        period = [int(value or 0) for value in match.groups()] if match else []
+        if not any(period):
+            raise ValueError(f"The period {items[2]} is invalid.")
+        # Counted from the start, so short months don't shift later dates
+        steps = 0
+        date = start
+        while date <= end:
+            dates.add(date)
+            if len(dates) > MAX_TIMESTAMPS:
+                break
+            steps += 1
+            date = _add_period(start, *[value * steps for value in period])
+    if len(dates) > MAX_TIMESTAMPS:
+        raise ValueError("The time parameter has too many timestamps.")
+    return sorted(dates)
+
+
+def _coordinates(value) -> [(float, float)]:
+    """All positions of GeoJSON coordinates of any nesting."""
+    if len(value) and isinstance(value[0], (int, float)):
+        return [(float(value[0]), float(value[1]))]
+    return [position for item in value for position in _coordinates(item)]
+
+
+def _bounds(positions: [(float, float)]) -> (float, float, float, float):
+    if not len(positions):
+        raise ValueError("A boundary has no coordinates.")
+    xs = [x for x, _ in positions]
+    ys = [y for _, y in positions]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _split_id(part: str, index: int) -> (str, str):
+    if ":" in part:
+        boundary_id, values = part.split(":", 1)
+        return boundary_id, values
+    return f"boundary{index + 1}", part
+
+
+def _floats(values: str) -> [float]:
+    try:
+        return [float(value) for value in values.split(",")]
+    except ValueError:
+        raise ValueError(f"The coordinates {values} are invalid.")
+
+
+def _geojson_boundaries(bpolys: str) -> [(str, tuple)]:
+    try:
+        geojson = json.loads(bpolys)
+    except ValueError:
+        raise ValueError("The bpolys GeoJSON is invalid.")
+    if geojson.get("type") == "FeatureCollection":
+        features = geojson.get("features") or []
+    elif geojson.get("type") == "Feature":
+        features = [geojson]
+    else:
+        features = [{"geometry": geojson}]
+    boundaries = []
+    for i, feature in enumerate(features):
+        properties = feature.get("properties") or {}
+        boundary_id = properties.get("id", feature.get("id", f"feature{i + 1}"))
+        geometry = feature.get("geometry") or {}
+        boundaries.append(
+            (
+                str(boundary_id),
+                _bounds(_coordinates(geometry.get("coordinates") or [])),
+            )
+        )
+    return boundaries
+
+
+def boundaries(params: dict) -> [(str, tuple)]:
+    """
+    :returns: The id and the bounding box of every boundary of a request.
+    """
+    if params.get("bboxes"):
+        result = []
+        for i, part in enumerate(params["bboxes"].split("|")):
+            boundary_id, values = _split_id(part, i)
+            coordinates = _floats(values)
+            if len(coordinates) != 4:
+                raise ValueError(f"The bbox {part} is invalid.")
+            result.append((boundary_id, tuple(coordinates)))
+        return result
+    if params.get("bcircles"):
+        result = []
+        for i, part in enumerate(params["bcircles"].split("|")):
+            boundary_id, values = _split_id(part, i)
+            coordinates = _floats(values)
+            if len(coordinates) != 3:
+                raise ValueError(f"The bcircle {part} is invalid.")
+            x, y, radius = coordinates
+            dy = radius / METERS_PER_DEGREE
+            dx = dy / max(0.01, math.cos(math.radians(y)))
+            result.append((boundary_id, (x - dx, y - dy, x + dx, y + dy)))
+        return result
+    if params.get("bpolys"):
+        if params["bpolys"].lstrip().startswith("{"):
+            return _geojson_boundaries(params["bpolys"])
+        result = []
+        for i, part in enumerate(params["bpolys"].split("|")):
+            boundary_id, values = _split_id(part, i)
+            coordinates = _floats(values)
+            result.append(
+                (
+                    boundary_id,
+                    _bounds(list(zip(coordinates[0::2], coordinates[1::2]))),
+                )
+            )
+        return result
+    raise ValueError(
+        "You need to define one of the boundary parameters (bboxes, "
+        "bcircles, bpolys)."
+    )
+
+
+def _area_km2(bbox: tuple) -> float:
+    width = (bbox[2] - bbox[0]) * METERS_PER_DEGREE
+    width *= math.cos(math.radians((bbox[1] + bbox[3]) / 2))
+    height = (bbox[3] - bbox[1]) * METERS_PER_DEGREE
+    return max(1e-6, width * height / 1e6)
+
+
+def _union(bboxes: [tuple]) -> tuple:
+    return (
+        min(bbox[0] for bbox in bboxes),
+        min(bbox[1] for bbox in bboxes),
+        max(bbox[2] for bbox in bboxes),
+        max(bbox[3] for bbox in bboxes),
+    )
+
+
+def _polygon(bbox: tuple) -> dict:
+    x1, y1, x2, y2 = bbox
+    return {
+        "type": "Polygon",
+        "coordinates": [[[x1, y1], [x2, y1], [x2, y2], [x1, y2], [x1, y1]]],
+    }
+
+
+class Dataset:
+    """Synthetic elements, sorted by the x coordinate of their position."""
+
+    def __init__(self, count: int, extent: tuple, seed: int = 0):
+        rng = random.Random(seed)
+        positions = sorted(
+            (
+                rng.uniform(extent[0], extent[2]),
+                rng.uniform(extent[1], extent[3]),
+            )
+            for _ in range(count)
+        )
+        self.extent = extent
+        self.xs = [x for x, _ in positions]
+        self.ys = [y for _, y in positions]
+
+    def within(self, bbox: tuple) -> [int]:
+        """The indices of the elements inside a bounding box."""
+        start = bisect.bisect_left(self.xs, bbox[0])
+        end = bisect.bisect_right(self.xs, bbox[2])
+        return [
+            i for i in range(start, end) if bbox[1] <= self.ys[i] <= bbox[3]
+        ]
+
+    def osm_id(self, i: int) -> str:
+        return f"{KINDS[i % 10][0]}/{i + 1}"
+
+    def tag(self, i: int) -> (str, str):
+        return KINDS[i % 10][2]
+
+    def geometry(self, i: int, geometry_type: str, version: int = 0) -> dict:
+        # Every version moves the element a bit
+        x = self.xs[i] + version * ELEMENT_SIZE / 10
+        y = self.ys[i]
+        d = ELEMENT_SIZE
+        kind = KINDS[i % 10][1]
+        if geometry_type == "centroid":
+            return {"type": "Point", "coordinates": [x + d / 2, y + d / 2]}
+        if geometry_type == "bbox" and kind != "Point":
+            return _polygon((x, y, x + d, y + d))
+        if kind == "Point":
+            return {"type": "Point", "coordinates": [x, y]}
+        if kind == "LineString":
+            return {
+                "type": "LineString",
+                "coordinates": [[x, y], [x + d, y + d / 2], [x + 2 * d, y]],
+            }
+        square = _polygon((x, y, x + d, y + d))["coordinates"]
+        if kind == "Polygon":
+            return {"type": "Polygon", "coordinates": square}
+        other = _polygon((x + 2 * d, y, x + 3 * d, y + d))["coordinates"]
+        return {"type": "MultiPolygon", "coordinates": [square, other]}
+
+
+class MockOhsomeApi:
+    """Builds the synthetic responses of the endpoints."""
+
+    def __init__(self, dataset: Dataset, versions: int = 3):
+        self.dataset = dataset
+        self.versions = max(1, versions)
+
+    def metadata(self) -> dict:
+        return {
+            "attribution": ATTRIBUTION,
+            "apiVersion": API_VERSION,
+            "timeout": 600.0,
+            "extractRegion": {
+                "spatialExtent": _polygon(self.dataset.extent),
+                "temporalExtent": {
+                    "fromTimestamp": FROM_TIMESTAMP,
+                    "toTimestamp": TO_TIMESTAMP,
+                },
+                "replicationSequenceNumber": 96000,
+            },
+        }
+
+    def _values(
+        self,
+        count: int,
+        bbox: tuple,
+        dates: [datetime],
+        measure: str,
+        density: bool,
+        periods: bool,
+    ) -> [dict]:
+        total = count * MEASURES.get(measure, 1.0)
+        if density:
+            total /= _area_km2(bbox)
+        # Counts are whole numbers
+        digits = None if measure == "count" and not density else 2
+        if periods:
+            # Users and contributions are counted per period
+            return [
+                {
+                    "fromTimestamp": _format_time(start),
+                    "toTimestamp": _format_time(end),
+                    "value": round(total / max(1, len(dates) - 1), digits),
+                }
+                for start, end in zip(dates[:-1], dates[1:])
+            ]
+        return [
+            {
+                "timestamp": _format_time(date),
+                "value": round(total * (k + 1) / len(dates), digits),
+            }
+            for k, date in enumerate(dates)
+        ]
+
+    def _ratio(self, rows: [dict]) -> [dict]:
+        return [
+            {**row, "value2": round(row["value"] * 0.3, 2), "ratio": 0.3}
+            for row in rows
+        ]
+
+    def _groups(self, group_by: [str], params, areas) -> [(object, [int])]:
+        """Splits the elements of the boundaries into the groups."""
+        indices = sorted(
+            {i for _, bbox in areas for i in self.dataset.within(bbox)}
+        )
+        if not len(group_by):
+            return [(None, indices)]
+        if group_by[0] == "boundary":
+            groups = [
+                (boundary_id, self.dataset.within(bbox))
+                for boundary_id, bbox in areas
+            ]
+            if len(group_by) > 1:
+                return [
+                    ([boundary_id, tag], members)
+                    for boundary_id, elements in groups
+                    for tag, members in self._tag_groups(params, elements)
+                ]
+            return groups
+        if group_by[0] == "tag":
+            return self._tag_groups(params, indices)
+        if group_by[0] == "key":
+            keys = [
+                key for key in params.get("groupByKeys", "").split(",") if key
+            ]
+            return self._split(indices, ["remainder"] + keys)
+        if group_by[0] == "type":
+            return [
+                (osm_type, [i for i in indices if KINDS[i % 10][0] == osm_type])
+                for osm_type in ["node", "way", "relation"]
+            ]
+        raise ValueError(f"groupBy/{group_by[0]} is not supported.")
+
+    def _tag_groups(self, params: dict, indices: [int]) -> [(str, [int])]:
+        key = params.get("groupByKey", "")
+        if not key:
+            raise ValueError("You need to give one groupByKey parameter.")
+        values = [
+            value
+            for value in params.get("groupByValues", "").split(",")
+            if value
+        ]
+        if not len(values):
+            values = sorted(
+                {v for k, v in (kind[2] for kind in KINDS) if k == key}
+            )
+        return self._split(
+            indices, ["remainder"] + [f"{key}={value}" for value in values]
+        )
+
+    def _split(self, indices: [int], labels: [str]) -> [(str, [int])]:
+        return [
+            (label, indices[k :: len(labels)]) for k, label in enumerate(labels)
+        ]
+
+    def aggregation(self, endpoint: [str], params: dict) -> dict:
+        """
+        :param endpoint: The path segments, e.g. elements, count, groupBy,
+            boundary.
+        """
+        measure = next(
+            (segment for segment in endpoint if segment in MEASURES), None
+        )
+        if measure is None:
+            raise LookupError()
+        options = endpoint[endpoint.index(measure) + 1 :]
+        density = "density" in options
+        ratio = "ratio" in options
+        group_by = [
+            segment
+            for segment in options
+            if segment not in ["density", "ratio", "groupBy"]
+        ]
+        periods = endpoint[0] in ["users", "contributions"]
+        areas = boundaries(params)
+        dates = timestamps(params.get("time"))
+        if periods and len(dates) < 2:
+            raise ValueError("You need to give at least two timestamps.")
+        union = _union([bbox for _, bbox in areas])
+        bboxes = dict(areas)
+
+        def values(group, members):
+            bbox = bboxes.get(group[0] if isinstance(group, list) else group)
+            rows = self._values(
+                len(members),
+                bbox or union,
+                dates,
+                measure,
+                density,
+                periods,
+            )
+            return self._ratio(rows) if ratio else rows
+
+        groups = self._groups(group_by, params, areas)
+        if not len(group_by):
+            key = "ratioResult" if ratio else "result"
+            return {key: values(None, groups[0][1])}
+        if params.get("format") == "geojson" and group_by == ["boundary"]:
+            return {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "id": f"{group}@{row.get('timestamp', row.get('toTimestamp'))}",
+                        "geometry": _polygon(bboxes[group]),
+                        "properties": {"groupByBoundaryId": group, **row},
+                    }
+                    for group, members in groups
+                    for row in values(group, members)
+                ],
+            }
+        key = "ratioResult" if ratio else "result"
+        return {
+            "groupByBoundaryResult"
+            if ratio
+            else "groupByResult": [
+                {"groupByObject": group, key: values(group, members)}
+                for group, members in groups
+            ]
+        }
+
+    def _properties(self, i: int, params: dict) -> dict:
+        key, value = self.dataset.tag(i)
+        properties = {"@osmId": self.dataset.osm_id(i)}
+        if "tags" in params.get("properties", ""):
+            properties[key] = value
+            properties["name"] = f"Element {i + 1}"
+        if "metadata" in params.get("properties", ""):
+            properties["@changesetId"] = 1000 + i
+            properties["@version"] = 1
+        return properties
+
+    def extraction(self, endpoint: [str], params: dict):
+        """
+        :param endpoint: The path segments, e.g. elementsFullHistory, bbox.
+
+        :returns: The members of the response and a generator of its
+            features.
+        :rtype: (dict, generator)
+        """
+        if endpoint[0] not in EXTRACTIONS or endpoint[-1] not in GEOMETRY_TYPES:
+            raise LookupError()
+        geometry_type = endpoint[-1]
+        latest = "latest" in endpoint
+        areas = boundaries(params)
+        dates = timestamps(params.get("time"))
+        if endpoint[0] != "elements" and len(dates) < 2:
+            raise ValueError("You need to give two timestamps.")
+        indices = sorted(
+            {i for _, bbox in areas for i in self.dataset.within(bbox)}
+        )
+
+        def features():
+            if endpoint[0] == "elements":
+                for date in dates:
+                    for i in indices:
+                        yield {
+                            "type": "Feature",
+                            "geometry": self.dataset.geometry(i, geometry_type),
+                            "properties": {
+                                **self._properties(i, params),
+                                "@snapshotTimestamp": _format_time(date),
+                            },
+                        }
+                return
+            start, end = dates[0], dates[-1]
+            span = end - start
+            for i in indices:
+                for version in range(self.versions):
+                    valid_from = start + span * version / self.versions
+                    valid_to = start + span * (version + 1) / self.versions
+                    if endpoint[0] == "elementsFullHistory":
+                        yield {
+                            "type": "Feature",
+                            "geometry": self.dataset.geometry(
+                                i, geometry_type, version
+                            ),
+                            "properties": {
+                                **self._properties(i, params),
+                                "@validFrom": _format_time(valid_from),
+                                "@validTo": _format_time(valid_to),
+                            },
+                        }
+                        continue
+                    if latest and version < self.versions - 1:
+                        continue
+                    # Every 50th element is deleted in its last version
+                    deleted = version == self.versions - 1 and i % 50 == 49
+                    properties = {
+                        **self._properties(i, params),
+                        "@timestamp": _format_time(
+                            valid_from + (valid_to - valid_from) / 2
+                        ),
+                        "@contributionChangesetId": i * self.versions + version,
+                    }
+                    if deleted:
+                        properties["@deletion"] = True
+                    elif version == 0:
+                        properties["@creation"] = True
+                    else:
+                        properties["@geometryChange"] = True
+                    yield {
+                        "type": "Feature",
+                        "geometry": None
+                        if deleted
+                        else self.dataset.geometry(i, geometry_type, version),
+                        "properties": properties,
+                    }
+
+        return {"type": "FeatureCollection"}, features()
+
+
+def _response_chunks(members: dict, features=None):
+    """Serializes a response, the features one by one."""
+    head = {"attribution": ATTRIBUTION, "apiVersion": API_VERSION, **members}
+    if features is None:
+        yield json.dumps(head)
+        return
+    yield json.dumps(head)[:-1] + ', "features": ['
+    separator = ""
+    for feature in features:
+        yield separator + json.dumps(feature)
+        separator = ","
+    yield "]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOhsomeAPI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _params(self, query: str) -> dict:
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return params
+        body = self.rfile.read(length)
+        if "gzip" in (self.headers.get("Content-Encoding") or ""):
+            body = gzip.decompress(body)
+        if "json" in (self.headers.get("Content-Type") or ""):
+            params.update(
+                {key: str(value) for key, value in json.loads(body).items()}
+            )
+        else:
+            params.update(
+                parse_qsl(body.decode("utf-8"), keep_blank_values=True)
+            )
+        return params
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        if path.startswith("/v1/"):
+            path = path[3:]
+        started = time.perf_counter()
+        try:
+            params = self._params(url.query)
+        except (ValueError, OSError) as err:
+            self._error(400, f"The request body is invalid: {err}")
+            return
+        if path == "/mock/stats":
+            self._send(200, [json.dumps(self.server.stats(params))])
+            return
+        if self.server.throttle and random.random() < self.server.throttle:
+            self._error(429, "Too many requests.", {"Retry-After": "1"})
+            return
+        endpoint = path.strip("/").split("/")
+        features = None
+        try:
+            if path == "/metadata":
+                members = self.server.api.metadata()
+            elif endpoint[-1] in GEOMETRY_TYPES:
+                members, features = self.server.api.extraction(endpoint, params)
+            else:
+                members = self.server.api.aggregation(endpoint, params)
+        except LookupError:
+            self._error(404, f"The endpoint {path} does not exist.")
+            return
+        except ValueError as err:
+            self._error(400, str(err))
+            return
+        if params.get("showMetadata") in ["true", "yes"]:
+            members = {
+                "metadata": {
+                    "executionTime": int(
+                        (time.perf_counter() - started) * 1000
+                    ),
+                    "description": f"Synthetic response of {path}.",
+                    "requestUrl": self.path,
+                },
+                **members,
+            }
+        # The server computes the result before it starts sending
+        time.sleep(self.server.latency)
+        self._send(200, _response_chunks(members, features), path)
+
+    def _error(self, status: int, message: str, headers: dict = None):
+        body = {
+            "timestamp": _format_time(datetime.now(timezone.utc)),
+            "status": status,
+            "message": message,
+            "requestUrl": self.path,
+        }
+        self._send(
+            status, [json.dumps(body)], urlsplit(self.path).path, headers
+        )
+
+    def _send(self, status: int, chunks, path=None, headers=None):
+        compress = self.server.gzip and "gzip" in (
+            self.headers.get("Accept-Encoding") or ""
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        compressor = (
+            zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        )
+        sent = 0
+        buffer = []
+        size = 0
+        for text in chunks:
+            buffer.append(text)
+            size += len(text)
+            if size >= CHUNK_SIZE:
+                sent += self._write(compressor, "".join(buffer).encode())
+                buffer, size = [], 0
+        data = "".join(buffer).encode()
+        if compressor is not None:
+            data = compressor.compress(data) + compressor.flush()
+            compressor = None
+        sent += self._write(compressor, data)
+        # Counted before the client can see the end of the response
+        if path is not None:
+            self.server.count(path, sent)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write(self, compressor, data: bytes) -> int:
+        if compressor is not None:
+            data = compressor.compress(data)
+        if not data:
+            return 0
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        if self.server.bandwidth:
+            time.sleep(len(data) / self.server.bandwidth)
+        return len(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        api: MockOhsomeApi,
+        latency: float = 0.0,
+        bandwidth: float = 0.0,
+        throttle: float = 0.0,
+        gzip: bool = True,
+        verbose: bool = False,
+    ):
+        """
+        :param latency: Seconds before a response is sent.
+        :param bandwidth: Bytes per second of the responses, 0 for no limit.
+        :param throttle: Share of the requests answered with 429.
+        """
+        super().__init__(address, Handler)
+        self.api = api
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle = throttle
+        self.gzip = gzip
+        self.verbose = verbose
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def count(self, path: str, sent: int):
+        with self._stats_lock:
+            requests, total = self._stats.get(path, (0, 0))
+            self._stats[path] = (requests + 1, total + sent)
+
+    def stats(self, params: dict) -> dict:
+        with self._stats_lock:
+            stats = {
+                "requests": sum(value[0] for value in self._stats.values()),
+                "bytes": sum(value[1] for value in self._stats.values()),
+                "endpoints": {
+                    path: {"requests": value[0], "bytes": value[1]}
+                    for path, value in sorted(self._stats.items())
+                },
+            }
+            if params.get("reset") == "true":
+                self._stats = {}
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--elements",
+        type=int,
+        default=10000,
+        help="Number of elements in the extent",
+    )
+    parser.add_argument(
+        "--versions",
+        type=int,
+        default=3,
+        help="Versions per element of history extractions",
+    )
+    parser.add_argument(
+        "--extent",
+        type=float,
+        nargs=4,
+        default=DEFAULT_EXTENT,
+        metavar=("MINX", "MINY", "MAXX", "MAXY"),
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds before a response is sent",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0.0,
+        help="Bytes per second of a response, 0 for no limit",
+    )
+    parser.add_argument(
+        "--throttle",
+        type=float,
+        default=0.0,
+        help="Share of the requests answered with 429 Too Many Requests",
+    )
+    parser.add_argument(
+        "--no-gzip", action="store_true", help="Never compress responses"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    dataset = Dataset(args.elements, tuple(args.extent), args.seed)
+    server = MockServer(
+        (args.host, args.port),
+        MockOhsomeApi(dataset, args.versions),
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        throttle=args.throttle,
+        gzip=not args.no_gzip,
+        verbose=args.verbose,
+    )
+    print(
+        f"Mock ohsome API with {args.elements} elements on "
+        f"http://{args.host}:{server.server_port}",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
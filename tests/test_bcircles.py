@@ -0,0 +1,91 @@
+"""
+Tests of the bcircles parameters of point layers. Need the QGIS Python
+libraries, run from the repository root:
+
+    python -m pytest tests
+"""
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from qgis.core import QgsFeature, QgsGeometry, QgsPointXY  # noqa: E402
+
+from ohsomeTools.utils import bcircles, datamanager  # noqa: E402
+
+POINTS = {
+    10: (8.675432123, 49.418765432),
+    20: (8.691234567, 49.401234567),
+    35: (8.702345678, 49.412345678),
+    41: (8.661111111, 49.422222222),
+}
+
+
+def _features() -> [QgsFeature]:
+    features = []
+    for feature_id, (x, y) in POINTS.items():
+        feature = QgsFeature(feature_id)
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        features.append(feature)
+    return features
+
+
+def _circles(parameters: [str]) -> dict:
+    """The coordinates of the circles of bcircles parameters by id."""
+    circles = {}
+    for parameter in parameters:
+        for circle in parameter.split("|"):
+            circle_id, values = circle.split(":")
+            x, y, _ = values.split(",")
+            assert circle_id not in circles
+            circles[circle_id] = (float(x), float(y))
+    return circles
+
+
+def test_unbatched_layer_keeps_former_encoding():
+    parameters = datamanager.convert_point_features_to_ohsome_bcircles(
+        [iter(_features())], 100
+    )
+
+    assert parameters == [
+        "|".join(
+            f"id{index}:{x},{y},100"
+            for index, (x, y) in enumerate(POINTS.values())
+        )
+    ]
+
+
+def test_single_batch_keeps_former_encoding():
+    unbatched = datamanager.convert_point_features_to_ohsome_bcircles(
+        [iter(_features())], 100
+    )
+
+    parameters = datamanager.convert_point_features_to_ohsome_bcircles(
+        [iter(_features())],
+        100,
+        precision=bcircles.DEFAULT_PRECISION,
+        max_bytes=262144,
+        max_area=1000,
+    )
+
+    assert parameters == unbatched
+
+
+def test_batched_results_map_back_to_features():
+    parameters = datamanager.convert_point_features_to_ohsome_bcircles(
+        [iter(_features())],
+        100,
+        precision=bcircles.DEFAULT_PRECISION,
+        max_bytes=60,
+        max_area=1000,
+    )
+    assert len(parameters) > 1
+
+    # Results are grouped by the circle ids, e.g. groupBy/boundary
+    results = _circles(parameters)
+    features = {feature.id(): feature for feature in _features()}
+    assert len(results) == len(features)
+    for circle_id, (x, y) in results.items():
+        point = features[int(circle_id[len("id") :])].geometry().asPoint()
+        assert x == pytest.approx(point.x(), abs=1e-6)
+        assert y == pytest.approx(point.y(), abs=1e-6)
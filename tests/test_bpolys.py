@@ -0,0 +1,92 @@
+"""
+Tests of the reduction of bpolys parameters. Need the GDAL Python bindings,
+run from the repository root:
+
+    python -m pytest tests
+"""
+
+import json
+
+import pytest
+
+ogr = pytest.importorskip("osgeo.ogr")
+
+from ohsomeTools.utils import bpolys  # noqa: E402
+
+# A border with a vertex every 10 m, wiggling by 1 m
+BORDER = [[0.001 * i, 0.00001 * (i % 2)] for i in range(11)]
+
+
+def _feature_collection(*rings) -> str:
+    return json.dumps(
+        {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": i,
+                    "geometry": {"type": "Polygon", "coordinates": [ring]},
+                    "properties": {},
+                }
+                for i, ring in enumerate(rings)
+            ],
+        }
+    )
+
+
+def _geometries(feature_collection: str) -> list:
+    return [
+        ogr.CreateGeometryFromJson(json.dumps(feature["geometry"]))
+        for feature in json.loads(feature_collection)["features"]
+    ]
+
+
+def test_neighbours_keep_their_shared_border():
+    south = BORDER + [[0.01, -0.01], [0, -0.01], BORDER[0]]
+    north = BORDER + [[0.01, 0.01], [0, 0.01], BORDER[0]]
+
+    reduced = bpolys.reduce_bpolys(
+        _feature_collection(south, north), tolerance=100, precision=6
+    )
+
+    south, north = _geometries(reduced)
+    assert south.Intersection(north).Area() == pytest.approx(0, abs=1e-12)
+    assert south.Union(north).Area() == pytest.approx(
+        south.Area() + north.Area()
+    )
+    assert north.Touches(south)
+
+
+def test_separate_polygons_are_simplified():
+    south = BORDER + [[0.01, -0.01], [0, -0.01], BORDER[0]]
+    north = [[x, y + 1] for x, y in BORDER[::-1]] + [
+        [0, 1.01],
+        [0.01, 1.01],
+        [0.01, 1],
+    ]
+
+    reduced = bpolys.reduce_bpolys(
+        _feature_collection(south, north), tolerance=100, precision=6
+    )
+
+    for geometry in _geometries(reduced):
+        assert geometry.GetGeometryRef(0).GetPointCount() < len(BORDER)
+
+
+def test_share_borders():
+    square = [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+    neighbour = [[x + 1, y] for x, y in square]
+    distant = [[x + 3, y] for x, y in square]
+
+    assert bpolys.share_borders(
+        [
+            {"type": "Polygon", "coordinates": [square]},
+            {"type": "Polygon", "coordinates": [neighbour]},
+        ]
+    )
+    assert not bpolys.share_borders(
+        [
+            {"type": "Polygon", "coordinates": [square]},
+            {"type": "Polygon", "coordinates": [distant]},
+        ]
+    )
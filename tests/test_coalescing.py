@@ -0,0 +1,129 @@
+"""
+Tests of the sharing of identical requests in flight. Need the QGIS Python
+libraries, run from the repository root:
+
+    python -m pytest tests
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from ohsomeTools.common import (  # noqa: E402
+    client,
+    coalescing,
+    networkaccessmanager,
+)
+from ohsomeTools.utils import exceptions  # noqa: E402
+
+PROVIDER = {
+    "name": "test",
+    "base_url": "http://localhost:9/v1",
+    "requests_per_second": 1000,
+    "max_in_flight": 10,
+}
+# Seconds the tests wait for the other thread at most
+TIMEOUT = 10
+
+
+class FakeNetworkAccessManager:
+    """Answers requests with a callback instead of the network."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.http_call_result = networkaccessmanager.Response(
+            {
+                "status_code": 0,
+                "text": "",
+                "reason": "",
+                "headers": {},
+                "timings": {},
+            }
+        )
+
+    def request(self, **kwargs):
+        return self.reply(self, **kwargs)
+
+    def abort(self):
+        pass
+
+
+def _client(reply) -> client.Client:
+    clnt = client.Client(PROVIDER)
+    clnt.cache = None
+    clnt.coalesce = True
+    clnt.nam = FakeNetworkAccessManager(reply)
+    return clnt
+
+
+def _answer(nam, **kwargs):
+    nam.http_call_result.status_code = 200
+    return nam.http_call_result, b'{"result": 42}'
+
+
+def test_canceled_sender_does_not_fail_waiter():
+    results = {}
+
+    def wait():
+        results["waiter"] = _client(_answer).request(
+            "/elements/count", {"bboxes": "8.6,49.3,8.7,49.4"}
+        )
+
+    waiter_thread = threading.Thread(target=wait)
+
+    def abort(nam, **kwargs):
+        # Canceled mid-flight once another caller waits for the reply
+        waiter_thread.start()
+        key = coalescing.request_key(
+            PROVIDER["base_url"],
+            "/elements/count",
+            {"bboxes": "8.6,49.3,8.7,49.4"},
+        )
+        shared = coalescing._shared[key]
+        for _ in range(TIMEOUT * 100):
+            if len(shared.waiters):
+                break
+            threading.Event().wait(0.01)
+        sender.canceled = True
+        nam.http_call_result.status_code = None
+        raise networkaccessmanager.RequestsExceptionUserAbort("Canceled")
+
+    sender = _client(abort)
+    with pytest.raises(networkaccessmanager.RequestsExceptionUserAbort):
+        sender.request("/elements/count", {"bboxes": "8.6,49.3,8.7,49.4"})
+    waiter_thread.join(TIMEOUT)
+
+    # The waiter sent the request itself
+    assert results["waiter"] == {"result": 42}
+    assert not len(coalescing._shared)
+
+
+def test_shared_request_hands_cancel_of_sender_to_waiters():
+    shared, sends = coalescing.join("key", coalescing.Waiter())
+    waiter = coalescing.Waiter()
+    joined, waiter_sends = coalescing.join("key", waiter)
+    assert sends and not waiter_sends and joined is shared
+
+    shared.finish(
+        client._shared_exception(
+            networkaccessmanager.RequestsExceptionUserAbort("Canceled"), False
+        )
+    )
+
+    assert waiter.wait(0)
+    assert shared.body() is None
+
+
+def test_shared_request_hands_errors_to_waiters():
+    shared, _ = coalescing.join("key", coalescing.Waiter())
+    waiter = coalescing.Waiter()
+    coalescing.join("key", waiter)
+
+    shared.finish(
+        client._shared_exception(exceptions.BadRequest("400", "Bad"), False)
+    )
+
+    with pytest.raises(exceptions.BadRequest):
+        shared.body()
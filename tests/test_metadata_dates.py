@@ -0,0 +1,81 @@
+"""
+Tests of the date defaults of the processing algorithms, which are taken
+from the metadata cache without network access. Need the QGIS Python
+libraries, run from the repository root:
+
+    python -m pytest tests
+"""
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from PyQt5.QtCore import QDateTime  # noqa: E402
+
+from ohsomeTools.common import cache  # noqa: E402
+from ohsomeTools.proc import procDialog  # noqa: E402
+
+BASE_URL = "https://api.ohsome.org/v1"
+
+METADATA = {
+    "extractRegion": {
+        "temporalExtent": {
+            "fromTimestamp": "2007-10-08T00:00:00Z",
+            "toTimestamp": "2023-03-12T13:00Z",
+        }
+    }
+}
+
+
+@pytest.fixture
+def metadata_cache(tmp_path, monkeypatch):
+    metadata_cache = cache.MetadataCache(
+        str(tmp_path / "metadata.json"), refresh_interval=3600
+    )
+    monkeypatch.setattr(cache, "_metadata_cache", metadata_cache)
+    monkeypatch.setattr(
+        procDialog.configmanager,
+        "read_config",
+        lambda: {"providers": [{"base_url": BASE_URL}]},
+    )
+    return metadata_cache
+
+
+def test_metadata_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / "metadata.json")
+    cache.MetadataCache(path, refresh_interval=3600).put(
+        f"{BASE_URL}/", METADATA
+    )
+
+    metadata, stale = cache.MetadataCache(path, refresh_interval=3600).get(
+        BASE_URL
+    )
+
+    assert metadata == METADATA
+    assert not stale
+    assert cache.MetadataCache(path, refresh_interval=-1).get(BASE_URL)[1]
+
+
+def test_extent_without_cached_metadata_is_empty(metadata_cache):
+    assert procDialog.cached_temporal_extent() == ("", "")
+
+
+def test_extent_is_read_from_the_cache(metadata_cache):
+    metadata_cache.put(BASE_URL, METADATA)
+
+    assert procDialog.cached_temporal_extent() == (
+        "2007-10-08T00:00:00Z",
+        "2023-03-12T13:00Z",
+    )
+
+
+def test_missing_dates_are_resolved_at_run_time():
+    date_start = QDateTime.fromString("2015-01-01", "yyyy-MM-dd")
+    parameters = {"date_start": date_start, "date_end": QDateTime()}
+
+    procDialog.resolve_missing_dates(parameters, METADATA)
+
+    assert parameters["date_start"] == date_start
+    assert parameters["date_end"].toString("yyyy-MM-dd HH:mm") == (
+        "2023-03-12 13:00"
+    )
@@ -0,0 +1,138 @@
+"""
+Tests of the local mock ohsome API of scripts/mock_ohsome_api.py. Run from
+the repository root:
+
+    python -m pytest tests
+"""
+
+import gzip
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import mock_ohsome_api  # noqa: E402
+
+from ohsomeTools.common import streaming  # noqa: E402
+
+EXTENT = (8.6, 49.35, 8.75, 49.45)
+
+
+@pytest.fixture
+def api():
+    return mock_ohsome_api.MockOhsomeApi(
+        mock_ohsome_api.Dataset(1000, EXTENT), versions=3
+    )
+
+
+@pytest.fixture
+def server(api):
+    server = mock_ohsome_api.MockServer(("127.0.0.1", 0), api)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _post(url: str, params: dict, gzipped: bool = False) -> bytes:
+    request = urllib.request.Request(
+        url,
+        data=urllib.parse.urlencode(params).encode(),
+        headers={"Accept-Encoding": "gzip"} if gzipped else {},
+    )
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+    return body
+
+
+def test_timestamps():
+    assert [
+        date.year
+        for date in mock_ohsome_api.timestamps("2010-01-01/2013-01-01/P1Y")
+    ] == [2010, 2011, 2012, 2013]
+    assert len(mock_ohsome_api.timestamps("2010-01-01,2015-06-01")) == 2
+    with pytest.raises(ValueError):
+        mock_ohsome_api.timestamps("2010-01-01/2013-01-01/P0D")
+
+
+def test_boundaries():
+    assert mock_ohsome_api.boundaries({"bboxes": "a:8.6,49.35,8.7,49.4"}) == [
+        ("a", (8.6, 49.35, 8.7, 49.4))
+    ]
+    ((_, bbox),) = mock_ohsome_api.boundaries({"bcircles": "8.67,49.41,1000"})
+    assert bbox[0] < 8.67 < bbox[2] and bbox[1] < 49.41 < bbox[3]
+    with pytest.raises(ValueError):
+        mock_ohsome_api.boundaries({})
+
+
+def test_count_matches_the_extracted_elements(api):
+    params = {"bboxes": "8.6,49.35,8.675,49.45", "time": "2020-01-01"}
+
+    result = api.aggregation(["elements", "count"], params)
+    members, features = api.extraction(["elements", "geometry"], params)
+
+    assert members == {"type": "FeatureCollection"}
+    assert result["result"][0]["value"] == len(list(features))
+
+
+def test_full_history_versions_cover_the_time_range(api):
+    _, features = api.extraction(
+        ["elementsFullHistory", "centroid"],
+        {"bboxes": "8.6,49.35,8.61,49.45", "time": "2010-01-01,2013-01-01"},
+    )
+    versions = {}
+    for feature in features:
+        properties = feature["properties"]
+        versions.setdefault(properties["@osmId"], []).append(
+            (properties["@validFrom"], properties["@validTo"])
+        )
+
+    assert len(versions)
+    for intervals in versions.values():
+        assert len(intervals) == 3
+        assert intervals[0][0].startswith("2010-01-01")
+        assert intervals[-1][1].startswith("2013-01-01")
+        assert all(
+            previous[1] == following[0]
+            for previous, following in zip(intervals, intervals[1:])
+        )
+
+
+def test_unknown_endpoint_is_not_found(api):
+    with pytest.raises(LookupError):
+        api.aggregation(
+            ["elements", "unknown"], {"bboxes": "8.6,49.35,8.7,49.4"}
+        )
+
+
+def test_streamed_extraction_is_parsed(server, api):
+    params = {"bboxes": "8.6,49.35,8.75,49.45", "time": "2020-01-01"}
+    features = []
+    parser = streaming.FeatureCollectionParser(features.append)
+
+    parser.feed(_post(f"{server}/v1/elements/centroid", params, gzipped=True))
+    response = parser.close()
+
+    assert response["apiVersion"] == mock_ohsome_api.API_VERSION
+    assert len(features) == len(api.dataset.within(EXTENT))
+    stats = json.loads(_post(f"{server}/mock/stats", {"reset": "true"}))
+    assert stats["endpoints"]["/elements/centroid"]["requests"] == 1
+    assert json.loads(_post(f"{server}/mock/stats", {}))["requests"] == 0
+
+
+def test_invalid_request_is_rejected(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{server}/elements/count", {"time": "2020-01-01"})
+
+    assert error.value.code == 400
+    assert "boundary" in json.loads(error.value.read())["message"]
@@ -0,0 +1,78 @@
+"""
+Tests of the incremental parsing of GeoJSON responses. Run from the
+repository root:
+
+    python -m pytest tests
+"""
+
+import json
+
+import pytest
+
+from ohsomeTools.common import streaming
+
+FEATURES = [
+    {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [8.67, 49.41]},
+        "properties": {"@osmId": f"node/{i}", "name": f'Café "{i}"'},
+    }
+    for i in range(5)
+]
+
+RESPONSE = {
+    "attribution": {"url": "https://ohsome.org/copyrights"},
+    "apiVersion": "1.10.1",
+    "type": "FeatureCollection",
+    "features": FEATURES,
+    "metadata": {"description": "The features."},
+}
+
+
+def _parse(body: bytes, chunk_size: int) -> (list, dict):
+    features = []
+    parser = streaming.FeatureCollectionParser(features.append)
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start : start + chunk_size])
+    return features, parser.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_features_are_passed_to_the_sink(chunk_size):
+    # Multi-byte characters are split between chunks as well
+    body = json.dumps(RESPONSE, ensure_ascii=False).encode("utf-8")
+
+    features, response = _parse(body, chunk_size)
+
+    assert features == FEATURES
+    assert response == {**RESPONSE, "features": []}
+
+
+def test_members_after_the_features_are_kept():
+    body = json.dumps(
+        {"type": "FeatureCollection", "features": [], "metadata": {"a": 1}}
+    ).encode("utf-8")
+
+    features, response = _parse(body, 3)
+
+    assert features == []
+    assert response["metadata"] == {"a": 1}
+
+
+def test_nested_features_member_is_not_streamed():
+    body = json.dumps(
+        {"metadata": {"features": [1, 2]}, "result": [{"value": 3}]}
+    ).encode("utf-8")
+
+    features, response = _parse(body, 5)
+
+    assert features == []
+    assert response == json.loads(body)
+
+
+def test_incomplete_features_array_is_an_error():
+    body = json.dumps(RESPONSE).encode("utf-8")
+    truncated = body[: body.index(b'"metadata"') - 10]
+
+    with pytest.raises(ValueError):
+        _parse(truncated, 16)
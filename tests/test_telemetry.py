@@ -0,0 +1,84 @@
+"""
+Tests of the request phase timings. Need the QGIS Python libraries, run
+from the repository root:
+
+    python -m pytest tests
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from ohsomeTools.common import networkaccessmanager, telemetry  # noqa: E402
+
+PHASES = ["upload", "server", "download", "parse"]
+
+
+def test_streamed_phases_add_up():
+    timings = telemetry.Timings()
+    nam = networkaccessmanager.NetworkAccessManager(debug=False)
+
+    def parse(data):
+        with timings.span("parse"):
+            time.sleep(0.05)
+
+    nam.stream_sink = parse
+    started = time.perf_counter()
+    nam._start_timings()
+    # Waiting for the server
+    time.sleep(0.02)
+    for _ in range(3):
+        nam._stream(b"{}")
+        # Downloading the next chunk
+        time.sleep(0.01)
+    nam._finish_timings()
+    elapsed = time.perf_counter() - started
+    timings.add_reply(nam.http_call_result)
+
+    # The parsing within the download is not counted twice
+    assert sum(timings.phases[phase] for phase in PHASES) == pytest.approx(
+        elapsed, abs=0.01
+    )
+    assert timings.phases["download"] < timings.phases["parse"]
+
+
+def test_phases_without_stream_sink_add_up():
+    nam = networkaccessmanager.NetworkAccessManager(debug=False)
+    started = time.perf_counter()
+    nam._start_timings()
+    time.sleep(0.02)
+    nam.downloadProgress(10, 20)
+    time.sleep(0.02)
+    nam._finish_timings()
+    elapsed = time.perf_counter() - started
+
+    assert sum(nam.http_call_result.timings.values()) == pytest.approx(
+        elapsed, abs=0.01
+    )
+
+
+def test_streamed_tail_is_not_counted_as_download():
+    timings = telemetry.Timings()
+    nam = networkaccessmanager.NetworkAccessManager(debug=False)
+
+    def parse(data):
+        with timings.span("parse"):
+            time.sleep(0.05)
+
+    nam.stream_sink = parse
+    started = time.perf_counter()
+    nam._start_timings()
+    time.sleep(0.02)
+    # The whole body is read once the reply finished, as in replyFinished
+    nam._finish_timings()
+    nam._stream(b"{}")
+    nam._finish_timings()
+    elapsed = time.perf_counter() - started
+    timings.add_reply(nam.http_call_result)
+
+    assert sum(timings.phases[phase] for phase in PHASES) == pytest.approx(
+        elapsed, abs=0.01
+    )
+    assert timings.phases["download"] < 0.01
@@ -0,0 +1,183 @@
+"""
+Tests of the time windows of history extractions and of incremental time
+series. Run from the repository root:
+
+    python -m pytest tests
+"""
+
+from ohsomeTools.common import temporal
+
+WINDOWS = [
+    {"time": "2010-01-01T00:00:00Z,2015-01-01T00:00:00Z"},
+    {"time": "2015-01-01T00:00:00Z,2020-01-01T00:00:00Z"},
+]
+
+
+class ListOutput:
+    """Written features in a list, referenced by their position."""
+
+    def __init__(self, features: [tuple]):
+        self.features = dict(enumerate(features))
+
+    def repeated_features(self, fields: [str]):
+        keys = [
+            tuple(properties.get(field) for field in fields)
+            for properties, _ in self.features.values()
+        ]
+        for reference, (properties, geometry) in list(self.features.items()):
+            key = tuple(properties.get(field) for field in fields)
+            if keys.count(key) > 1:
+                yield reference, dict(properties), geometry
+
+    def update_features(self, changes: dict):
+        for reference, properties in changes.items():
+            self.features[reference][0].update(properties)
+
+    def delete_features(self, references: list):
+        for reference in references:
+            del self.features[reference]
+
+    def unite_features(self, references: list):
+        self.delete_features(references[1:])
+
+
+def _version(osm_id: str, valid_from: str, valid_to: str, **tags) -> dict:
+    return {
+        "@osmId": osm_id,
+        "@validFrom": valid_from,
+        "@validTo": valid_to,
+        **tags,
+    }
+
+
+def test_split_time():
+    assert temporal.split_time("2010-01-01,2020-01-01", 60) == [
+        "2010-01-01T00:00:00,2015-01-01T00:00:00",
+        "2015-01-01T00:00:00,2020-01-01T00:00:00",
+    ]
+    assert temporal.split_time("2010-01-31,2010-03-15", 1) == [
+        "2010-01-31T00:00:00,2010-02-28T00:00:00",
+        "2010-02-28T00:00:00,2010-03-15T00:00:00",
+    ]
+    assert temporal.split_time("2010-01-01", 1) == ["2010-01-01"]
+    assert temporal.split_time("2020-01-01,2010-01-01", 1) == [
+        "2020-01-01,2010-01-01"
+    ]
+
+
+def test_window_boundaries():
+    assert temporal.window_boundaries(WINDOWS) == {"2015-01-01T00:00:00"}
+
+
+def test_continued_versions_are_joined():
+    boundaries = {"2012-01-01T00:00:00", "2014-01-01T00:00:00"}
+    versions = [
+        (3, "way/1", "2014-01-01T00:00:00Z", "2016-01-01T00:00:00Z", b"a"),
+        (1, "way/1", "2010-01-01T00:00:00Z", "2012-01-01T00:00:00Z", b"a"),
+        (2, "way/1", "2012-01-01T00:00:00Z", "2014-01-01T00:00:00Z", b"a"),
+        # A new version starting at the boundary
+        (4, "way/2", "2010-01-01T00:00:00Z", "2012-01-01T00:00:00Z", b"a"),
+        (5, "way/2", "2012-01-01T00:00:00Z", "2014-01-01T00:00:00Z", b"b"),
+    ]
+
+    assert temporal.continued_versions(versions, boundaries) == [
+        (1, "2016-01-01T00:00:00Z", [2, 3])
+    ]
+
+
+def test_superseded_contributions():
+    contributions = [
+        (1, "way/1", "2012-01-01T00:00:00Z"),
+        (2, "way/2", "2013-01-01T00:00:00Z"),
+        (3, "way/1", "2016-01-01T00:00:00Z"),
+    ]
+
+    assert temporal.superseded_contributions(contributions) == [1]
+
+
+def test_full_history_is_stitched_in_the_output():
+    feature_output = ListOutput(
+        [
+            (
+                _version(
+                    "way/1",
+                    "2012-01-01T00:00:00Z",
+                    "2015-01-01T00:00:00Z",
+                    building="yes",
+                ),
+                b"square",
+            ),
+            (
+                _version(
+                    "way/1",
+                    "2015-01-01T00:00:00Z",
+                    "2018-01-01T00:00:00Z",
+                    building="yes",
+                ),
+                b"square",
+            ),
+            (
+                _version(
+                    "way/1",
+                    "2018-01-01T00:00:00Z",
+                    "2020-01-01T00:00:00Z",
+                    building="house",
+                ),
+                b"square",
+            ),
+        ]
+    )
+
+    temporal.stitch_output(
+        feature_output, "elementsFullHistory/geometry", WINDOWS
+    )
+
+    assert [
+        (properties["@validFrom"], properties["@validTo"])
+        for properties, _ in feature_output.features.values()
+    ] == [
+        ("2012-01-01T00:00:00Z", "2018-01-01T00:00:00Z"),
+        ("2018-01-01T00:00:00Z", "2020-01-01T00:00:00Z"),
+    ]
+
+
+def test_latest_contribution_of_the_last_window_is_kept():
+    feature_output = ListOutput(
+        [
+            ({"@osmId": "way/1", "@timestamp": "2012-01-01T00:00:00Z"}, None),
+            ({"@osmId": "way/2", "@timestamp": "2013-01-01T00:00:00Z"}, None),
+            ({"@osmId": "way/1", "@timestamp": "2016-01-01T00:00:00Z"}, None),
+        ]
+    )
+
+    temporal.stitch_output(
+        feature_output, "contributions/latest/centroid", WINDOWS
+    )
+
+    assert list(feature_output.features) == [1, 2]
+
+
+def test_incremental_time():
+    assert (
+        temporal.incremental_time(
+            "2010-01-01/2020-01-01/P1M", "2015-06-01T00:00:00Z"
+        )
+        == "2015-06-01T00:00:00/2020-01-01/P1M"
+    )
+    assert (
+        temporal.incremental_time("2010-01-01/2020-01-01/P1M", "2020-01-01")
+        is None
+    )
+    assert temporal.incremental_time("2020-01-01", "2015-06-01") == (
+        "2020-01-01"
+    )
+
+
+def test_newer_rows():
+    rows = [
+        {"timestamp": "2015-05-01T00:00:00Z", "value": 1},
+        {"timestamp": "2015-06-01T00:00:00Z", "value": 2},
+        {"timestamp": "2015-07-01T00:00:00Z", "value": 3},
+    ]
+
+    assert temporal.newer_rows(rows, "2015-06-01T00:00:00Z") == rows[2:]
@@ -0,0 +1,117 @@
+"""
+Tests of the deduplication of the features of several tiles. Run from the
+repository root:
+
+    python -m pytest tests
+"""
+
+import pytest
+
+from ohsomeTools.common import tiling
+
+
+class ListOutput:
+    """Written features in a list, referenced by their position."""
+
+    def __init__(self, properties: [dict]):
+        self.features = dict(enumerate(properties))
+        self.united = []
+
+    def repeated_features(self, fields: [str]):
+        keys = [
+            tuple(properties.get(field) for field in fields)
+            for properties in self.features.values()
+        ]
+        for reference, properties in list(self.features.items()):
+            key = tuple(properties.get(field) for field in fields)
+            if properties.get("@osmId") is not None and keys.count(key) > 1:
+                yield reference, properties, None
+
+    def update_features(self, changes: dict):
+        for reference, properties in changes.items():
+            self.features[reference].update(properties)
+
+    def delete_features(self, references: list):
+        for reference in references:
+            del self.features[reference]
+
+    def unite_features(self, references: list):
+        self.united.append(references)
+        self.delete_features(references[1:])
+
+
+def test_feature_key():
+    assert tiling.feature_key({"@osmId": "way/1", "@validFrom": "2020"}) == (
+        "way/1",
+        "2020",
+        None,
+        None,
+        None,
+        None,
+    )
+    assert tiling.feature_key({"name": "without id"}) is None
+
+
+def test_unites_geometries():
+    assert tiling.unites_geometries("elements/geometry")
+    assert tiling.unites_geometries("/contributions/latest/geometry")
+    assert not tiling.unites_geometries("elements/centroid")
+    assert not tiling.unites_geometries("elementsFullHistory/bbox")
+
+
+def test_duplicate_groups():
+    features = [(("way/1",), 0), (("way/2",), 1), (None, 2), (("way/1",), 3)]
+
+    assert tiling.duplicate_groups(features) == [[0, 3]]
+
+
+@pytest.mark.parametrize(
+    "request_url", ["elements/centroid", "contributions/latest/bbox"]
+)
+def test_first_centroid_or_bbox_is_kept(request_url):
+    feature_output = ListOutput(
+        [
+            {"@osmId": "way/1"},
+            {"@osmId": "way/2"},
+            # The same element, returned by the neighbouring tile
+            {"@osmId": "way/1"},
+        ]
+    )
+
+    tiling.deduplicate_output(feature_output, request_url)
+
+    assert list(feature_output.features) == [0, 1]
+    assert not len(feature_output.united)
+
+
+def test_versions_of_history_are_kept():
+    feature_output = ListOutput(
+        [
+            {"@osmId": "way/1", "@validFrom": "2020-01-01"},
+            {"@osmId": "way/1", "@validFrom": "2021-01-01"},
+            {"@osmId": "way/1", "@validFrom": "2021-01-01"},
+        ]
+    )
+
+    tiling.deduplicate_output(feature_output, "elementsFullHistory/centroid")
+
+    assert list(feature_output.features) == [0, 1]
+
+
+def test_features_without_osm_id_are_kept():
+    feature_output = ListOutput([{}, {}])
+
+    tiling.deduplicate_output(feature_output, "elements/centroid")
+
+    assert list(feature_output.features) == [0, 1]
+
+
+def test_clipped_geometries_are_united():
+    feature_output = ListOutput(
+        [{"@osmId": "way/1"}, {"@osmId": "way/2"}, {"@osmId": "way/1"}]
+    )
+
+    tiling.deduplicate_output(feature_output, "elements/geometry")
+
+    assert feature_output.united == [[0, 2]]
+    assert list(feature_output.features) == [0, 1]
@@ -0,0 +1,265 @@
+"""
+Tests of the feature output. Need the GDAL Python bindings, run from the
+repository root:
+
+    python -m pytest tests
+"""
+
+import os
+
+import pytest
+
+ogr = pytest.importorskip("osgeo.ogr")
+
+from ohsomeTools.common import temporal, tiling, writer  # noqa: E402
+
+
+def _point(properties: dict) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [8.67, 49.41]},
+        "properties": properties,
+    }
+
+
+def _read(uri: str) -> (dict, list):
+    path, _, layer_name = uri.partition("|layername=")
+    dataset = ogr.Open(path)
+    if layer_name:
+        layer = dataset.GetLayerByName(layer_name)
+    else:
+        layer = dataset.GetLayer(0)
+    definition = layer.GetLayerDefn()
+    fields = [
+        definition.GetFieldDefn(i) for i in range(definition.GetFieldCount())
+    ]
+    types = {field.GetName(): field.GetType() for field in fields}
+    values = [
+        {name: feature.GetField(name) for name in types} for feature in layer
+    ]
+    return types, values
+
+
+@pytest.mark.parametrize("extension", ["gpkg", "fgb"])
+def test_conflicting_values_widen_the_field(tmp_path, extension):
+    feature_writer = writer.FeatureWriter(str(tmp_path / f"out.{extension}"))
+    for properties in [
+        {"flag": True, "count": 1, "mixed": 1},
+        {"flag": 2, "count": 2.5, "mixed": 2.5},
+        {"flag": None, "count": 3, "mixed": "three"},
+    ]:
+        feature_writer.write(_point(properties))
+    (uri, _), *_ = feature_writer.close()
+
+    types, values = _read(uri)
+
+    assert types["flag"] == ogr.OFTInteger64
+    assert types["count"] == ogr.OFTReal
+    assert types["mixed"] == ogr.OFTString
+    assert [row["flag"] for row in values] == [1, 2, None]
+    assert [row["count"] for row in values] == [1.0, 2.5, 3.0]
+    assert [row["mixed"] for row in values] == ["1", "2.5", "three"]
+    assert not len(feature_writer.warnings)
+
+
+def test_unsupported_extension_is_reported(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.geojson"))
+    feature_writer.write(_point({"count": 1}))
+    outputs = feature_writer.close()
+
+    assert os.path.exists(tmp_path / "out.gpkg")
+    assert outputs[0][0].startswith(str(tmp_path / "out.gpkg"))
+    assert len(feature_writer.warnings) == 1
+    assert "out.geojson" in feature_writer.warnings[0]
+
+
+def test_widen_field_type():
+    integer = ogr.OFTInteger64, ogr.OFSTNone
+    real = ogr.OFTReal, ogr.OFSTNone
+    string = ogr.OFTString, ogr.OFSTNone
+    date = ogr.OFTDateTime, ogr.OFSTNone
+
+    assert writer.widen_field_type(integer, integer) == integer
+    assert writer.widen_field_type(integer, real) == real
+    assert writer.widen_field_type(real, integer) == real
+    assert writer.widen_field_type(real, string) == string
+    assert writer.widen_field_type(date, integer) == string
+
+
+def test_csv_column_types_are_kept_on_append(tmp_path):
+    path = str(tmp_path / "out.csv")
+    writer.write_table(
+        [{"timestamp": "2020-01-01T00:00:00Z", "value": 1.5}],
+        ["timestamp", "value"],
+        path,
+    )
+    csvt = (tmp_path / "out.csvt").read_text()
+
+    # Up to date, nothing to append
+    writer.write_table([], ["timestamp", "value"], path, append=True)
+    writer.write_table(
+        [{"timestamp": "2021-01-01T00:00:00Z", "value": None}],
+        ["timestamp", "value"],
+        path,
+        append=True,
+    )
+
+    assert (tmp_path / "out.csvt").read_text() == csvt
+    assert csvt.strip() == '"DateTime","Real"'
+
+
+def test_csv_without_column_types_gets_none_on_append(tmp_path):
+    (tmp_path / "out.csv").write_text("timestamp,value\n")
+
+    writer.write_table(
+        [], ["timestamp", "value"], str(tmp_path / "out.csv"), append=True
+    )
+
+    assert not os.path.exists(tmp_path / "out.csvt")
+
+
+def _square(left: float, right: float, **properties) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [
+                [[left, 0], [right, 0], [right, 1], [left, 1], [left, 0]]
+            ],
+        },
+        "properties": properties,
+    }
+
+
+def test_repeated_features_are_selected(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.gpkg"))
+    for properties in [
+        {"@osmId": "way/1", "building": "yes"},
+        {"@osmId": "way/2"},
+        {"@osmId": "way/1", "building": "yes"},
+        {"building": "no"},
+        {"building": "no"},
+    ]:
+        feature_writer.write(_point(properties))
+
+    repeated = list(feature_writer.repeated_features(tiling.FEATURE_KEY_FIELDS))
+    feature_writer.discard()
+
+    assert [properties["@osmId"] for _, properties, _ in repeated] == [
+        "way/1",
+        "way/1",
+    ]
+    assert all(geometry is not None for _, _, geometry in repeated)
+
+
+def test_clipped_geometries_are_united(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.gpkg"))
+    feature_writer.write(_square(0, 1, **{"@osmId": "way/1"}))
+    feature_writer.write(_square(5, 6, **{"@osmId": "way/2"}))
+    feature_writer.write(_square(1, 2, **{"@osmId": "way/1"}))
+
+    tiling.deduplicate_output(feature_writer, "elements/geometry")
+    (uri, _), *_ = feature_writer.close()
+
+    dataset = ogr.Open(uri.partition("|layername=")[0])
+    layer = dataset.GetLayer(0)
+    envelopes = {
+        feature.GetField("@osmId"): feature.GetGeometryRef().GetEnvelope()
+        for feature in layer
+    }
+    assert feature_writer.feature_count == 2
+    assert envelopes["way/1"][:2] == (0, 2)
+
+
+def test_windows_are_stitched(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.gpkg"))
+    for valid_from, valid_to in [
+        ("2012-01-01T00:00:00Z", "2015-01-01T00:00:00Z"),
+        ("2015-01-01T00:00:00Z", "2018-01-01T00:00:00Z"),
+    ]:
+        feature_writer.write(
+            _point(
+                {
+                    "@osmId": "node/1",
+                    "@validFrom": valid_from,
+                    "@validTo": valid_to,
+                }
+            )
+        )
+
+    temporal.stitch_output(
+        feature_writer,
+        "elementsFullHistory/geometry",
+        [
+            {"time": "2010-01-01T00:00:00Z,2015-01-01T00:00:00Z"},
+            {"time": "2015-01-01T00:00:00Z,2020-01-01T00:00:00Z"},
+        ],
+    )
+    (uri, _), *_ = feature_writer.close()
+
+    dataset = ogr.Open(uri.partition("|layername=")[0])
+    (feature,) = list(dataset.GetLayer(0))
+    assert feature.GetFieldAsString("@validTo").startswith("2018/01/01")
+
+
+def test_features_are_partitioned_by_geometry_type():
+    collection = {
+        "type": "Feature",
+        "geometry": {
+            "type": "GeometryCollection",
+            "geometries": [
+                {"type": "Point", "coordinates": [0, 0]},
+                {"type": "LineString", "coordinates": [[0, 0], [1, 1]]},
+            ],
+        },
+        "properties": {"@osmId": "relation/1"},
+    }
+    without_geometry = {"type": "Feature", "geometry": None, "properties": {}}
+
+    partitioned = list(
+        writer.partition_features(
+            [collection, without_geometry],
+            keep_geometry_less=True,
+            harmonize=True,
+        )
+    )
+
+    assert [geometry_type for geometry_type, _, _ in partitioned] == [
+        "MultiPoint",
+        "MultiLineString",
+        writer.NO_GEOMETRY,
+    ]
+    assert partitioned[0][1]["coordinates"] == [[0, 0]]
+    assert not len(list(writer.partition_feature(without_geometry)))
+
+
+def test_geometry_types_go_to_separate_flatgeobuf_files(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.fgb"))
+    feature_writer.write(_point({"@osmId": "node/1"}))
+    feature_writer.write(_square(0, 1, **{"@osmId": "way/1"}))
+
+    outputs = feature_writer.close()
+
+    assert sorted(os.path.basename(uri) for uri, _ in outputs) == [
+        "out_Point.fgb",
+        "out_Polygon.fgb",
+    ]
+    assert not os.path.exists(tmp_path / "out.fgb.staging.gpkg")
+
+
+def test_timestamps_are_typed_and_validity_is_filled(tmp_path):
+    feature_writer = writer.FeatureWriter(str(tmp_path / "out.gpkg"))
+    for snapshot in ["2020-01-01T00:00:00Z", "2021-01-01T00:00:00Z"]:
+        feature_writer.write(
+            _point({"@osmId": "node/1", "@snapshotTimestamp": snapshot})
+        )
+    (uri, _), *_ = feature_writer.close()
+
+    types, values = _read(uri)
+
+    assert types["@snapshotTimestamp"] == ogr.OFTDateTime
+    assert writer.validity_fields(list(types)) == (
+        "@snapshotTimestamp",
+        "endDate",
+    )
+    assert values[0]["endDate"] is not None